@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from .models import Mentor, UserProfile, UserScopeVersion
+
+class AccessScope:
+    """What a user can reach: their role, mentor id and accessible project ids"""
+
+    def __init__(self, user_id, role=None, has_profile=False, mentor_id=None,
+                 mentor_project_ids=(), profile_project_ids=()):
+        self.user_id = user_id
+        self.role = role
+        self.has_profile = has_profile
+        self.mentor_id = mentor_id
+        self.mentor_project_ids = frozenset(mentor_project_ids)
+        self.profile_project_ids = frozenset(profile_project_ids)
+
+    @property
+    def is_mentor(self):
+        return self.mentor_id is not None
+
+    @property
+    def is_client(self):
+        return self.role == 'client'
+
+    @property
+    def project_ids(self):
+        """Projects a mentor oversees, otherwise the projects on the user's profile"""
+        return self.mentor_project_ids if self.is_mentor else self.profile_project_ids
+
+    def can_access_project(self, project_id):
+        return int(project_id) in self.mentor_project_ids | self.profile_project_ids
+
+    def can_view_defect(self, project_id, created_by_id, status):
+        """Reporters see their own defects, mentors their projects' and clients approved ones in theirs"""
+        if created_by_id == self.user_id or project_id in self.mentor_project_ids:
+            return True
+        return self.is_client and status == 'APPROVED' and project_id in self.profile_project_ids
+
+    def visible_defects(self):
+        """can_view_defect as a Q for filtering Defect querysets"""
+        visible = Q(created_by_id=self.user_id) | Q(project_id__in=self.mentor_project_ids)
+        if self.is_client:
+            visible |= Q(status='APPROVED', project_id__in=self.profile_project_ids)
+        return visible
+
+    def can_edit_defect(self, project_id, created_by_id):
+        """Same rule as DefectDetailView: mentors edit their projects' defects, everyone else their own"""
+        if self.is_mentor:
+            return project_id in self.mentor_project_ids
+        return created_by_id == self.user_id
+
+    def to_claims(self):
+        return {
+            'role': self.role,
+            'has_profile': self.has_profile,
+            'mentor_id': self.mentor_id,
+            'mentor_projects': sorted(self.mentor_project_ids),
+            'projects': sorted(self.profile_project_ids),
+        }
+
+    @classmethod
+    def from_claims(cls, user_id, token):
+        return cls(
+            user_id,
+            role=token.get('role'),
+            has_profile=token.get('has_profile', False),
+            mentor_id=token.get('mentor_id'),
+            mentor_project_ids=token.get('mentor_projects', ()),
+            profile_project_ids=token.get('projects', ()),
+        )
+
+def _cache_key(user_id, version):
+    # Keyed by version so a process-local cache can never serve a scope from before a change
+    return f'access_scope:{user_id}:{version}'
+
+def get_scope_version(user_id):
+    """The user's current scope version, read from the database so every process agrees on it"""
+    return UserScopeVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+def user_scope_version(user):
+    """get_scope_version, without a query when the user was loaded with select_related('scope_version')"""
+    if not type(user).scope_version.is_cached(user):
+        return get_scope_version(user.pk)
+    try:
+        return user.scope_version.version
+    except UserScopeVersion.DoesNotExist:
+        return 0
+
+def bump_scope_version(*user_ids):
+    if not user_ids:
+        return
+    UserScopeVersion.objects.filter(user_id__in=user_ids).update(version=F('version') + 1)
+    UserScopeVersion.objects.bulk_create(
+        [UserScopeVersion(user_id=user_id, version=1) for user_id in user_ids], ignore_conflicts=True)
+
+def load_access_scope(user_id):
+    mentor_id = Mentor.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    mentor_project_ids = []
+    if mentor_id is not None:
+        mentor_project_ids = Mentor.projects.through.objects.filter(mentor_id=mentor_id).values_list('project_id', flat=True)
+    profile = UserProfile.objects.filter(user_id=user_id).values_list('id', 'role').first()
+    profile_project_ids = []
+    if profile is not None:
+        profile_project_ids = UserProfile.projects.through.objects.filter(userprofile_id=profile[0]).values_list('project_id', flat=True)
+    return AccessScope(
+        user_id,
+        role=profile[1] if profile else None,
+        has_profile=profile is not None,
+        mentor_id=mentor_id,
+        mentor_project_ids=mentor_project_ids,
+        profile_project_ids=profile_project_ids,
+    )
+
+def get_access_scope(request):
+    """Resolve the user's AccessScope once per request, backed by a short-TTL cache.
+
+    Accepts a request or a user. The user's scope version lives in the database
+    (UserScopeVersion) and signal handlers bump it when the user's Mentor/UserProfile
+    or their project assignments change, which makes both the cached entry and the
+    claims of already-issued tokens stale in every process at once.
+    """
+    user = getattr(request, 'user', request)
+    scope = getattr(user, '_access_scope', None)
+    if scope is not None:
+        return scope
+    version = user_scope_version(user)
+    # Access tokens issued by App.tokens carry the scope; trust it while its version is current
+    token = getattr(request, 'auth', None)
+    if token is not None and hasattr(token, 'get') and token.get('scope_version') == version:
+        scope = AccessScope.from_claims(user.pk, token)
+        user._access_scope = scope
+        return scope
+    key = _cache_key(user.pk, version)
+    scope = cache.get(key)
+    if scope is None:
+        scope = load_access_scope(user.pk)
+        cache.set(key, scope, settings.ACCESS_SCOPE_CACHE_TTL)
+    user._access_scope = scope
+    return scope
+
+def invalidate_access_scope(*user_ids):
+    """Mark cached scopes and the scope claims in already-issued tokens as stale"""
+    bump_scope_version(*user_ids)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Project, UserProfile, Defect, Mentor, DefectHistory
+from .models import Project, UserProfile, Defect, Mentor, DefectHistory, DefectEmbedding, MediaBlob, MediaJob
 
 # Unregister the default User admin
 admin.site.unregister(User)
@@ -87,6 +87,27 @@ class DefectHistoryAdmin(admin.ModelAdmin):
     readonly_fields = ['defect', 'action', 'performed_by', 'timestamp', 'changes']
     ordering = ['-timestamp']
 
+# --- DefectEmbedding Admin ---
+@admin.register(DefectEmbedding)
+class DefectEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ['defect', 'model_name', 'dimensions', 'updated_at']
+    list_filter = ['model_name']
+    search_fields = ['defect__defect_id']
+    readonly_fields = ['defect', 'model_name', 'text_hash', 'dimensions', 'updated_at']
+    exclude = ['vector']
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refcount', 'created_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'refcount', 'created_at']
+
+@admin.register(MediaJob)
+class MediaJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'defect', 'source_name', 'status', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['defect', 'source_name', 'result_name', 'attempts', 'error', 'created_at', 'started_at', 'finished_at']
+
 # --- Admin Site Customization ---
 admin.site.site_header = "Defect Tracking Tool Administration"
 admin.site.site_title = "Defect Tracker Admin"
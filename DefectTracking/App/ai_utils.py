@@ -1,9 +1,34 @@
-from sentence_transformers import SentenceTransformer
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
 from sklearn.cluster import AgglomerativeClustering
 from collections import defaultdict
 from dateutil.parser import parse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from .inference import InferenceUnavailable, remote_encode
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_TEXT_FIELDS = ('summary', 'actual_result', 'expected_result')
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Load the in-process model on first use, so workers using the inference server never load torch"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(MODEL_NAME)
+    return _model
 
 def convert_date_or_none(d):
     val = d.get('created_at')
@@ -12,19 +37,137 @@ def convert_date_or_none(d):
     except Exception:
         return None
 
-def ai_filter_unique_defects(defects, distance_threshold=0.65):
+def defect_text(defect):
+    """Text used for embedding, from a Defect instance or a defect dict"""
+    if isinstance(defect, dict):
+        values = [defect.get(field) or '' for field in EMBEDDING_TEXT_FIELDS]
+    else:
+        values = [getattr(defect, field, '') or '' for field in EMBEDDING_TEXT_FIELDS]
+    return ' '.join(values)
+
+def text_hash(text):
+    return hashlib.sha256(f"{MODEL_NAME}\n{text}".encode('utf-8')).hexdigest()
+
+def encode_texts(texts):
+    """Encode texts into L2-normalised float32 vectors"""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    texts = list(texts)
+    embeddings = None
+    if settings.AI_INFERENCE_SOCKET:
+        try:
+            embeddings = remote_encode(texts, settings.AI_INFERENCE_SOCKET, MODEL_NAME,
+                                       timeout=settings.AI_INFERENCE_TIMEOUT)
+        except InferenceUnavailable:
+            embeddings = None
+    if embeddings is None:
+        embeddings = get_model().encode(texts, convert_to_numpy=True)
+    return normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def vector_from_bytes(data, dimensions):
+    return np.frombuffer(bytes(data), dtype=np.float32, count=dimensions)
+
+def is_embedding_fresh(embedding, defect):
+    return (embedding is not None
+            and embedding.model_name == MODEL_NAME
+            and embedding.text_hash == text_hash(defect_text(defect)))
+
+def refresh_defect_embeddings(defects):
+    """Store embeddings for the given Defect instances, encoding only missing or stale ones.
+
+    Returns a dict of defect_id -> vector for every defect passed in.
+    """
+    return sync_defect_embeddings(defects)[0]
+
+def sync_defect_embeddings(defects):
+    """Like refresh_defect_embeddings, also returning the set of ids that were re-encoded"""
+    from .models import DefectEmbedding
+    defects = [d for d in defects if d.pk is not None]
     if not defects:
-        return []
+        return {}, set()
+    stored = DefectEmbedding.objects.in_bulk([d.pk for d in defects])
+    vectors = {}
+    stale = []
+    for defect in defects:
+        embedding = stored.get(defect.pk)
+        if is_embedding_fresh(embedding, defect):
+            vectors[defect.pk] = vector_from_bytes(embedding.vector, embedding.dimensions)
+        else:
+            stale.append(defect)
+    if stale:
+        vectors.update(_store_embeddings(stale))
+    return vectors, {d.pk for d in stale}
 
-    if len(defects) == 1:
-        # Only one defect, return as is, no clustering needed
-        return defects
+def _store_embeddings(defects):
+    """Encode the given defects' text and replace their stored embeddings, returning id -> vector"""
+    from .models import DefectEmbedding
+    encoded = encode_texts([defect_text(d) for d in defects])
+    vectors = {}
+    rows = []
+    for defect, vector in zip(defects, encoded):
+        vectors[defect.pk] = vector
+        rows.append(DefectEmbedding(
+            defect_id=defect.pk,
+            model_name=MODEL_NAME,
+            text_hash=text_hash(defect_text(defect)),
+            dimensions=vector.shape[0],
+            vector=vector.tobytes(),
+        ))
+    with transaction.atomic():
+        DefectEmbedding.objects.filter(defect_id__in=[d.pk for d in defects]).delete()
+        DefectEmbedding.objects.bulk_create(rows)
+    return vectors
+
+def _embedded_defects(queryset):
+    """Narrow a Defect queryset to the embedding text and its stored vector, in one query"""
+    return (queryset.select_related(None).prefetch_related(None)
+            .select_related('embedding')
+            .only('defect_id', *EMBEDDING_TEXT_FIELDS,
+                  'embedding__model_name', 'embedding__text_hash',
+                  'embedding__dimensions', 'embedding__vector'))
+
+def _embedded_vectors(defects):
+    """Vectors for defects loaded by _embedded_defects, encoding and persisting the missing or stale ones"""
+    vectors = {}
+    stale = []
+    for defect in defects:
+        embedding = getattr(defect, 'embedding', None)
+        if is_embedding_fresh(embedding, defect):
+            vectors[defect.pk] = vector_from_bytes(embedding.vector, embedding.dimensions)
+        else:
+            stale.append(defect)
+    if stale:
+        vectors.update(_store_embeddings(stale))
+    return vectors
+
+def load_defect_embeddings(defect_ids):
+    """Load stored vectors for defect ids, encoding and persisting the missing or stale ones"""
+    from .models import Defect
+    return _embedded_vectors(_embedded_defects(Defect.objects.filter(defect_id__in=list(defect_ids))))
 
-    texts = [f"{d.get('summary', '')} {d.get('actual_result', '')} {d.get('expected_result', '')}"
-        for d in defects
-    ]
-    embeddings = model.encode(texts, convert_to_numpy=True)
+def defect_embeddings(defects):
+    """Embedding matrix for a list of defect dicts, using stored vectors where possible"""
+    ids = [d.get('defect_id') for d in defects if d.get('defect_id') is not None]
+    stored = load_defect_embeddings(ids) if ids else {}
+    missing = [i for i, d in enumerate(defects) if d.get('defect_id') not in stored]
+    encoded = encode_texts([defect_text(defects[i]) for i in missing])
+    extra = dict(zip(missing, encoded))
+    return np.vstack([
+        extra[i] if i in extra else stored[d.get('defect_id')]
+        for i, d in enumerate(defects)
+    ])
 
+def cluster_labels(embeddings, distance_threshold):
+    """Flat cluster label per row of the embedding matrix, using the AI_CLUSTERING_ENGINE setting"""
+    if len(embeddings) < 2:
+        return np.zeros(len(embeddings), dtype=int)
+    if settings.AI_CLUSTERING_ENGINE == 'blocked':
+        return blocked_cluster_labels(embeddings, distance_threshold, settings.AI_CLUSTERING_BLOCK_SIZE)
     clustering = AgglomerativeClustering(
         n_clusters=None,
         distance_threshold=distance_threshold,
@@ -32,7 +175,51 @@ def ai_filter_unique_defects(defects, distance_threshold=0.65):
         linkage='average'
     )
     clustering.fit(embeddings)
-    labels = clustering.labels_
+    return clustering.labels_
+
+def blocked_cluster_labels(embeddings, distance_threshold, block_size=1024):
+    """Group rows whose cosine distance is within the threshold, without an n x n matrix.
+
+    Similarities are computed one block_size x block_size tile at a time and
+    matching pairs are joined with union-find, so memory is bounded by the tile.
+    This is single linkage: a chain of close pairs ends up in one group.
+    """
+    vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    n = len(vectors)
+    parent = list(range(n))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    min_similarity = 1.0 - distance_threshold
+    for start in range(0, n, block_size):
+        block = vectors[start:start + block_size]
+        for other in range(start, n, block_size):
+            similarities = block @ vectors[other:other + block_size].T
+            rows, cols = np.nonzero(similarities >= min_similarity)
+            for i, j in zip((rows + start).tolist(), (cols + other).tolist()):
+                if i < j:
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([find(i) for i in range(n)])
+    return np.unique(roots, return_inverse=True)[1]
+
+def ai_filter_unique_defects(defects, distance_threshold=0.65):
+    if not defects:
+        return []
+
+    if len(defects) == 1:
+        # Only one defect, return as is, no clustering needed
+        return defects
+
+    embeddings = defect_embeddings(defects)
+    labels = cluster_labels(embeddings, distance_threshold)
 
     clusters = defaultdict(list)
     for idx, label in enumerate(labels):
@@ -42,3 +229,182 @@ def ai_filter_unique_defects(defects, distance_threshold=0.65):
         oldest = min(group, key=lambda d: convert_date_or_none(d) or d.get('defect_id'))
         unique.append(oldest)
     return unique
+
+@contextmanager
+def indexing_errors_logged(message, *args):
+    """Log, rather than raise, a failure to embed or group defects whose save has already committed.
+
+    Nothing repairs this on a schedule. A missing embedding is encoded the next time the
+    defect is clustered or searched, but the defect stays outside every duplicate group,
+    and so counts as unique, until ``manage.py rebuild_duplicate_groups`` runs for its project.
+    """
+    try:
+        yield
+    except Exception:
+        logger.exception(message, *args)
+
+def _group_centroids(groups):
+    return normalize_rows(np.vstack([vector_from_bytes(g.centroid, g.dimensions) for g in groups]))
+
+def assign_duplicate_group(defect, vector, distance_threshold=None):
+    """Put a defect into the nearest duplicate group of its project, or start a new group"""
+    from .models import Defect, DuplicateGroup
+    if distance_threshold is None:
+        distance_threshold = settings.AI_FILTER_UNIQUE_DEFECTS_THRESHOLD
+    vector = np.asarray(vector, dtype=np.float32)
+    with transaction.atomic():
+        groups = list(DuplicateGroup.objects.filter(project_id=defect.project_id, dimensions=vector.shape[0]))
+        group = None
+        if groups:
+            distances = 1.0 - _group_centroids(groups) @ vector
+            best = int(np.argmin(distances))
+            if distances[best] <= distance_threshold:
+                group = DuplicateGroup.objects.select_for_update().get(pk=groups[best].pk)
+        if group is None:
+            group = DuplicateGroup(project_id=defect.project_id, dimensions=vector.shape[0],
+                                   centroid=np.zeros_like(vector).tobytes())
+        group.centroid = (vector_from_bytes(group.centroid, group.dimensions) + vector).tobytes()
+        group.size += 1
+        group.save()
+        Defect.objects.filter(pk=defect.pk).update(duplicate_group=group)
+        defect.duplicate_group = group
+    return group
+
+def assign_duplicate_groups(defects, vectors, distance_threshold=None):
+    """assign_duplicate_group for a batch of new defects, reading each project's groups once"""
+    from .models import Defect, DuplicateGroup
+    if distance_threshold is None:
+        distance_threshold = settings.AI_FILTER_UNIQUE_DEFECTS_THRESHOLD
+    by_project = defaultdict(list)
+    for defect in defects:
+        if defect.duplicate_group_id is None and defect.pk in vectors:
+            by_project[defect.project_id].append(defect)
+    with transaction.atomic():
+        for project_id, members in by_project.items():
+            groups = list(DuplicateGroup.objects.select_for_update().filter(project_id=project_id))
+            sums = [vector_from_bytes(g.centroid, g.dimensions).copy() for g in groups]
+            assigned = defaultdict(list)
+            for defect in members:
+                vector = np.asarray(vectors[defect.pk], dtype=np.float32)
+                candidates = [i for i, g in enumerate(groups) if g.dimensions == vector.shape[0]]
+                best = None
+                if candidates:
+                    distances = 1.0 - normalize_rows(np.vstack([sums[i] for i in candidates])) @ vector
+                    if distances.min() <= distance_threshold:
+                        best = candidates[int(np.argmin(distances))]
+                if best is None:
+                    groups.append(DuplicateGroup(project_id=project_id, dimensions=vector.shape[0]))
+                    sums.append(np.zeros_like(vector))
+                    best = len(groups) - 1
+                sums[best] += vector
+                groups[best].size += 1
+                assigned[best].append(defect)
+            for index, group_members in assigned.items():
+                group = groups[index]
+                group.centroid = sums[index].astype(np.float32).tobytes()
+                group.save()
+                Defect.objects.filter(pk__in=[d.pk for d in group_members]).update(duplicate_group=group)
+                for defect in group_members:
+                    defect.duplicate_group = group
+
+def leave_duplicate_group(defect):
+    """Take a defect out of its group, recomputing the centroid from the remaining members"""
+    from .models import Defect, DuplicateGroup
+    group_id = defect.duplicate_group_id
+    if group_id is None:
+        return
+    with transaction.atomic():
+        Defect.objects.filter(pk=defect.pk).update(duplicate_group=None)
+        defect.duplicate_group = None
+        group = DuplicateGroup.objects.select_for_update().filter(pk=group_id).first()
+        if group is None:
+            return
+        member_ids = list(Defect.objects.filter(duplicate_group_id=group_id).values_list('defect_id', flat=True))
+        vectors = load_defect_embeddings(member_ids)
+        if not vectors:
+            group.delete()
+            return
+        group.centroid = np.sum(list(vectors.values()), axis=0).astype(np.float32).tobytes()
+        group.size = len(vectors)
+        group.save(update_fields=['centroid', 'size'])
+
+def rebuild_duplicate_groups(project, distance_threshold=None):
+    """Recluster every defect of a project from scratch and persist the resulting groups"""
+    from .models import Defect, DuplicateGroup
+    if distance_threshold is None:
+        distance_threshold = settings.AI_FILTER_UNIQUE_DEFECTS_THRESHOLD
+    defect_ids = list(Defect.objects.filter(project=project).order_by('created_at', 'defect_id')
+                      .values_list('defect_id', flat=True))
+    vectors = load_defect_embeddings(defect_ids)
+    defect_ids = [i for i in defect_ids if i in vectors]
+    members = defaultdict(list)
+    if defect_ids:
+        embeddings = np.vstack([vectors[i] for i in defect_ids])
+        for defect_id, label in zip(defect_ids, cluster_labels(embeddings, distance_threshold)):
+            members[label].append(defect_id)
+    with transaction.atomic():
+        Defect.objects.filter(project=project).update(duplicate_group=None)
+        DuplicateGroup.objects.filter(project=project).delete()
+        for ids in members.values():
+            centroid = np.sum([vectors[i] for i in ids], axis=0).astype(np.float32)
+            group = DuplicateGroup.objects.create(project=project, centroid=centroid.tobytes(),
+                                                  dimensions=centroid.shape[0], size=len(ids))
+            Defect.objects.filter(defect_id__in=ids).update(duplicate_group=group)
+    return len(members)
+
+def unique_defects_queryset(queryset):
+    """Narrow a Defect queryset to the oldest member of each duplicate group it contains"""
+    older = queryset.filter(duplicate_group=OuterRef('duplicate_group')).filter(
+        Q(created_at__lt=OuterRef('created_at')) |
+        Q(created_at=OuterRef('created_at'), defect_id__lt=OuterRef('defect_id'))
+    )
+    return queryset.filter(Q(duplicate_group__isnull=True) | ~Exists(older))
+
+def build_dendrogram(embeddings):
+    """Average-linkage merge tree (scipy linkage matrix) over cosine distance"""
+    from scipy.cluster.hierarchy import linkage
+    return linkage(np.asarray(embeddings, dtype=np.float64), method='average', metric='cosine')
+
+def cut_dendrogram(merges, n, distance_threshold):
+    """Flat labels for n leaves, applying only the merges closer than the threshold, in O(n)"""
+    parent = np.arange(2 * n - 1) if n else np.arange(0)
+    for k, (a, b, distance, _) in enumerate(merges):
+        # Average-linkage merge heights are non-decreasing
+        if distance >= distance_threshold:
+            break
+        parent[int(a)] = parent[int(b)] = n + k
+    for node in range(len(parent) - 1, -1, -1):
+        parent[node] = parent[parent[node]]
+    return parent[:n]
+
+def dendrogram_unique_ids(queryset, cache_key, distance_threshold):
+    """Ids of the oldest defect per cluster of a queryset, cut at any threshold.
+
+    The merge tree is built once per version of the queryset's defect set and
+    cached; later calls only run one aggregate query and an O(n) cut. Building
+    it reads the ids and stored vectors in one query, plus one write
+    transaction when any vector is missing or stale.
+    """
+    signature = queryset.aggregate(count=Count('defect_id'), last_update=Max('updated_at'), id_sum=Sum('defect_id'))
+    if not signature['count']:
+        return []
+    key = 'dendrogram:{}:{}:{}:{}:{}'.format(cache_key, MODEL_NAME, signature['count'],
+                                             signature['last_update'].timestamp(), signature['id_sum'])
+    cached = cache.get(key)
+    if cached is None:
+        defects = list(_embedded_defects(queryset).order_by('created_at', 'defect_id'))
+        vectors = _embedded_vectors(defects)
+        defect_ids = [d.pk for d in defects]
+        defect_ids = [i for i in defect_ids if i in vectors]
+        merges = build_dendrogram(np.vstack([vectors[i] for i in defect_ids])) if len(defect_ids) > 1 else np.zeros((0, 4))
+        cached = (defect_ids, merges)
+        cache.set(key, cached, settings.AI_DENDROGRAM_CACHE_TIMEOUT)
+    defect_ids, merges = cached
+    seen = set()
+    unique = []
+    # defect_ids are oldest first, so the first id seen for a label is that cluster's oldest defect
+    for defect_id, label in zip(defect_ids, cut_dendrogram(merges, len(defect_ids), distance_threshold)):
+        if label not in seen:
+            seen.add(label)
+            unique.append(defect_id)
+    return unique
@@ -0,0 +1,115 @@
+"""Batched writes for defects: one transaction and a handful of INSERTs per batch.
+
+Bulk inserts bypass ``Defect.save()`` and the post_save receivers, so the work
+they normally do (counters, daily rollups, embeddings and duplicate groups) is
+done here for the whole batch instead.
+"""
+import uuid
+from collections import Counter
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+from .ai_utils import (MODEL_NAME, assign_duplicate_groups, defect_text, indexing_errors_logged, sync_defect_embeddings,
+                       text_hash)
+from .models import Defect, DefectCounter, DefectDailyRollup, DefectEmbedding, DefectHistory, DefectScreenshot, MediaJob
+
+# action -> (status, mentor_state, DefectHistory action, default comment)
+MENTOR_ACTIONS = {
+    'approve': ('APPROVED', 'Approved', 'APPROVED', 'Defect approved by mentor'),
+    'invalidate': ('INVALID', 'Invalid', 'INVALIDATED', 'Defect marked as invalid by mentor'),
+}
+
+def create_defects(items, user, comments='Defect created', vectors=None):
+    """Create one defect per validated DefectCreateSerializer payload and return them in order.
+
+    vectors, if given, are the already-encoded embeddings of the items (same order).
+    """
+    defects = []
+    attachments = []
+    now = timezone.now()
+    for data in items:
+        data = dict(data)
+        screenshots = [f for f in data.pop('defect_screenshots', None) or [] if f]
+        defect = Defect(created_by=user, **data)
+        if defect.status == 'APPROVED' and not defect.approved_at:
+            defect.approved_at = now
+        defects.append(defect)
+        attachments.append(screenshots)
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Defect.objects.bulk_create(defects)
+        else:
+            # MySQL does not report the ids of a multi-row INSERT; read them back by a per-batch marker.
+            # Ids increase in row order within one INSERT, so sorting by them restores the item order.
+            batch = uuid.uuid4()
+            for defect in defects:
+                defect.bulk_batch = batch
+            Defect.objects.bulk_create(defects)
+            ids = Defect.objects.filter(bulk_batch=batch).order_by('defect_id').values_list('defect_id', flat=True)
+            for defect, pk in zip(defects, ids):
+                defect.pk = pk
+        DefectCounter.apply_deltas(Counter(d.counter_key() for d in defects))
+        for defect in defects:
+            defect._counter_key = defect.counter_key()
+        MediaJob.enqueue(DefectScreenshot.objects.bulk_create([
+            DefectScreenshot(defect=defect, image=image)
+            for defect, screenshots in zip(defects, attachments) for image in screenshots]))
+        DefectHistory.objects.bulk_create([
+            DefectHistory(defect=defect, action='CREATED', performed_by=user, comments=comments)
+            for defect in defects])
+        for project_id, created in Counter(d.project_id for d in defects).items():
+            DefectDailyRollup.record(project_id, timezone.localdate(now), 'CREATED', created)
+        transaction.on_commit(lambda: index_defects(defects, vectors))
+    return defects
+
+def index_defects(defects, vectors=None):
+    """Encode new defects in one batch (unless vectors are given) and place each into a duplicate group"""
+    with indexing_errors_logged("Could not index %d bulk-created defects", len(defects)):
+        if vectors is None:
+            vectors, _ = sync_defect_embeddings(defects)
+        else:
+            DefectEmbedding.objects.bulk_create([
+                DefectEmbedding(defect_id=defect.pk, model_name=MODEL_NAME, text_hash=text_hash(defect_text(defect)),
+                                dimensions=vector.shape[0], vector=np.asarray(vector, dtype=np.float32).tobytes())
+                for defect, vector in zip(defects, vectors)])
+            vectors = {defect.pk: vector for defect, vector in zip(defects, vectors)}
+        assign_duplicate_groups(defects, vectors)
+
+def apply_mentor_action(defect_ids, action, user, project_ids, comments=None):
+    """Approve or invalidate defects in project_ids with one UPDATE; returns (updated ids, skipped)"""
+    status, mentor_state, history_action, default_comment = MENTOR_ACTIONS[action]
+    defect_ids = list(dict.fromkeys(defect_ids))
+    now = timezone.now()
+    with transaction.atomic():
+        rows = {row[0]: row[1:] for row in Defect.objects.select_for_update().filter(defect_id__in=defect_ids)
+                .order_by().values_list('defect_id', *DefectCounter.KEY_FIELDS)}
+        updated, skipped = [], []
+        for defect_id in defect_ids:
+            key = rows.get(defect_id)
+            if key is None:
+                skipped.append({'defect_id': defect_id, 'reason': 'not_found'})
+            elif key[0] not in project_ids:
+                skipped.append({'defect_id': defect_id, 'reason': 'out_of_scope'})
+            elif key[2] == status:
+                skipped.append({'defect_id': defect_id, 'reason': 'already_approved' if action == 'approve' else 'already_invalid'})
+            else:
+                updated.append(defect_id)
+        if not updated:
+            return updated, skipped
+        changes = {'status': status, 'mentor_state': mentor_state, 'updated_at': now}
+        if action == 'approve':
+            changes.update(approved_by=user, approved_at=now)
+        Defect.objects.filter(defect_id__in=updated).update(**changes)
+        deltas = Counter()
+        for defect_id in updated:
+            project_id, created_by_id, _, priority, severity, _ = rows[defect_id]
+            deltas[rows[defect_id]] -= 1
+            deltas[(project_id, created_by_id, status, priority, severity, mentor_state)] += 1
+        DefectCounter.apply_deltas(deltas)
+        DefectHistory.objects.bulk_create([
+            DefectHistory(defect_id=defect_id, action=history_action, performed_by=user,
+                          comments=comments or default_comment)
+            for defect_id in updated])
+        for project_id, count in Counter(rows[i][0] for i in updated).items():
+            DefectDailyRollup.record(project_id, timezone.localdate(now), history_action, count)
+    return updated, skipped
@@ -0,0 +1,95 @@
+"""Image work that runs in the media worker's pool processes.
+
+Nothing here imports Django: with the spawn start method (Windows, macOS) a pool
+process imports this module afresh without settings or an app registry, so paths
+are passed in and names are derived from content hashes alone. ``thumbnails`` and
+``media_jobs`` build the database- and storage-aware parts on top of it.
+"""
+import hashlib
+import os
+import tempfile
+from PIL import Image, ImageOps
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+# Decoded format -> (format to write, extension, save options); anything else becomes PNG
+OUTPUT_FORMATS = {
+    'JPEG': ('JPEG', '.jpg', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}),
+    'PNG': ('PNG', '.png', {'optimize': True}),
+    'WEBP': ('WEBP', '.webp', {'quality': JPEG_QUALITY, 'method': 4}),
+}
+DEFAULT_OUTPUT = ('PNG', '.png', {'optimize': True})
+VARIANTS = {'thumbnail': 128, 'preview': 512}
+VARIANT_PREFIX = 'variants'
+
+class InvalidImage(ValueError):
+    """The upload is not an image Pillow can decode"""
+
+def variant_key_name(key, variant):
+    """Media name of a variant of the content identified by key (a SHA-256 hex digest)"""
+    return f'{VARIANT_PREFIX}/{key[:2]}/{key[2:4]}/{key}-{VARIANTS[variant]}.webp'
+
+def write_variant(source, target, size):
+    """Write a WebP of the image in the open file source, fitting in size x size, to target"""
+    with Image.open(source) as image:
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+def process_image(source_path, work_dir, media_root):
+    """Verify, strip and re-encode the image at source_path; returns the processed file's details.
+
+    The result is written to a temporary file in work_dir and its thumbnail variants are
+    created under media_root for the content name it will be stored as.
+    """
+    try:
+        with Image.open(source_path) as image:
+            image.verify()
+        # verify() leaves the image unusable, so decode it again
+        with Image.open(source_path) as image:
+            image.load()
+            if getattr(image, 'n_frames', 1) > 1:
+                raise InvalidImage('Animated images are not accepted as screenshots.')
+            output_format, ext, options = OUTPUT_FORMATS.get(image.format, DEFAULT_OUTPUT)
+            image = ImageOps.exif_transpose(image)
+            if output_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            fd, path = tempfile.mkstemp(dir=work_dir, suffix=ext)
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    # No exif=/icc_profile= arguments, so the metadata is dropped
+                    image.save(out, output_format, **options)
+            except BaseException:
+                os.unlink(path)
+                raise
+    except InvalidImage:
+        raise
+    except FileNotFoundError:
+        raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as exc:
+        raise InvalidImage(f'Not a valid image: {exc}') from exc
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    for variant, size in VARIANTS.items():
+        target = os.path.join(media_root, variant_key_name(sha256, variant))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(path, 'rb') as f:
+                write_variant(f, target, size)
+    return {'path': path, 'sha256': sha256, 'size': os.path.getsize(path), 'ext': ext}
@@ -0,0 +1,156 @@
+"""Streaming import of legacy defects from CSV or NDJSON.
+
+The file is read one record at a time and handled in batches: each batch is
+validated with the DefectCreateSerializer rules, optionally stripped of
+near-duplicates, and written with ``bulk.create_defects``. Memory use depends on
+the batch size, not on the file size.
+"""
+import csv
+import io
+import json
+import time
+import numpy as np
+from django.conf import settings
+from .ai_utils import cluster_labels, defect_text, encode_texts, normalize_rows, vector_from_bytes
+from .bulk import create_defects
+from .models import DuplicateGroup, Project
+from .serializers import DefectBulkItemSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 100
+
+class ImportReport:
+    """Counts and the first rejected rows of an import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.seconds = 0.0
+
+    def reject(self, row_number, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'rejected': self.rejected,
+            'duplicates': self.duplicates,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+        }
+
+def iter_records(fileobj, file_format):
+    """Yield dicts from a binary file object, one CSV row or NDJSON line at a time"""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='' if file_format == 'csv' else None)
+    if file_format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            record = ValueError(f'Invalid JSON: {exc}')
+        yield record
+
+def import_defects(records, user, project=None, batch_size=500, skip_duplicates=False, distance_threshold=None):
+    """Validate and insert records in batches of batch_size; returns an ImportReport.
+
+    project is used for records without a project column. With skip_duplicates, records
+    that cluster with an earlier record of the same batch (the clustering used by
+    ai_filter_unique_defects) or fall within distance_threshold of an existing
+    duplicate group of their project are counted as duplicates and not inserted.
+    """
+    if distance_threshold is None:
+        distance_threshold = settings.AI_FILTER_UNIQUE_DEFECTS_THRESHOLD
+    report = ImportReport()
+    projects = {}
+    batch = []
+    for row_number, record in enumerate(records, 1):
+        report.rows += 1
+        batch.append((row_number, record))
+        if len(batch) >= batch_size:
+            _import_batch(batch, user, project, projects, skip_duplicates, distance_threshold, report)
+            batch = []
+    if batch:
+        _import_batch(batch, user, project, projects, skip_duplicates, distance_threshold, report)
+    report.errors.sort(key=lambda error: error['row'])
+    report.seconds = time.monotonic() - report.started
+    return report
+
+def _import_batch(batch, user, project, projects, skip_duplicates, distance_threshold, report):
+    items = []
+    for row_number, record in batch:
+        if not isinstance(record, dict):
+            report.reject(row_number, {'non_field_errors': [str(record) if isinstance(record, Exception) else 'Expected an object.']})
+            continue
+        item = {key: value for key, value in record.items() if key and value not in ('', None)}
+        if project is not None and 'project' not in item:
+            item['project'] = project.id
+        items.append((row_number, item))
+
+    wanted = set()
+    for _, item in items:
+        try:
+            wanted.add(int(item['project']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    missing = wanted - projects.keys()
+    if missing:
+        projects.update(Project.objects.in_bulk(missing))
+
+    valid = []
+    context = {'projects': projects}
+    for row_number, item in items:
+        serializer = DefectBulkItemSerializer(data=item, context=context)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+        else:
+            report.reject(row_number, serializer.errors)
+    if not valid:
+        return
+
+    vectors = None
+    if skip_duplicates:
+        vectors = encode_texts([defect_text(data) for data in valid])
+        keep = _unique_indexes(valid, vectors, distance_threshold)
+        report.duplicates += len(valid) - len(keep)
+        valid = [valid[i] for i in keep]
+        vectors = [vectors[i] for i in keep]
+        if not valid:
+            return
+    create_defects(valid, user, comments='Imported', vectors=vectors)
+    report.created += len(valid)
+
+def _unique_indexes(valid, vectors, distance_threshold):
+    """Indexes of the records to keep: first of each in-batch cluster, not near an existing group"""
+    first_of_cluster = {}
+    for index, label in enumerate(cluster_labels(vectors, distance_threshold) if len(valid) > 1 else [0]):
+        first_of_cluster.setdefault(label, index)
+    keep = sorted(first_of_cluster.values())
+    centroids = {}
+    for project_id in {valid[i]['project'].id for i in keep}:
+        groups = list(DuplicateGroup.objects.filter(project_id=project_id, dimensions=vectors.shape[1]))
+        centroids[project_id] = normalize_rows(np.vstack(
+            [vector_from_bytes(g.centroid, g.dimensions) for g in groups])) if groups else None
+    result = []
+    for index in keep:
+        existing = centroids[valid[index]['project'].id]
+        if existing is not None and float(np.min(1.0 - existing @ vectors[index])) <= distance_threshold:
+            continue
+        result.append(index)
+    return result
@@ -0,0 +1,167 @@
+"""Shared sentence-transformer inference over a Unix socket.
+
+One process (``manage.py run_inference_server``) owns the model; Django workers
+send encode requests to it and fall back to encoding in-process when it is not
+running. Requests from all connected workers are queued and encoded together.
+
+Wire format, both directions: a 4-byte big-endian length followed by a JSON
+header. A successful response header carries ``rows`` and ``dims`` and is
+followed by ``rows * dims`` little-endian float32 values.
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>I')
+# Windows has no Unix sockets: there the server cannot run and workers always encode in-process
+UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+MAX_HEADER_BYTES = 64 * 1024 * 1024
+
+class InferenceUnavailable(Exception):
+    pass
+
+def _recv_exact(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError('Connection closed mid-message')
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(HEADER.pack(len(data)) + data + payload)
+
+def recv_header(sock):
+    (size,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if size > MAX_HEADER_BYTES:
+        raise ConnectionError('Message too large')
+    return json.loads(_recv_exact(sock, size).decode('utf-8'))
+
+# ---------------------------------------------------------------- client side
+
+_unavailable_until = 0.0
+
+def remote_encode(texts, socket_path, model_name, timeout=10.0, retry_after=5.0):
+    """Encode texts on the inference server, raising InferenceUnavailable if it can't be used"""
+    global _unavailable_until
+    if not UNIX_SOCKETS or time.monotonic() < _unavailable_until or not os.path.exists(socket_path):
+        raise InferenceUnavailable(socket_path)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            send_message(sock, {'model': model_name, 'texts': list(texts)})
+            header = recv_header(sock)
+            if 'error' in header:
+                raise InferenceUnavailable(header['error'])
+            rows, dims = header['rows'], header['dims']
+            payload = _recv_exact(sock, rows * dims * 4)
+    except (OSError, ValueError) as exc:
+        # Don't pay a connect timeout on every request while the server is down
+        _unavailable_until = time.monotonic() + retry_after
+        raise InferenceUnavailable(str(exc)) from exc
+    return np.frombuffer(payload, dtype='<f4').reshape(rows, dims)
+
+# ---------------------------------------------------------------- server side
+
+class _Job:
+    __slots__ = ('texts', 'result', 'error', 'done')
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        try:
+            header = recv_header(self.request)
+        except (OSError, ValueError):
+            return
+        if header.get('model') != server.model_name:
+            send_message(self.request, {'error': f"Server runs {server.model_name}, not {header.get('model')}"})
+            return
+        job = _Job([str(t) for t in header.get('texts', [])])
+        server.jobs.put(job)
+        job.done.wait()
+        if job.error:
+            send_message(self.request, {'error': job.error})
+            return
+        result = np.ascontiguousarray(job.result, dtype='<f4')
+        rows, dims = result.shape if result.ndim == 2 else (0, 0)
+        send_message(self.request, {'rows': rows, 'dims': dims}, result.tobytes())
+
+class InferenceServer(socketserver.ThreadingMixIn, getattr(socketserver, 'UnixStreamServer', socketserver.TCPServer)):
+    """Unix socket server batching encode requests from many connections into one model call"""
+    daemon_threads = True
+
+    def __init__(self, socket_path, model, model_name, batch_size=64, max_wait=0.005):
+        if not UNIX_SOCKETS:
+            raise InferenceUnavailable('Unix sockets are not supported on this platform')
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.model = model
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.jobs = queue.Queue()
+        self._batcher = threading.Thread(target=self._run_batches, daemon=True)
+        self._batcher.start()
+
+    def _next_batch(self):
+        batch = [self.jobs.get()]
+        pending = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while pending < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(job)
+            pending += len(job.texts)
+        return batch
+
+    def _run_batches(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for job in batch for text in job.texts]
+            try:
+                if texts:
+                    encoded = self.model.encode(texts, convert_to_numpy=True, batch_size=self.batch_size)
+                    encoded = np.asarray(encoded, dtype=np.float32)
+                start = 0
+                for job in batch:
+                    end = start + len(job.texts)
+                    job.result = encoded[start:end] if job.texts else np.zeros((0, 0), dtype=np.float32)
+                    start = end
+            except Exception as exc:
+                logger.exception("Batch encode failed")
+                for job in batch:
+                    job.error = str(exc)
+            for job in batch:
+                job.done.set()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryRecorder:
+    """connection.execute_wrapper hook that records each query's SQL and duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+class record_queries:
+    """Context manager installing a QueryRecorder on every configured database connection"""
+
+    def __init__(self):
+        self.recorder = QueryRecorder()
+        self._wrappers = []
+
+    def __enter__(self):
+        for alias in connections:
+            wrapper = connections[alias].execute_wrapper(self.recorder)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self.recorder
+
+    def __exit__(self, *exc_info):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(*exc_info)
+
+def query_budget(max_queries):
+    """Declare how many queries a view may run; log (or raise with QUERY_BUDGET_RAISE) when it runs more.
+
+    Works on function views and on class-based view methods; place it directly above the def.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(*args, **kwargs):
+            with record_queries() as recorder:
+                response = view_func(*args, **kwargs)
+            if recorder.count > max_queries:
+                message = '%s ran %d queries, budget is %d' % (view_func.__qualname__, recorder.count, max_queries)
+                if settings.QUERY_BUDGET_RAISE:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapped.query_budget = max_queries
+        return wrapped
+    return decorator
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bVALUES\s*(\((?:\s*\?\s*,)*\s*\?\s*\))(?:\s*,\s*\1)+', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+def fingerprint_sql(sql):
+    """Normalise SQL so queries differing only in literals or IN-list length group together"""
+    fingerprint = _STRING_LITERAL.sub('?', sql)
+    fingerprint = _PLACEHOLDER.sub('?', fingerprint)
+    fingerprint = _NUMBER.sub('?', fingerprint)
+    fingerprint = _IN_LIST.sub('IN (...)', fingerprint)
+    fingerprint = _VALUES_LIST.sub(r'VALUES \1, ...', fingerprint)
+    return _WHITESPACE.sub(' ', fingerprint).strip()
+
+def fingerprint_hash(fingerprint):
+    return hashlib.md5(fingerprint.encode('utf-8')).hexdigest()
+
+def record_slow_queries(queries, path=''):
+    """Add (sql, params, seconds) tuples to the cross-request SlowQueryFingerprint report"""
+    from .models import SlowQueryFingerprint
+    grouped = {}
+    for sql, params, duration in queries:
+        fingerprint = fingerprint_sql(sql)
+        entry = grouped.setdefault(fingerprint, {'sql': sql, 'params': params, 'calls': 0, 'total': 0.0, 'max': 0.0})
+        entry['calls'] += 1
+        entry['total'] += duration * 1000
+        entry['max'] = max(entry['max'], duration * 1000)
+    now = timezone.now()
+    for fingerprint, entry in grouped.items():
+        key = fingerprint_hash(fingerprint)
+        updates = dict(calls=F('calls') + entry['calls'], total_ms=F('total_ms') + entry['total'],
+                       max_ms=Greatest(F('max_ms'), entry['max']), last_seen=now)
+        if SlowQueryFingerprint.objects.filter(fingerprint_hash=key).update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                SlowQueryFingerprint.objects.create(
+                    fingerprint_hash=key, fingerprint=fingerprint, sample_sql=entry['sql'],
+                    sample_params=json.dumps(entry['params'], default=str) if entry['params'] is not None else '',
+                    sample_path=path[:500], calls=entry['calls'], total_ms=entry['total'], max_ms=entry['max'])
+        except IntegrityError:
+            # Another worker created it first
+            SlowQueryFingerprint.objects.filter(fingerprint_hash=key).update(**updates)
+
+def explain_query(sql, params, using='default'):
+    """Execution plan of a recorded SELECT as text, or None for other statements"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[using]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        columns = [col[0] for col in cursor.description]
+        rows = cursor.fetchall()
+    lines = [' | '.join(columns)]
+    lines += [' | '.join('' if v is None else str(v) for v in row) for row in rows]
+    return '\n'.join(lines)
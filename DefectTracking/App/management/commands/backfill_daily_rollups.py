@@ -0,0 +1,21 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from App.models import DefectDailyRollup
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-day defect trend rollups from DefectHistory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help='Project id to backfill (repeatable, defaults to every project)')
+        parser.add_argument('--since', help='Only rebuild days on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a YYYY-MM-DD date')
+        DefectDailyRollup.rebuild(options['projects'], since)
+        self.stdout.write(self.style.SUCCESS('Daily rollups rebuilt'))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from App.uploads import expire_uploads
+
+class Command(BaseCommand):
+    help = 'Delete chunked video uploads that were never finished, and their part files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.VIDEO_UPLOAD_EXPIRY_HOURS,
+                            help='Idle time after which an upload expires (defaults to VIDEO_UPLOAD_EXPIRY_HOURS)')
+
+    def handle(self, *args, **options):
+        expired = expire_uploads(options['hours'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} uploads'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from App.models import DefectScreenshot
+from App.thumbnails import ensure_variants, variant_exists, VARIANTS
+
+class Command(BaseCommand):
+    help = 'Create the thumbnail and preview variants of screenshots that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help='Only screenshots of this project')
+
+    def handle(self, *args, **options):
+        screenshots = DefectScreenshot.objects.exclude(image='')
+        if options['project']:
+            screenshots = screenshots.filter(defect__project_id=options['project'])
+        created = failed = 0
+        for name in screenshots.values_list('image', flat=True).distinct().iterator():
+            if all(variant_exists(name, variant) for variant in VARIANTS):
+                continue
+            try:
+                ensure_variants(name)
+                created += 1
+            except OSError as exc:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{name}: {exc}'))
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {created} images ({failed} failed)'))
@@ -0,0 +1,47 @@
+import os
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from App.importer import IMPORT_FORMATS, import_defects, iter_records
+from App.models import Project
+
+class Command(BaseCommand):
+    help = 'Stream defects from a CSV or NDJSON file into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file')
+        parser.add_argument('--user', required=True, help='Username recorded as the reporter of imported defects')
+        parser.add_argument('--project', type=int, help='Project id for rows without a project column')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='File format (defaults to the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows validated and inserted per batch')
+        parser.add_argument('--skip-duplicates', action='store_true',
+                            help='Skip rows that are near-duplicates of each other or of existing defects')
+        parser.add_argument('--threshold', type=float, default=None,
+                            help='Cosine distance threshold (defaults to AI_FILTER_UNIQUE_DEFECTS_THRESHOLD)')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format == 'jsonl':
+            file_format = 'ndjson'
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError('Pass --format csv or --format ndjson')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        project = None
+        if options['project']:
+            project = Project.objects.filter(id=options['project']).first()
+            if project is None:
+                raise CommandError(f"Project {options['project']} does not exist")
+        with open(options['path'], 'rb') as f:
+            report = import_defects(iter_records(f, file_format), user, project=project,
+                                    batch_size=max(options['batch_size'], 1),
+                                    skip_duplicates=options['skip_duplicates'],
+                                    distance_threshold=options['threshold'])
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['errors']}"))
+        if report.rejected > len(report.errors):
+            self.stdout.write(f'... and {report.rejected - len(report.errors)} more rejected rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} created, {report.duplicates} duplicates skipped, {report.rejected} rejected '
+            f'of {report.rows} rows in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s)'))
@@ -0,0 +1,82 @@
+import os
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from App.models import Defect, DefectScreenshot, MediaBlob
+from App.storage import content_addressed_storage, file_sha256, is_blob_name, purge_blob
+
+# (model, file field) pairs stored in ContentAddressedStorage
+MEDIA_FIELDS = ((DefectScreenshot, 'image'), (Defect, 'defect_video'))
+
+def _references():
+    counts = Counter()
+    for model, field in MEDIA_FIELDS:
+        counts.update(name for name in model.objects.values_list(field, flat=True).iterator() if is_blob_name(name))
+    return counts
+
+class Command(BaseCommand):
+    help = 'Report content-addressed media usage, move legacy uploads into it, or repair reference counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help='Move files stored under their upload names into content-addressed storage')
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Recount references from the database and delete unreferenced blobs')
+
+    def handle(self, *args, **options):
+        if options['adopt_legacy']:
+            self.adopt_legacy()
+        if options['reconcile']:
+            self.reconcile()
+        from App.storage import media_stats
+        stats = media_stats()
+        self.stdout.write(
+            f"{stats['blobs']} blobs, {stats['references']} references, "
+            f"{stats['stored_bytes']} bytes stored for {stats['referenced_bytes']} bytes referenced")
+        self.stdout.write(self.style.SUCCESS(f"Deduplication saves {stats['saved_bytes']} bytes"))
+
+    def adopt_legacy(self):
+        storage = content_addressed_storage()
+        moved = missing = 0
+        for model, field in MEDIA_FIELDS:
+            legacy = Counter(name for name in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                             .values_list(field, flat=True).iterator() if not is_blob_name(name))
+            for old_name, rows in legacy.items():
+                path = storage.path(old_name)
+                if not os.path.exists(path):
+                    missing += 1
+                    self.stdout.write(self.style.WARNING(f'Missing file: {old_name}'))
+                    continue
+                sha256, size = file_sha256(path)
+                with transaction.atomic():
+                    new_name = storage.adopt(path, sha256, size, os.path.splitext(old_name)[1], move=True)
+                    if rows > 1:
+                        MediaBlob.acquire(new_name, sha256, size, rows - 1)
+                    model.objects.filter(**{field: old_name}).update(**{field: new_name})
+                if os.path.exists(path):
+                    # The blob already existed, so this copy is redundant
+                    os.remove(path)
+                moved += 1
+        self.stdout.write(f'Adopted {moved} legacy files ({missing} missing)')
+
+    def reconcile(self):
+        storage = content_addressed_storage()
+        references = _references()
+        fixed = purged = 0
+        for blob in MediaBlob.objects.iterator():
+            count = references.pop(blob.name, 0)
+            if blob.refcount != count:
+                MediaBlob.objects.filter(pk=blob.pk).update(refcount=count)
+                fixed += 1
+            if count == 0:
+                purge_blob(blob.name)
+                purged += 1
+        for name, count in references.items():
+            path = storage.path(name)
+            if os.path.exists(path):
+                sha256, size = file_sha256(path)
+                MediaBlob.objects.create(name=name, sha256=sha256, size=size, refcount=count)
+                fixed += 1
+            else:
+                self.stdout.write(self.style.WARNING(f'Referenced blob is missing: {name}'))
+        self.stdout.write(f'Fixed {fixed} reference counts, deleted {purged} unreferenced blobs')
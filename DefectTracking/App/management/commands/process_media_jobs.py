@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django import db
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from App.image_processing import process_image
+from App.media_jobs import claim_jobs, complete_job, fail_job, process_job_args, requeue_stale, tmp_dir
+
+class Command(BaseCommand):
+    help = 'Process queued screenshot uploads (verify, strip EXIF, recompress, thumbnail) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.MEDIA_JOB_WORKERS,
+                            help='Number of image processes (defaults to MEDIA_JOB_WORKERS)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Jobs claimed at a time (defaults to twice the worker count)')
+        parser.add_argument('--poll-interval', type=float, default=settings.MEDIA_JOB_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        batch_size = options['batch_size'] or workers * 2
+        work_dir = tmp_dir()
+        # Pool processes only run image_processing, which needs no Django setup when they are spawned;
+        # forked ones must not share the parent's connections
+        db.connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            self.stdout.write(self.style.SUCCESS(f'Processing media jobs with {workers} workers'))
+            try:
+                while True:
+                    requeue_stale(settings.MEDIA_JOB_STALE_AFTER)
+                    jobs = claim_jobs(batch_size)
+                    if not jobs:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    futures = {pool.submit(process_image, *process_job_args(job, work_dir)): job for job in jobs}
+                    for future in as_completed(futures):
+                        job = futures[future]
+                        try:
+                            complete_job(job, future.result())
+                            done += 1
+                        except Exception as exc:
+                            if fail_job(job, exc):
+                                failed += 1
+                                self.stdout.write(self.style.WARNING(f'Job {job.pk} ({job.source_name}) failed: {exc}'))
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} media jobs ({failed} failed)'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from App.ai_utils import rebuild_duplicate_groups
+from App.models import Project
+
+class Command(BaseCommand):
+    help = ('Recompute the persisted duplicate groups of a project from scratch; run it after the embedding '
+            'model or inference server was unavailable, which leaves new defects ungrouped')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help='Project id to rebuild (repeatable)')
+        parser.add_argument('--all', action='store_true', help='Rebuild every project')
+        parser.add_argument('--threshold', type=float, default=None,
+                            help='Cosine distance threshold (defaults to AI_FILTER_UNIQUE_DEFECTS_THRESHOLD)')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            projects = Project.objects.all()
+        elif options['projects']:
+            projects = Project.objects.filter(id__in=options['projects'])
+        else:
+            raise CommandError('Pass --project <id> or --all')
+        for project in projects:
+            count = rebuild_duplicate_groups(project, options['threshold'])
+            self.stdout.write(f'{project.name}: {count} duplicate groups')
+        self.stdout.write(self.style.SUCCESS('Duplicate groups rebuilt'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from App.search import rebuild_fulltext_index
+
+class Command(BaseCommand):
+    help = ('Recreate the SQLite full-text table and the triggers that keep it in sync, then reindex every '
+            'defect; run it when the search_index check reports them missing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (default: "default")')
+
+    def handle(self, *args, **options):
+        if rebuild_fulltext_index(options['database']):
+            self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
+        else:
+            self.stdout.write('Only SQLite keeps a separate search index; nothing to rebuild')
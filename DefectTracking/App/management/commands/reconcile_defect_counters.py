@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from App.models import Defect, DefectCounter
+
+class Command(BaseCommand):
+    help = 'Compare the maintained defect counters with the Defect table and rebuild them if they drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not rebuild')
+
+    def handle(self, *args, **options):
+        key = DefectCounter.KEY_FIELDS
+        expected = {tuple(row[f] for f in key): row['total'] for row in
+                    Defect.objects.order_by().values(*key).annotate(total=Count('defect_id'))}
+        stored = {tuple(row[f] for f in key): row['count'] for row in
+                  DefectCounter.objects.exclude(count=0).values(*key, 'count')}
+        drifted = sorted(k for k in expected.keys() | stored.keys() if expected.get(k, 0) != stored.get(k, 0))
+        for k in drifted:
+            self.stdout.write(f'{dict(zip(key, k))}: stored {stored.get(k, 0)}, actual {expected.get(k, 0)}')
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Defect counters are consistent'))
+            return
+        if options['check']:
+            self.stdout.write(self.style.WARNING(f'{len(drifted)} counters drifted'))
+            return
+        DefectCounter.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt defect counters ({len(drifted)} had drifted)'))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from App.ai_utils import MODEL_NAME, get_model
+from App.inference import UNIX_SOCKETS, InferenceServer
+
+class Command(BaseCommand):
+    help = 'Run the shared sentence-transformer inference server on a Unix socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.AI_INFERENCE_SOCKET,
+                            help='Unix socket path (defaults to AI_INFERENCE_SOCKET)')
+        parser.add_argument('--batch-size', type=int, default=settings.AI_INFERENCE_BATCH_SIZE,
+                            help='Maximum number of texts encoded in one model call')
+        parser.add_argument('--max-wait-ms', type=int, default=settings.AI_INFERENCE_MAX_WAIT_MS,
+                            help='How long to wait for more requests before encoding a batch')
+
+    def handle(self, *args, **options):
+        if not UNIX_SOCKETS:
+            raise CommandError('The inference server needs Unix sockets, which this platform does not have')
+        socket_path = options['socket']
+        if not socket_path:
+            raise CommandError('Set AI_INFERENCE_SOCKET or pass --socket')
+        self.stdout.write(f'Loading {MODEL_NAME}...')
+        server = InferenceServer(
+            socket_path,
+            get_model(),
+            MODEL_NAME,
+            batch_size=options['batch_size'],
+            max_wait=options['max_wait_ms'] / 1000.0,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Inference server listening on {socket_path}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from App.instrumentation import explain_query
+from App.models import SlowQueryFingerprint
+import json
+
+class Command(BaseCommand):
+    help = 'Report slow SQL fingerprints recorded by QueryInstrumentationMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Number of fingerprints to show')
+        parser.add_argument('--order', choices=['total', 'max', 'calls'], default='total',
+                            help='Rank by total time, slowest single call, or call count')
+        parser.add_argument('--explain', type=int, default=0, metavar='N',
+                            help='Capture EXPLAIN output for the N worst SELECT fingerprints')
+        parser.add_argument('--reset', action='store_true', help='Delete all recorded fingerprints')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQueryFingerprint.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} fingerprints'))
+            return
+        order = {'total': '-total_ms', 'max': '-max_ms', 'calls': '-calls'}[options['order']]
+        fingerprints = list(SlowQueryFingerprint.objects.order_by(order)[:options['limit']])
+        if not fingerprints:
+            self.stdout.write('No slow queries recorded')
+            return
+        for rank, item in enumerate(fingerprints, 1):
+            if rank <= options['explain']:
+                self.capture_explain(item)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'#{rank}  calls={item.calls}  total={item.total_ms:.1f}ms  '
+                f'avg={item.avg_ms:.1f}ms  max={item.max_ms:.1f}ms  last={item.last_seen:%Y-%m-%d %H:%M}'))
+            self.stdout.write(f'    {item.fingerprint}')
+            if item.sample_path:
+                self.stdout.write(f'    e.g. {item.sample_path}')
+            if item.explain:
+                for line in item.explain.splitlines():
+                    self.stdout.write(f'      {line}')
+
+    def capture_explain(self, item):
+        params = json.loads(item.sample_params) if item.sample_params else None
+        try:
+            plan = explain_query(item.sample_sql, params)
+        except Exception as e:
+            plan = f'EXPLAIN failed: {e}'
+        if plan:
+            item.explain = plan
+            item.save(update_fields=['explain'])
@@ -0,0 +1,100 @@
+"""Screenshot processing off the request path.
+
+Uploads are written to content-addressed storage as received and a ``MediaJob``
+is queued for them. The ``process_media_jobs`` worker claims pending jobs from the
+database and runs ``image_processing.process_image`` in a process pool: the image
+is verified, turned upright, re-encoded without its EXIF block and thumbnailed. The processed
+file then replaces the upload on every screenshot of the defect that used it.
+
+``process_image`` runs in pool processes and only touches files, so it lives in a
+module without Django imports; claiming jobs and recording their results happens
+in the worker's main process.
+"""
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .image_processing import InvalidImage
+from .models import DefectScreenshot, MediaBlob, MediaJob
+from .storage import CAS_PREFIX, content_addressed_storage, release
+
+MAX_ATTEMPTS = 3
+
+def tmp_dir():
+    path = content_addressed_storage().path(os.path.join(CAS_PREFIX, 'tmp'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def process_job_args(job, work_dir):
+    """Arguments for image_processing.process_image, which runs without Django in a pool process"""
+    return source_path(job), work_dir, settings.MEDIA_ROOT
+
+def requeue_stale(older_than):
+    """Put RUNNING jobs whose worker died back in the queue (or fail them after MAX_ATTEMPTS)"""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = MediaJob.objects.filter(status='RUNNING', started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='FAILED', error='Worker stopped while processing', finished_at=timezone.now())
+    return stale.update(status='PENDING') + failed
+
+def claim_jobs(limit):
+    """Mark up to limit pending jobs RUNNING and return them; concurrent workers get disjoint jobs"""
+    with transaction.atomic():
+        ids = list(MediaJob.objects.select_for_update(skip_locked=True)
+                   .filter(status='PENDING').order_by('id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        MediaJob.objects.filter(id__in=ids, status='PENDING').update(
+            status='RUNNING', started_at=timezone.now(), attempts=F('attempts') + 1)
+    return list(MediaJob.objects.filter(id__in=ids, status='RUNNING'))
+
+def source_path(job):
+    return content_addressed_storage().path(job.source_name)
+
+def complete_job(job, result):
+    """Attach the processed file to the defect's screenshots that still use the upload"""
+    storage = content_addressed_storage()
+    with transaction.atomic():
+        name = storage.adopt(result['path'], result['sha256'], result['size'], result['ext'], move=True)
+        count = DefectScreenshot.objects.filter(defect_id=job.defect_id, image=job.source_name).update(image=name)
+        if count == 0:
+            # The screenshots were replaced or deleted while the job ran
+            release(name)
+        elif count > 1:
+            MediaBlob.acquire(name, result['sha256'], result['size'], count - 1)
+        for _ in range(count):
+            release(job.source_name)
+        MediaJob.objects.filter(pk=job.pk).update(
+            status='DONE', result_name=name if count else '', error='', finished_at=timezone.now())
+    if os.path.exists(result['path']):
+        # The processed bytes were already stored, so this copy is redundant
+        os.remove(result['path'])
+
+def fail_job(job, exc):
+    """Record a failure; invalid images are final and their screenshots are removed"""
+    invalid = isinstance(exc, (InvalidImage, FileNotFoundError))
+    if isinstance(exc, FileNotFoundError) and not DefectScreenshot.objects.filter(
+            defect_id=job.defect_id, image=job.source_name).exists():
+        # The screenshots went away (and took the upload with them) before the job ran
+        MediaJob.objects.filter(pk=job.pk).update(status='DONE', finished_at=timezone.now())
+        return False
+    if not invalid and job.attempts < MAX_ATTEMPTS:
+        MediaJob.objects.filter(pk=job.pk).update(status='PENDING', error=str(exc))
+        return False
+    with transaction.atomic():
+        if isinstance(exc, InvalidImage):
+            for screenshot in DefectScreenshot.objects.filter(defect_id=job.defect_id, image=job.source_name):
+                screenshot.delete()
+        MediaJob.objects.filter(pk=job.pk).update(status='FAILED', error=str(exc), finished_at=timezone.now())
+    return True
+
+def media_status(jobs):
+    """Overall state of a defect's media jobs: processing, failed or ready"""
+    statuses = {job.status for job in jobs}
+    if statuses & {'PENDING', 'RUNNING'}:
+        return 'processing'
+    if 'FAILED' in statuses:
+        return 'failed'
+    return 'ready'
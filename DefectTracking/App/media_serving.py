@@ -0,0 +1,170 @@
+"""Serving files from MEDIA_ROOT with the API's access rules.
+
+A file may be fetched with the signed URL an API response handed out, or by a user
+who can view one of the defects it belongs to (screenshots, videos and the
+thumbnail variants of screenshots). The bytes are then sent by nginx
+(``X-Accel-Redirect``), by Apache/lighttpd (``X-Sendfile``) or by a FileResponse
+that answers single byte ranges; under gunicorn the latter goes out through
+``os.sendfile``. Content-addressed names never change meaning, so they carry
+strong ETags and immutable cache headers.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.negotiation import BaseContentNegotiation
+from .image_processing import VARIANT_PREFIX
+from .models import Defect, DefectScreenshot
+from .storage import CAS_PREFIX, blob_name, content_addressed_storage, is_blob_name
+
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+# Served inline; anything else (HTML, SVG, ...) is sent as a download so it cannot run on our origin
+INLINE_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp', 'video/')
+
+class UnsatisfiableRange(Exception):
+    pass
+
+class MediaContentNegotiation(BaseContentNegotiation):
+    """Files go out whatever the Accept header of an <img> or <video> asks for; errors are JSON"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+def is_variant_name(name):
+    return name.startswith(VARIANT_PREFIX + '/')
+
+def media_defects(name):
+    """(project_id, created_by_id, status) of the defects whose screenshots or video use name"""
+    if is_variant_name(name):
+        # variants/aa/bb/<sha>-<size>.webp belongs to the blob cas/aa/bb/<sha>.<ext>
+        key = os.path.basename(name).rsplit('-', 1)[0]
+        screenshots = DefectScreenshot.objects.filter(image__startswith=blob_name(key) + '.')
+        videos = Q(pk__in=[])
+    else:
+        screenshots = DefectScreenshot.objects.filter(image=name)
+        videos = Q(defect_video=name)
+    return Defect.objects.filter(Q(defect_id__in=screenshots.values('defect_id')) | videos).values_list(
+        'project_id', 'created_by_id', 'status')[:100]
+
+def media_etag(name, stat):
+    if is_blob_name(name) or is_variant_name(name):
+        # The content hash is in the name
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    return '"%x-%x"' % (stat.st_size, stat.st_mtime_ns)
+
+def parse_range(header, size):
+    """(start, length) of a single 'bytes=' range, or None to send the whole file"""
+    unit, _, spec = (header or '').partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        # Multiple ranges are allowed to be answered with the full body
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise UnsatisfiableRange
+    return start, min(end, size - 1) - start + 1
+
+class FileRange:
+    """A byte range of an open file that reads, seeks and reports its size as if it were the whole file.
+
+    fileno() is the underlying file's and its position is at the range start, which is
+    what gunicorn's sendfile path reads together with Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.start = start
+        self.end = start + length
+        file.seek(start)
+
+    def tell(self):
+        return self.file.tell() - self.start
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: self.start, os.SEEK_CUR: self.file.tell(), os.SEEK_END: self.end}[whence]
+        return self.file.seek(base + offset) - self.start
+
+    def read(self, size=-1):
+        left = max(self.end - self.file.tell(), 0)
+        return self.file.read(left if size is None or size < 0 else min(size, left))
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+def media_response(request, name):
+    """Response for a stored file the caller may see; None when it is not on disk"""
+    path = content_addressed_storage().path(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    headers = {
+        'ETag': media_etag(name, stat),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if is_blob_name(name) or is_variant_name(name) else REVALIDATE_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if not content_type.startswith(INLINE_TYPES):
+        headers['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(name)
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (headers['ETag'] in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        return _with_headers(HttpResponseNotModified(), headers)
+
+    mode = settings.MEDIA_SERVE_MODE
+    if mode in ('nginx', 'sendfile'):
+        # The web server answers Range and streams the file; we only decide whether it may
+        response = HttpResponse(content_type=content_type)
+        if mode == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_REDIRECT_PREFIX + name)
+        else:
+            response['X-Sendfile'] = path
+        return _with_headers(response, headers)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if request.headers.get('Range') and (not if_range or if_range == headers['ETag']):
+        try:
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return _with_headers(response, headers)
+    file = open(path, 'rb')
+    if byte_range is None:
+        return _with_headers(FileResponse(file, content_type=content_type), headers)
+    start, length = byte_range
+    response = FileResponse(FileRange(file, start, length), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{start + length - 1}/{stat.st_size}'
+    return _with_headers(response, headers)
+
+def _with_headers(response, headers):
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+def is_servable_name(name):
+    """Names under MEDIA_ROOT that belong to a record; work directories are never served"""
+    return not name.startswith((f'{CAS_PREFIX}/tmp/', f'{CAS_PREFIX}/uploads/')) and '..' not in name.split('/')
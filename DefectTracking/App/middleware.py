@@ -0,0 +1,40 @@
+import logging
+import time
+from django.conf import settings
+from .instrumentation import fingerprint_sql, record_queries, record_slow_queries
+
+logger = logging.getLogger(__name__)
+
+class QueryInstrumentationMiddleware:
+    """Record per-request query count and DB time, expose them as Server-Timing, and report slow queries.
+
+    The fingerprinted queries of the request are left on ``request.sql_queries``
+    as (fingerprint, milliseconds) pairs. Queries slower than SLOW_QUERY_THRESHOLD_MS
+    are aggregated into SlowQueryFingerprint; see ``manage.py slow_queries``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SQL_INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.total_time * 1000
+        request.sql_queries = [(fingerprint_sql(sql), duration * 1000) for sql, _, duration in recorder.queries]
+        timing = f'db;dur={db_ms:.1f};desc="{recorder.count} queries", app;dur={total_ms:.1f}'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        logger.debug('%s %s: %d queries, %.1fms in DB', request.method, request.path, recorder.count, db_ms)
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        slow = [query for query in recorder.queries if query[2] >= threshold]
+        if slow:
+            try:
+                record_slow_queries(slow, request.path)
+            except Exception:
+                logger.exception('Could not record slow queries')
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 02:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0021_remove_defect_defect_screenshots_alter_defect_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectEmbedding',
+            fields=[
+                ('defect', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='App.defect')),
+                ('model_name', models.CharField(max_length=100)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('dimensions', models.PositiveIntegerField()),
+                ('vector', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
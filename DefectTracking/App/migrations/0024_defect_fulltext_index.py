@@ -0,0 +1,51 @@
+from django.db import migrations
+
+FTS_TABLE = 'App_defect_fts'
+FIELDS = ('summary', 'steps_to_reproduce', 'actual_result', 'expected_result')
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = apps.get_model('App', 'Defect')._meta.db_table
+    columns = ', '.join(FIELDS)
+    if connection.vendor == 'mysql':
+        schema_editor.execute(f'CREATE FULLTEXT INDEX defect_fulltext ON {table} ({columns})')
+    elif connection.vendor == 'sqlite':
+        new_values = ', '.join(f'new.{f}' for f in FIELDS)
+        old_values = ', '.join(f'old.{f}' for f in FIELDS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, "
+            f"content='{table}', content_rowid='defect_id', tokenize='porter unicode61')")
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.defect_id, {new_values}); END")
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.defect_id, {old_values}); END")
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.defect_id, {old_values}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.defect_id, {new_values}); END")
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = apps.get_model('App', 'Defect')._meta.db_table
+    if connection.vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX defect_fulltext ON {table}')
+    elif connection.vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0023_duplicategroup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
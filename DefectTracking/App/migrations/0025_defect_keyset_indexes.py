@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0024_defect_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='defect',
+            options={'ordering': ['-created_at', '-defect_id']},
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['created_at', 'defect_id'], name='App_defect_created_3e7e2d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['project', 'created_at', 'defect_id'], name='App_defect_project_e4ea09_idx'),
+        ),
+    ]
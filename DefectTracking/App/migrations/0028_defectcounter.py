@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-17 02:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    Defect = apps.get_model('App', 'Defect')
+    DefectCounter = apps.get_model('App', 'DefectCounter')
+    key = ('project_id', 'created_by_id', 'status', 'priority', 'severity', 'mentor_state')
+    rows = Defect.objects.order_by().values(*key).annotate(total=models.Count('defect_id'))
+    DefectCounter.objects.bulk_create(
+        [DefectCounter(count=row.pop('total'), **row) for row in rows], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('App', '0027_userscopeversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=40)),
+                ('priority', models.CharField(max_length=2)),
+                ('severity', models.CharField(max_length=10)),
+                ('mentor_state', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='defect_counters', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='defect_counters', to='App.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='defectcounter',
+            constraint=models.UniqueConstraint(fields=('project', 'created_by', 'status', 'priority', 'severity', 'mentor_state'), name='unique_defect_counter_key'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
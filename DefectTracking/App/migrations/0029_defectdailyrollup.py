@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-17 02:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0028_defectcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('reported', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('invalidated', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='App.project')),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='defectdailyrollup',
+            constraint=models.UniqueConstraint(fields=('project', 'day'), name='unique_daily_rollup'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0029_defectdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['project', 'created_by', 'created_at'], name='App_defect_project_c4fa3a_idx'),
+        ),
+    ]
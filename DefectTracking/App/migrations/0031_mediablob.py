@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-17 02:48
+
+import App.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0030_defect_student_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # storage is not a column attribute; altering only the state keeps SQLite from
+        # rebuilding App_defect (and dropping the full-text triggers from 0024)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='defect',
+                    name='defect_video',
+                    field=models.FileField(blank=True, null=True, storage=App.storage.content_addressed_storage, upload_to='defect_videos/'),
+                ),
+                migrations.AlterField(
+                    model_name='defectscreenshot',
+                    name='image',
+                    field=models.ImageField(storage=App.storage.content_addressed_storage, upload_to='defect_screenshots/'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0033_videoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='defect',
+            name='bulk_batch',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
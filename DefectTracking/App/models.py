@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 import uuid
+from .storage import content_addressed_storage
 
 class Project(models.Model):
     name = models.CharField(max_length=200, unique=True)
@@ -70,27 +71,40 @@ class Mentor(models.Model):
         return JsonResponse({'defects': data})
     
     def get_student_defects(self):
-        # Get all users with role 'student' in mentor's projects
-        student_profiles = UserProfile.objects.filter(
-            projects__in=self.projects.all(),
-            role='student'
-        ).distinct()
-        student_users = [profile.user for profile in student_profiles]
-        # Get defects created by these students
-        return Defect.objects.filter(
-            project__in=self.projects.all(),
-            created_by__in=student_users
-        ).select_related('project', 'created_by')
+        """Defects in this mentor's projects reported by students of those projects"""
+        project_ids = Mentor.projects.through.objects.filter(mentor_id=self.pk).values('project_id')
+        return Defect.objects.reported_by_students(project_ids).select_related('project', 'created_by')
 
 # New model for defect screenshots
 class DefectScreenshot(models.Model):
-    image = models.ImageField(upload_to='defect_screenshots/')
+    image = models.ImageField(upload_to='defect_screenshots/', storage=content_addressed_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     defect = models.ForeignKey('Defect', on_delete=models.CASCADE, related_name='screenshots')
     
     def __str__(self):
         return f"Screenshot {self.id} for Defect #{self.defect.defect_id}"
 
+class DefectQuerySet(models.QuerySet):
+    def for_list(self):
+        """Load the relations DefectListSerializer reads"""
+        return self.select_related('project', 'created_by').prefetch_related('screenshots')
+
+    def for_detail(self):
+        """Load the relations DefectSerializer and DefectDetailSerializer read"""
+        return self.select_related(
+            'project', 'created_by__userprofile', 'approved_by__userprofile'
+        ).prefetch_related('screenshots', 'media_jobs')
+
+    def reported_by_students(self, project_ids):
+        """Defects in project_ids whose reporter is a student of any of those projects.
+
+        project_ids may be a list or a subquery; the student check is a correlated EXISTS,
+        so the whole filter runs as one SQL statement.
+        """
+        is_student = UserProfile.objects.filter(
+            user_id=models.OuterRef('created_by_id'), role='student', projects__in=project_ids)
+        return self.filter(models.Exists(is_student), project_id__in=project_ids)
+
 class Defect(models.Model):
     PRIORITY_CHOICES = [
         ('P1', 'P1 - Critical'),
@@ -143,7 +157,8 @@ class Defect(models.Model):
     # Changed from single ImageField to ManyToMany for multiple screenshots
     # defect_screenshots = models.ImageField(upload_to='defect_screenshots/', blank=True, null=True)
     
-    defect_video = models.FileField(upload_to='defect_videos/', blank=True, null=True)
+    defect_video = models.FileField(upload_to='defect_videos/', storage=content_addressed_storage, blank=True, null=True)
+    duplicate_group = models.ForeignKey('DuplicateGroup', on_delete=models.SET_NULL, null=True, blank=True, related_name='defects')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_defects')
     approved_by = models.ForeignKey(User, related_name='approved_defects', on_delete=models.SET_NULL, null=True, blank=True)
     
@@ -151,14 +166,49 @@ class Defect(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     approved_at = models.DateTimeField(null=True, blank=True)
+    # Set by bulk.create_defects where the database does not return the ids of a multi-row INSERT
+    bulk_batch = models.UUIDField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = DefectQuerySet.as_manager()
 
     def __str__(self):
         return f"Defect #{self.defect_id} - {self.summary[:50]}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if all(field in loaded for field in DefectCounter.KEY_FIELDS):
+            instance._counter_key = tuple(loaded[field] for field in DefectCounter.KEY_FIELDS)
+        if 'defect_video' in loaded:
+            instance._loaded_video = loaded['defect_video'] or ''
+        return instance
+
+    def counter_key(self):
+        return tuple(getattr(self, field) for field in DefectCounter.KEY_FIELDS)
+
+    def _stored_counter_key(self):
+        if hasattr(self, '_counter_key'):
+            return self._counter_key
+        if self.pk is None:
+            return None
+        return Defect.objects.filter(pk=self.pk).values_list(*DefectCounter.KEY_FIELDS).first()
+
     def save(self, *args, **kwargs):
         if self.status == 'APPROVED' and not self.approved_at:
             self.approved_at = timezone.now()
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {f[:-3] if f.endswith('_id') else f for f in update_fields} & DefectCounter.KEY_NAMES:
+            super().save(*args, **kwargs)
+            return
+        # Keep DefectCounter in step with the row in the same transaction
+        with transaction.atomic():
+            previous = self._stored_counter_key()
+            super().save(*args, **kwargs)
+            current = self.counter_key()
+            if previous != current:
+                DefectCounter.apply_deltas({previous: -1, current: 1} if previous else {current: 1})
+            self._counter_key = current
     
     @property
     def defect_screenshots(self):
@@ -168,17 +218,95 @@ class Defect(models.Model):
     def add_screenshot(self, image_file):
         """Helper method to add a screenshot"""
         screenshot = DefectScreenshot.objects.create(defect=self, image=image_file)
+        MediaJob.enqueue([screenshot])
         return screenshot
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-defect_id']
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['priority']),
             models.Index(fields=['project']),
             models.Index(fields=['created_by']),
+            # Keyset pagination walks these newest first
+            models.Index(fields=['created_at', 'defect_id']),
+            models.Index(fields=['project', 'created_at', 'defect_id']),
+            # Student defect lists filter by project and reporter, newest first
+            models.Index(fields=['project', 'created_by', 'created_at']),
+        ]
+
+class DuplicateGroup(models.Model):
+    """Defects of a project whose embeddings lie within the duplicate threshold of each other"""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='duplicate_groups')
+    # Sum of the members' normalised vectors; its direction is the group centroid
+    centroid = models.BinaryField()
+    dimensions = models.PositiveIntegerField()
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Duplicate group {self.id} ({self.size} defects)"
+
+class DefectEmbedding(models.Model):
+    """Sentence embedding of a defect's text, refreshed when the text or model changes"""
+    defect = models.OneToOneField(Defect, on_delete=models.CASCADE, primary_key=True, related_name='embedding')
+    model_name = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    dimensions = models.PositiveIntegerField()
+    vector = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Embedding for Defect #{self.defect_id} ({self.model_name})"
+
+class DefectCounter(models.Model):
+    """Number of defects per (project, reporter, status, priority, severity, mentor state)"""
+    KEY_FIELDS = ('project_id', 'created_by_id', 'status', 'priority', 'severity', 'mentor_state')
+    KEY_NAMES = {'project', 'created_by', 'status', 'priority', 'severity', 'mentor_state'}
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='defect_counters')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='defect_counters')
+    status = models.CharField(max_length=40)
+    priority = models.CharField(max_length=2)
+    severity = models.CharField(max_length=10)
+    mentor_state = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['project', 'created_by', 'status', 'priority', 'severity', 'mentor_state'],
+                name='unique_defect_counter_key'),
         ]
 
+    def __str__(self):
+        return f"{self.project_id}/{self.created_by_id}/{self.status}/{self.priority}: {self.count}"
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Add {key tuple: delta} to the counters, creating missing rows"""
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            filters = dict(zip(cls.KEY_FIELDS, key))
+            if cls.objects.filter(**filters).update(count=models.F('count') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(count=delta, **filters)
+            except IntegrityError:
+                # Created concurrently by another request
+                cls.objects.filter(**filters).update(count=models.F('count') + delta)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every counter from the Defect table"""
+        rows = Defect.objects.order_by().values(*cls.KEY_FIELDS).annotate(total=models.Count('defect_id'))
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(count=row.pop('total'), **row) for row in rows], batch_size=1000)
+
 class DefectHistory(models.Model):
     ACTION_CHOICES = [
         ('CREATED', 'Created'),
@@ -196,4 +324,180 @@ class DefectHistory(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
-        verbose_name_plural = "Defect histories"
\ No newline at end of file
+        verbose_name_plural = "Defect histories"
+
+class DefectDailyRollup(models.Model):
+    """Per-project, per-day counts of DefectHistory actions, for trend charts"""
+    ACTION_COLUMNS = {'CREATED': 'reported', 'APPROVED': 'approved', 'INVALIDATED': 'invalidated'}
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    reported = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    invalidated = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'day'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"Project {self.project_id} on {self.day}: {self.reported} reported, {self.approved} approved, {self.invalidated} invalidated"
+
+    @classmethod
+    def record(cls, project_id, day, action, delta=1):
+        """Add delta to the column tracking action on (project, day); other actions are ignored"""
+        column = cls.ACTION_COLUMNS.get(action)
+        if column is None or not delta:
+            return
+        rows = cls.objects.filter(project_id=project_id, day=day)
+        if rows.update(**{column: models.F(column) + delta}):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(project_id=project_id, day=day, **{column: delta})
+        except IntegrityError:
+            rows.update(**{column: models.F(column) + delta})
+
+    @classmethod
+    def rebuild(cls, project_ids=None, since=None):
+        """Recompute rollups from DefectHistory, optionally limited to some projects and to days >= since"""
+        from django.db.models.functions import TruncDate
+        history = DefectHistory.objects.filter(action__in=cls.ACTION_COLUMNS).annotate(
+            day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        existing = cls.objects.all()
+        if project_ids is not None:
+            history = history.filter(defect__project_id__in=project_ids)
+            existing = existing.filter(project_id__in=project_ids)
+        if since is not None:
+            history = history.filter(day__gte=since)
+            existing = existing.filter(day__gte=since)
+        rows = history.order_by().values('defect__project_id', 'day').annotate(**{
+            column: models.Count('id', filter=models.Q(action=action))
+            for action, column in cls.ACTION_COLUMNS.items()})
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create([
+                cls(project_id=row['defect__project_id'], day=row['day'],
+                    **{column: row[column] for column in cls.ACTION_COLUMNS.values()})
+                for row in rows], batch_size=1000)
+
+class MediaBlob(models.Model):
+    """A file in ContentAddressedStorage and the number of rows referencing it"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+    @classmethod
+    def acquire(cls, name, sha256, size, count=1):
+        """Add references to a blob, creating its row on first use; must run inside a transaction"""
+        if cls.objects.filter(name=name).update(refcount=models.F('refcount') + count):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, sha256=sha256, size=size, refcount=count)
+        except IntegrityError:
+            cls.objects.filter(name=name).update(refcount=models.F('refcount') + count)
+
+    @classmethod
+    def release(cls, name):
+        """Drop a reference; True when none are left"""
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return False
+            blob.refcount = max(blob.refcount - 1, 0)
+            blob.save(update_fields=['refcount'])
+            return blob.refcount == 0
+
+class MediaJob(models.Model):
+    """Post-upload processing of a defect's screenshot, run by the process_media_jobs worker"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    defect = models.ForeignKey(Defect, on_delete=models.CASCADE, related_name='media_jobs')
+    # Storage name of the upload; every screenshot of the defect with this name is processed
+    source_name = models.CharField(max_length=255)
+    result_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    def __str__(self):
+        return f"{self.get_status_display()} job for {self.source_name}"
+
+    @classmethod
+    def enqueue(cls, screenshots):
+        """Queue one job per distinct (defect, file) among screenshots that is not queued yet"""
+        keys = dict.fromkeys((s.defect_id, s.image.name) for s in screenshots if s.image)
+        if not keys:
+            return []
+        queued = set(cls.objects.filter(
+            status='PENDING', defect_id__in={defect_id for defect_id, _ in keys},
+            source_name__in={name for _, name in keys}).values_list('defect_id', 'source_name'))
+        return cls.objects.bulk_create([
+            cls(defect_id=defect_id, source_name=name) for defect_id, name in keys if (defect_id, name) not in queued])
+
+class VideoUpload(models.Model):
+    """A chunked defect video upload in progress; the bytes so far are in uploads.part_path(self)"""
+    STATUS_CHOICES = [
+        ('UPLOADING', 'Uploading'),
+        ('COMPLETE', 'Complete'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    defect = models.ForeignKey(Defect, on_delete=models.CASCADE, related_name='video_uploads')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='UPLOADING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+class UserScopeVersion(models.Model):
+    """Bumped whenever a user's role or project assignments change, so older JWT scope claims go stale"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='scope_version')
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} v{self.version}"
+
+class SlowQueryFingerprint(models.Model):
+    """Slow queries aggregated across requests by their normalised SQL"""
+    fingerprint_hash = models.CharField(max_length=32, unique=True)
+    fingerprint = models.TextField()
+    sample_sql = models.TextField()
+    sample_params = models.TextField(blank=True)
+    sample_path = models.CharField(max_length=500, blank=True)
+    calls = models.PositiveBigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    explain = models.TextField(blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.fingerprint[:100]
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.calls if self.calls else 0.0
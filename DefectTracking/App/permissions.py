@@ -1,5 +1,5 @@
 from rest_framework import  permissions
-from .models import Mentor
+from .access import get_access_scope
 class IsMentor(permissions.BasePermission):
     def has_permission(self, request, view):
-        return Mentor.objects.filter(user=request.user).exists()
\ No newline at end of file
+        return get_access_scope(request).is_mentor
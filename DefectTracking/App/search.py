@@ -0,0 +1,172 @@
+"""Keyword search over defect text with relevance ranking and highlighting.
+
+MySQL uses the FULLTEXT index from migration 0024 (``MATCH ... AGAINST``),
+SQLite uses the FTS5 table kept in sync by triggers (ranked with ``bm25()``),
+and any other backend falls back to ranking substring matches with BM25 in Python.
+
+The SQLite triggers are raw SQL that Django does not track: a migration that
+remakes the defect table drops them and the index silently goes stale. System
+check App.W001 reports that, and ``manage.py rebuild_search_index``
+recreates them.
+"""
+import html
+import math
+import re
+from collections import Counter
+from django.core import checks
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Defect
+
+SEARCH_FIELDS = ('summary', 'steps_to_reproduce', 'actual_result', 'expected_result')
+FTS_TABLE = 'App_defect_fts'
+FTS_TRIGGERS = tuple(f'{FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au'))
+SNIPPET_CHARS = 160
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def tokens(text):
+    return [t.lower() for t in re.findall(r'\w+', text)]
+
+def query_terms(query):
+    return tokens(query)[:20]
+
+def search_defects(query, queryset=None, limit=20, offset=0):
+    """Rank defects in queryset against the query; returns a list of (defect, score)"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if queryset is None:
+        queryset = Defect.objects.all()
+    vendor = connection.vendor
+    if vendor == 'mysql':
+        ranked = _mysql_search(queryset, terms)
+    elif vendor == 'sqlite':
+        ranked = _sqlite_search(queryset, terms)
+    else:
+        return _python_search(queryset, terms)[offset:offset + limit]
+    return [(defect, float(defect.score)) for defect in ranked[offset:offset + limit]]
+
+def _mysql_search(queryset, terms):
+    columns = ', '.join(connection.ops.quote_name(f) for f in SEARCH_FIELDS)
+    match = RawSQL(f'MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)', [' '.join(terms)])
+    return queryset.annotate(score=match).filter(score__gt=0).order_by('-score', '-defect_id')
+
+def _sqlite_search(queryset, terms):
+    fts_query = ' OR '.join(f'"{t}"' for t in terms)
+    table = Defect._meta.db_table
+    matching = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts_query])
+    # bm25() is lower-is-better, negate it so higher scores rank first everywhere
+    score = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."defect_id"', [fts_query])
+    return queryset.filter(defect_id__in=matching).annotate(score=score).order_by('-score', '-defect_id')
+
+def _python_search(queryset, terms):
+    condition = Q()
+    for term in terms:
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': term})
+    total = queryset.count() or 1
+    documents = []
+    for defect in queryset.filter(condition):
+        words = tokens(' '.join(getattr(defect, f) or '' for f in SEARCH_FIELDS))
+        documents.append((defect, Counter(words), len(words)))
+    if not documents:
+        return []
+    average_length = sum(length for _, _, length in documents) / len(documents) or 1
+    document_frequency = Counter(t for _, counts, _ in documents for t in set(terms) if counts[t])
+    ranked = []
+    for defect, counts, length in documents:
+        score = 0.0
+        for term in set(terms):
+            frequency = counts[term]
+            if not frequency:
+                continue
+            idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (
+                frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+        if score > 0:
+            ranked.append((defect, score))
+    ranked.sort(key=lambda item: (item[1], item[0].defect_id), reverse=True)
+    return ranked
+
+def highlight(text, terms):
+    """HTML-escaped snippet of text around the first match, with matches wrapped in <mark>"""
+    if not text or not terms:
+        return None
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(t) for t in terms) + r')\w*', re.IGNORECASE)
+    first = pattern.search(text)
+    if first is None:
+        return None
+    start = max(0, first.start() - SNIPPET_CHARS // 4)
+    end = min(len(text), start + SNIPPET_CHARS)
+    snippet = text[start:end]
+    parts = []
+    last = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group(0))}</mark>')
+        last = match.end()
+    parts.append(html.escape(snippet[last:]))
+    return ('…' if start else '') + ''.join(parts) + ('…' if end < len(text) else '')
+
+def highlights(defect, query):
+    terms = query_terms(query)
+    result = {}
+    for field in SEARCH_FIELDS:
+        snippet = highlight(getattr(defect, field), terms)
+        if snippet:
+            result[field] = snippet
+    return result
+
+def missing_fulltext_objects(using=DEFAULT_DB_ALIAS):
+    """Names of the SQLite FTS table and sync triggers that do not exist"""
+    if connections[using].vendor != 'sqlite':
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                       [f'{FTS_TABLE}%'])
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in (FTS_TABLE, *FTS_TRIGGERS) if name not in existing]
+
+def rebuild_fulltext_index(using=DEFAULT_DB_ALIAS):
+    """Recreate the SQLite FTS table and its triggers (as in migration 0024) and reindex every defect"""
+    if connections[using].vendor != 'sqlite':
+        return False
+    table = Defect._meta.db_table
+    columns = ', '.join(SEARCH_FIELDS)
+    new_values = ', '.join(f'new.{f}' for f in SEARCH_FIELDS)
+    old_values = ', '.join(f'old.{f}' for f in SEARCH_FIELDS)
+    delete_old = (f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+                  f"VALUES ('delete', old.defect_id, {old_values});")
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.defect_id, {new_values});"
+    ai, ad, au = FTS_TRIGGERS
+    with connections[using].cursor() as cursor:
+        for trigger in FTS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, "
+            f"content='{table}', content_rowid='defect_id', tokenize='porter unicode61')")
+        cursor.execute(f'CREATE TRIGGER {ai} AFTER INSERT ON {table} BEGIN {insert_new} END')
+        cursor.execute(f'CREATE TRIGGER {ad} AFTER DELETE ON {table} BEGIN {delete_old} END')
+        cursor.execute(f'CREATE TRIGGER {au} AFTER UPDATE ON {table} BEGIN {delete_old} {insert_new} END')
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+@checks.register(checks.Tags.database)
+def check_fulltext_index(app_configs=None, databases=None, **kwargs):
+    errors = []
+    for alias in databases or ():
+        # Before the first migrate there is nothing to check
+        if Defect._meta.db_table not in connections[alias].introspection.table_names():
+            continue
+        missing = missing_fulltext_objects(alias)
+        if missing:
+            errors.append(checks.Warning(
+                f"Full-text search objects are missing from database '{alias}': {', '.join(missing)}",
+                hint='A migration that remade the defect table drops them; run manage.py rebuild_search_index.',
+                id='App.W001',
+            ))
+    return errors
@@ -4,9 +4,14 @@ from django.contrib.auth.models import User
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from streamlit import user
-from .models import Project, UserProfile, Defect, Mentor, DefectHistory, DefectScreenshot
+from .models import Project, UserProfile, Defect, Mentor, DefectHistory, DefectScreenshot, MediaJob
 from django.conf import settings
-from urllib.parse import urljoin
+from urllib.parse import urlencode, urljoin
+from django.urls import reverse
+from .storage import signed_media_params
+from .thumbnails import variant_name
+from django.core.validators import validate_image_file_extension
+from .media_jobs import media_status
 
 def get_full_media_url(path):
     if not path:
@@ -94,9 +99,46 @@ class DefectScreenshotSerializer(serializers.ModelSerializer):
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.image.url)
-            return settings.MEDIA_URL + str(obj.image)
+            return obj.image.url
         return None
 
+class DefectScreenshotListSerializer(DefectScreenshotSerializer):
+    """Screenshot with downscaled variants, for list pages"""
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
+
+    class Meta(DefectScreenshotSerializer.Meta):
+        fields = DefectScreenshotSerializer.Meta.fields + ['thumbnail_url', 'preview_url']
+
+    def get_thumbnail_url(self, obj):
+        return screenshot_variant_url(obj, 'thumbnail', self.context.get('request'))
+
+    def get_preview_url(self, obj):
+        return screenshot_variant_url(obj, 'preview', self.context.get('request'))
+
+def screenshot_variant_url(screenshot, variant, request=None):
+    """Signed URL of the endpoint that redirects to a variant, generating it on first request.
+
+    It is signed like other media URLs, so an <img> can load it without a token. Nothing
+    is read from disk, and the URL is kept on the instance for the rest of the response.
+    """
+    if not screenshot.image:
+        return None
+    urls = screenshot.__dict__.setdefault('_variant_urls', {})
+    if variant not in urls:
+        params = signed_media_params(variant_name(screenshot.image.name, variant))
+        urls[variant] = f"{reverse('screenshot_variant', args=[screenshot.id, variant])}?{urlencode(params)}"
+    return request.build_absolute_uri(urls[variant]) if request else urls[variant]
+
+class UploadedImageField(serializers.FileField):
+    """Image upload checked by extension only; the media worker decodes and verifies it"""
+    default_validators = [validate_image_file_extension]
+
+class MediaJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MediaJob
+        fields = ['id', 'source_name', 'status', 'attempts', 'error', 'created_at', 'finished_at']
+
 class DefectSerializer(serializers.ModelSerializer):
     created_by_name = serializers.SerializerMethodField()
     approved_by_name = serializers.SerializerMethodField()
@@ -106,6 +148,8 @@ class DefectSerializer(serializers.ModelSerializer):
     priority = serializers.CharField()
     screenshots = DefectScreenshotSerializer(many=True, read_only=True)
     defect_video = serializers.FileField(use_url=True, required=False, allow_null=True)
+    media_status = serializers.SerializerMethodField()
+    media_jobs = MediaJobSerializer(many=True, read_only=True)
     application_url = serializers.CharField(read_only=True)
 
     def get_created_by_name(self, obj):
@@ -125,16 +169,19 @@ class DefectSerializer(serializers.ModelSerializer):
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.defect_video.url)
-            return settings.MEDIA_URL + str(obj.defect_video)
+            return obj.defect_video.url
         return None
+
+    def get_media_status(self, obj):
+        return media_status(obj.media_jobs.all())
     
     class Meta:
         model = Defect
-        fields = '__all__'
+        exclude = ['bulk_batch']
 
 class DefectCreateSerializer(serializers.ModelSerializer):
     defect_screenshots = serializers.ListField(
-        child=serializers.ImageField(required=False, allow_null=True),
+        child=UploadedImageField(required=False, allow_null=True),
         required=False,
         allow_null=True,
         write_only=True
@@ -182,6 +229,16 @@ class DefectCreateSerializer(serializers.ModelSerializer):
         )
         return defect
 
+class DefectBulkItemSerializer(DefectCreateSerializer):
+    """One item of a bulk create; projects are resolved once per batch through context['projects']"""
+    project = serializers.IntegerField()
+
+    def validate_project(self, value):
+        project = self.context['projects'].get(value)
+        if project is None:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return project
+
 class DefectListSerializer(serializers.ModelSerializer):
     project = serializers.CharField(source='project.name', read_only=True)
     reported_by = serializers.CharField(source='created_by.username', read_only=True)
@@ -190,15 +247,29 @@ class DefectListSerializer(serializers.ModelSerializer):
     severity = serializers.CharField(read_only=True)
     priority = serializers.CharField(read_only=True)
     application_url = serializers.CharField(read_only=True)
-    screenshots = DefectScreenshotSerializer(many=True, read_only=True)
+    screenshots = DefectScreenshotListSerializer(many=True, read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     defect_video = serializers.SerializerMethodField()
+
+    def _first_screenshot(self, obj):
+        screenshots = obj.screenshots.all()
+        return screenshots[0] if screenshots else None
+
+    def get_thumbnail_url(self, obj):
+        screenshot = self._first_screenshot(obj)
+        return screenshot_variant_url(screenshot, 'thumbnail', self.context.get('request')) if screenshot else None
+
+    def get_preview_url(self, obj):
+        screenshot = self._first_screenshot(obj)
+        return screenshot_variant_url(screenshot, 'preview', self.context.get('request')) if screenshot else None
     
     def get_defect_video(self, obj):
         if obj.defect_video:
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.defect_video.url)
-            return settings.MEDIA_URL + str(obj.defect_video)
+            return obj.defect_video.url
         return None
 
     class Meta:
@@ -215,6 +286,8 @@ class DefectListSerializer(serializers.ModelSerializer):
             'environment',
             'application_url',
             'screenshots',
+            'thumbnail_url',
+            'preview_url',
             'defect_video',
             'mentor_state'
         ]
@@ -226,29 +299,36 @@ class DefectDetailSerializer(serializers.ModelSerializer):
     screenshots = DefectScreenshotSerializer(many=True, read_only=True)
     defect_video = serializers.SerializerMethodField()
     application_url = serializers.CharField()
+    media_status = serializers.SerializerMethodField()
+    media_jobs = MediaJobSerializer(many=True, read_only=True)
     
     def get_defect_video(self, obj):
         if obj.defect_video:
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(obj.defect_video.url)
-            return settings.MEDIA_URL + str(obj.defect_video)
+            return obj.defect_video.url
         return None
 
+    def get_media_status(self, obj):
+        return media_status(obj.media_jobs.all())
+
     class Meta:
         model = Defect
         fields = ['defect_id', 'project', 'summary', 'priority', 'steps_to_reproduce',
                   'actual_result', 'expected_result', 'reported_by', 'approved_by',
-                  'created_at', 'updated_at', 'approved_at', 'environment', 'screenshots','defect_video','status','application_url','severity','mentor_state']
+                  'created_at', 'updated_at', 'approved_at', 'environment', 'screenshots','defect_video','status','application_url','severity','mentor_state',
+                  'media_status', 'media_jobs']
         read_only_fields = ['defect_id', 'project', 'reported_by', 'approved_by',
-                            'created_at', 'updated_at', 'approved_at', 'environment','screenshots','defect_video','application_url']
+                            'created_at', 'updated_at', 'approved_at', 'environment','screenshots','defect_video','application_url',
+                            'media_status', 'media_jobs']
 
 class DefectUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating defect details"""
     status = serializers.ChoiceField(choices=['OPEN', 'CLOSED', 'REOPEN'])
     mentor_state = serializers.ChoiceField(choices=['Pending', 'Approved', 'Invalid'])
     defect_screenshots = serializers.ListField(
-        child=serializers.ImageField(required=False, allow_null=True),
+        child=UploadedImageField(required=False, allow_null=True),
         required=False,
         allow_null=True,
         write_only=True
@@ -285,16 +365,12 @@ class DefectUpdateSerializer(serializers.ModelSerializer):
                     instance.add_screenshot(screenshot_file)
             changes['defect_screenshots'] = {'old': 'existing', 'new': 'updated'}
 
-        # Handle video update
+        # Handle video update; the release_replaced_video receiver drops the old blob's reference on save
         if defect_video is not None:
             if defect_video == '':
-                if instance.defect_video:
-                    instance.defect_video.delete(save=False)
                 instance.defect_video = None
                 changes['defect_video'] = {'old': 'exists', 'new': 'removed'}
             else:
-                if instance.defect_video:
-                    instance.defect_video.delete(save=False)
                 instance.defect_video = defect_video
                 changes['defect_video'] = {'old': 'exists', 'new': 'updated'}
         
@@ -345,4 +421,19 @@ class DefectActionSerializer(serializers.Serializer):
         required=False,
         allow_blank=True,
         help_text="Optional comments for the action"
+    )
+
+class DefectBulkActionSerializer(serializers.Serializer):
+    """Serializer for approving or invalidating many defects at once"""
+    defect_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=500,
+        help_text="Defects to act on"
+    )
+    action = serializers.ChoiceField(choices=['approve', 'invalidate'])
+    comments = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Optional comments recorded in each defect's history"
     )
\ No newline at end of file
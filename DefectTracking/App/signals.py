@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Defect, DefectCounter, DefectDailyRollup, DefectHistory, DefectScreenshot, Mentor, UserProfile
+from .storage import release as release_media
+from .access import invalidate_access_scope
+from .ai_utils import (EMBEDDING_TEXT_FIELDS, assign_duplicate_group, indexing_errors_logged, leave_duplicate_group,
+                       sync_defect_embeddings)
+
+@receiver(post_save, sender=Defect)
+def update_defect_embedding(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the stored embedding and duplicate group in step with the defect text"""
+    if kwargs.get('raw') or getattr(instance, '_defer_embedding', False):
+        # Bulk writers index the whole batch themselves once it is committed
+        return
+    if update_fields is not None and not set(update_fields) & set(EMBEDDING_TEXT_FIELDS):
+        return
+    # Encoding is slow; run it after the save commits rather than inside its transaction
+    transaction.on_commit(lambda: refresh_defect_index(instance, created))
+
+def refresh_defect_index(defect, created):
+    with indexing_errors_logged("Could not refresh embedding for defect %s", defect.pk):
+        vectors, reencoded = sync_defect_embeddings([defect])
+        with transaction.atomic():
+            if defect.pk in reencoded and not created:
+                leave_duplicate_group(defect)
+            if defect.duplicate_group_id is None:
+                assign_duplicate_group(defect, vectors[defect.pk])
+
+@receiver(post_delete, sender=Defect)
+def decrement_defect_counter(sender, instance, **kwargs):
+    # Runs inside the deletion's transaction, including queryset and cascade deletes
+    DefectCounter.apply_deltas({instance.counter_key(): -1})
+
+@receiver(post_save, sender=Defect)
+def release_replaced_video(sender, instance, created, **kwargs):
+    current = instance.defect_video.name or ''
+    previous = getattr(instance, '_loaded_video', None)
+    if previous and previous != current:
+        release_media(previous)
+    instance._loaded_video = current
+
+@receiver(post_delete, sender=Defect)
+def release_defect_video(sender, instance, **kwargs):
+    release_media(instance.defect_video.name)
+
+@receiver(post_delete, sender=DefectScreenshot)
+def release_screenshot(sender, instance, **kwargs):
+    release_media(instance.image.name)
+
+@receiver(post_save, sender=DefectHistory)
+def update_daily_rollup(sender, instance, created, **kwargs):
+    if not created or kwargs.get('raw'):
+        return
+    if DefectHistory.defect.is_cached(instance):
+        project_id = instance.defect.project_id
+    else:
+        project_id = Defect.objects.filter(pk=instance.defect_id).values_list('project_id', flat=True).first()
+    if project_id is not None:
+        DefectDailyRollup.record(project_id, timezone.localdate(instance.timestamp), instance.action)
+
+@receiver([post_save, post_delete], sender=Mentor)
+@receiver([post_save, post_delete], sender=UserProfile)
+def drop_access_scope(sender, instance, **kwargs):
+    invalidate_access_scope(instance.user_id)
+
+@receiver(m2m_changed, sender=Mentor.projects.through)
+@receiver(m2m_changed, sender=UserProfile.projects.through)
+def drop_access_scope_on_projects_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_access_scope(instance.user_id)
+        return
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    # instance is a Project; model is Mentor or UserProfile
+    owners = model.objects.filter(pk__in=pk_set) if pk_set else model.objects.filter(projects=instance)
+    invalidate_access_scope(*owners.values_list('user_id', flat=True))
@@ -0,0 +1,160 @@
+"""Content-addressed storage for defect screenshots and videos.
+
+Every file is stored once, under ``cas/<aa>/<bb>/<sha256><ext>``, no matter how
+many rows upload the same bytes. ``MediaBlob`` counts the rows pointing at each
+file; a file is removed when its last reference goes away. Names outside
+``cas/`` (files stored before this backend) are left alone.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+CAS_PREFIX = 'cas'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def blob_name(sha256, ext=''):
+    return f'{CAS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}'
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(CAS_PREFIX + '/')
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def media_signature(name, expires):
+    return salted_hmac('App.storage.media_url', f'{name}:{expires}').hexdigest()
+
+def signed_media_params(name):
+    """expires/sig query parameters letting serve_media hand out name without other credentials.
+
+    The expiry is rounded up to a whole MEDIA_URL_TTL window, so a file's URL stays the same
+    (and cacheable) for at least one window.
+    """
+    ttl = settings.MEDIA_URL_TTL
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return {'expires': expires, 'sig': media_signature(name, expires)}
+
+def check_media_signature(name, expires, sig):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    return expires > time.time() and constant_time_compare(sig or '', media_signature(name, expires))
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content"""
+
+    def get_available_name(self, name, max_length=None):
+        # _save derives the final name from the content, so identical uploads share it
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1]
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk: hash in place and move instead of copying
+            source = content.temporary_file_path()
+            sha256, size = file_sha256(source)
+            return self.adopt(source, sha256, size, ext, move=True)
+        tmp_dir = self.path(os.path.join(CAS_PREFIX, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            return self.adopt(tmp_path, digest.hexdigest(), size, ext, move=True)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def adopt(self, path, sha256, size, ext='', move=False):
+        """Take a reference on the blob for a file already on disk and return its storage name.
+
+        The file is moved (move=True) or copied into place only if the blob is not stored yet.
+        """
+        from .models import MediaBlob
+        name = blob_name(sha256, ext)
+        with transaction.atomic():
+            # Holding the blob row lock keeps a concurrent release from deleting the file under us
+            MediaBlob.acquire(name, sha256, size)
+            target = self.path(name)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if move:
+                    file_move_safe(path, target, allow_overwrite=True)
+                else:
+                    shutil.copyfile(path, target)
+                if self.file_permissions_mode is not None:
+                    os.chmod(target, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        """Drop one reference; the file goes when nothing points at it any more"""
+        if is_blob_name(name):
+            release(name)
+        else:
+            super().delete(name)
+
+    def purge(self, name):
+        super().delete(name)
+
+    def url(self, name):
+        # Only API responses that passed the access checks build these URLs
+        return f'{super().url(name)}?{urlencode(signed_media_params(name))}'
+
+_storage = None
+
+def content_addressed_storage():
+    """Storage callable for FileField(storage=...), so migrations reference it by path"""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
+
+def release(name):
+    """Drop a row's reference to a stored blob, deleting the file after commit if it was the last one"""
+    from .models import MediaBlob
+    if not is_blob_name(name):
+        return
+    if MediaBlob.release(name):
+        transaction.on_commit(lambda: purge_blob(name))
+
+def purge_blob(name):
+    from .models import MediaBlob
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name, refcount__lte=0).first()
+        if blob is None:
+            return
+        content_addressed_storage().purge(name)
+        blob.delete()
+    from .thumbnails import delete_variants
+    delete_variants(name)
+
+def media_stats():
+    """Stored vs. referenced bytes across all blobs"""
+    from django.db.models import Count, F, Sum
+    from .models import MediaBlob
+    stats = MediaBlob.objects.filter(refcount__gt=0).aggregate(
+        blobs=Count('id'), references=Sum('refcount'),
+        stored_bytes=Sum('size'), referenced_bytes=Sum(F('size') * F('refcount')))
+    stats = {key: value or 0 for key, value in stats.items()}
+    stats['saved_bytes'] = stats['referenced_bytes'] - stats['stored_bytes']
+    return stats
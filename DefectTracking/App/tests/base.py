@@ -0,0 +1,75 @@
+"""Fixtures shared by the API tests"""
+import hashlib
+import io
+import re
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+from ..bulk import create_defects
+from ..models import Defect, Mentor, Project, UserProfile
+
+def png_upload(name='screenshot.png', size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+def defect_item(project, summary, **fields):
+    """A validated DefectCreateSerializer payload, as bulk.create_defects takes it"""
+    return dict({'project': project, 'summary': summary, 'priority': 'P2',
+                 'actual_result': 'It crashes', 'expected_result': 'It works'}, **fields)
+
+class FakeModel:
+    """Stands in for SentenceTransformer: a hashed bag of words, so texts sharing words are close"""
+    dimensions = 64
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimensions] += 1
+        return vectors
+
+@override_settings(QUERY_BUDGET_RAISE=True, AI_INFERENCE_SOCKET='')
+class DefectAPITestCase(APITestCase):
+    """Two projects, a mentor of the first and a student in each"""
+
+    def setUp(self):
+        # Access scopes are cached by user id, which the rolled back database hands out again
+        cache.clear()
+        self.model = FakeModel()
+        patcher = mock.patch('App.ai_utils.get_model', return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.project = Project.objects.create(name='Checkout')
+        self.other_project = Project.objects.create(name='Search')
+        self.mentor = self.create_user('mentor')
+        Mentor.objects.create(user=self.mentor, mentor_username='mentor').projects.add(self.project)
+        self.student = self.create_user('student', projects=[self.project])
+        self.other_student = self.create_user('other_student', projects=[self.other_project])
+
+    def create_user(self, username, role='student', projects=()):
+        user = User.objects.create_user(username, f'{username}@example.com', 'password')
+        if role:
+            UserProfile.objects.create(user=user, role=role).projects.add(*projects)
+        return user
+
+    def login(self, user):
+        """Authenticate with a real access token, so the scope comes from its claims"""
+        response = self.client.post('/api/auth/login/', {'username': user.username, 'password': 'password'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def create_defect(self, user, project, summary, **fields):
+        """One defect saved the usual way, so its post_save receivers run"""
+        return Defect.objects.create(created_by=user, **defect_item(project, summary, **fields))
+
+    def make_defects(self, user, project, count, prefix='Broken checkout button'):
+        return create_defects([defect_item(project, f'{prefix} {i}') for i in range(count)], user)
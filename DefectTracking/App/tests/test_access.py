@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from rest_framework_simplejwt.tokens import AccessToken
+from ..access import get_access_scope, get_scope_version
+from ..models import Mentor, UserScopeVersion
+from .base import DefectAPITestCase
+
+class ScopeRevocationTests(DefectAPITestCase):
+
+    def project_defects(self):
+        return self.client.get(f'/api/mentor/projects/{self.project.id}/defects/')
+
+    def test_removed_project_is_denied_to_an_issued_token(self):
+        self.login(self.mentor)
+        self.assertEqual(self.project_defects().status_code, 200)
+        Mentor.objects.get(user=self.mentor).projects.remove(self.project)
+        self.assertEqual(self.project_defects().status_code, 403)
+
+    def test_change_made_by_another_process_is_seen(self):
+        self.assertIn(self.project.id, get_access_scope(User.objects.get(pk=self.mentor.pk)).mentor_project_ids)
+        # Another worker changes the assignment and bumps the version; this process's cache still holds the old scope
+        Mentor.projects.through.objects.filter(mentor__user=self.mentor).delete()
+        UserScopeVersion.objects.filter(user=self.mentor).update(version=F('version') + 1)
+        self.assertNotIn(self.project.id, get_access_scope(User.objects.get(pk=self.mentor.pk)).mentor_project_ids)
+
+    def test_current_token_claims_cost_no_query(self):
+        self.login(self.mentor)
+        with self.assertNumQueries(2):
+            # The user, loaded together with its scope version, and the page of defects
+            response = self.project_defects()
+        self.assertEqual(response.status_code, 200)
+
+
+class StaleClaimTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('client', role='client', projects=[self.project])
+        response = self.client.post('/api/auth/login/', {'username': 'client', 'password': 'password'})
+        self.refresh = response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.other_url = f'/api/client/projects/{self.other_project.id}/defects/'
+
+    def test_stale_claims_fall_back_to_a_reload(self):
+        self.assertEqual(self.client.get(self.other_url).status_code, 404)
+        self.customer.userprofile.projects.add(self.other_project)
+        # Same access token, whose claims still list only the first project
+        self.assertEqual(self.client.get(self.other_url).status_code, 200)
+
+    def test_refresh_restamps_stale_claims(self):
+        before = AccessToken(self.client.post('/api/auth/refresh/', {'refresh': self.refresh}).data['access'])
+        self.customer.userprofile.projects.add(self.other_project)
+        response = self.client.post('/api/auth/refresh/', {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        after = AccessToken(response.data['access'])
+        self.assertEqual(before['projects'], [self.project.id])
+        self.assertEqual(after['projects'], sorted([self.project.id, self.other_project.id]))
+        self.assertEqual(after['scope_version'], get_scope_version(self.customer.pk))
+        self.assertGreater(after['scope_version'], before['scope_version'])
@@ -0,0 +1,47 @@
+from ..models import Defect
+from .base import DefectAPITestCase, defect_item
+
+class BulkEndpointTests(DefectAPITestCase):
+
+    def test_bulk_create_reports_each_item(self):
+        self.login(self.student)
+        response = self.client.post('/api/defects/bulk/', [
+            defect_item(self.project.id, 'First valid bulk defect'),
+            defect_item(self.project.id, 'Short'),
+            defect_item(self.project.id, 'Second valid bulk defect'),
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        first, invalid, second = response.data['results']
+        self.assertIn('summary', invalid['errors'])
+        self.assertEqual(Defect.objects.get(pk=first['defect_id']).summary, 'First valid bulk defect')
+        self.assertEqual(Defect.objects.get(pk=second['defect_id']).history.get().action, 'CREATED')
+
+    def test_bulk_create_rejects_all_invalid(self):
+        self.login(self.student)
+        response = self.client.post('/api/defects/bulk/', [defect_item(self.project.id, 'Short')], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Defect.objects.exists())
+
+    def test_mentor_bulk_action(self):
+        own = self.make_defects(self.student, self.project, 3)
+        foreign = self.make_defects(self.other_student, self.other_project, 1)
+        self.login(self.mentor)
+        ids = [d.pk for d in own] + [foreign[0].pk, 999999]
+        response = self.client.post('/api/mentor/defects/bulk-action/', {'defect_ids': ids, 'action': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], ids[:3])
+        self.assertEqual(response.data['skipped'], [
+            {'defect_id': foreign[0].pk, 'reason': 'out_of_scope'},
+            {'defect_id': 999999, 'reason': 'not_found'}])
+        self.assertEqual(set(Defect.objects.filter(pk__in=ids).values_list('status', flat=True)), {'APPROVED', 'OPEN'})
+        self.assertEqual(Defect.objects.get(pk=foreign[0].pk).status, 'OPEN')
+
+        response = self.client.post('/api/mentor/defects/bulk-action/', {'defect_ids': ids[:1], 'action': 'approve'}, format='json')
+        self.assertEqual(response.data['skipped'], [{'defect_id': ids[0], 'reason': 'already_approved'}])
+
+    def test_bulk_action_is_for_mentors(self):
+        defect = self.make_defects(self.student, self.project, 1)[0]
+        self.login(self.student)
+        response = self.client.post('/api/mentor/defects/bulk-action/', {'defect_ids': [defect.pk], 'action': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 403)
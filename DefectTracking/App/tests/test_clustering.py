@@ -0,0 +1,64 @@
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from ..ai_utils import ai_filter_unique_defects, blocked_cluster_labels, cluster_labels, normalize_rows
+from .base import FakeModel
+
+def components(vectors, distance_threshold):
+    """Reference single-linkage labels from the full similarity matrix"""
+    similar = normalize_rows(vectors) @ normalize_rows(vectors).T >= 1.0 - distance_threshold
+    labels = [-1] * len(vectors)
+    for start in range(len(vectors)):
+        if labels[start] != -1:
+            continue
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            if labels[i] == -1:
+                labels[i] = start
+                stack.extend(np.nonzero(similar[i])[0].tolist())
+    return labels
+
+def same_partition(a, b):
+    return len(set(zip(a, b))) == len(set(a)) == len(set(b))
+
+class BlockedClusteringTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        centers = rng.standard_normal((6, 16))
+        self.vectors = np.vstack([center + 0.15 * rng.standard_normal((20, 16)) for center in centers]).astype(np.float32)
+        rng.shuffle(self.vectors)
+
+    def test_matches_full_matrix_single_linkage(self):
+        labels = blocked_cluster_labels(self.vectors, 0.2, block_size=1024)
+        self.assertTrue(same_partition(labels.tolist(), components(self.vectors, 0.2)))
+
+    def test_result_does_not_depend_on_block_size(self):
+        whole = blocked_cluster_labels(self.vectors, 0.2, block_size=1024)
+        for block_size in (1, 7, 32):
+            self.assertTrue(same_partition(blocked_cluster_labels(self.vectors, 0.2, block_size).tolist(), whole.tolist()))
+
+    def test_chains_are_joined(self):
+        angles = np.radians([0, 20, 40])
+        chain = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        # Neighbours are 20 degrees apart (distance 0.06), the ends 40 degrees (0.23)
+        self.assertEqual(len(set(blocked_cluster_labels(chain, 0.1, block_size=1).tolist())), 1)
+
+    def test_engine_setting_selects_blocked_clustering(self):
+        with override_settings(AI_CLUSTERING_ENGINE='blocked', AI_CLUSTERING_BLOCK_SIZE=8), \
+                mock.patch('App.ai_utils.blocked_cluster_labels', wraps=blocked_cluster_labels) as blocked:
+            cluster_labels(self.vectors, 0.2)
+        blocked.assert_called_once_with(self.vectors, 0.2, 8)
+
+    @override_settings(AI_CLUSTERING_ENGINE='blocked', AI_INFERENCE_SOCKET='')
+    def test_unique_defects_keep_the_oldest_per_cluster(self):
+        defects = [
+            {'summary': 'Checkout button does not respond', 'created_at': '2024-01-02T00:00:00Z'},
+            {'summary': 'Checkout button does not respond on mobile', 'created_at': '2024-01-01T00:00:00Z'},
+            {'summary': 'Password reset email never arrives', 'created_at': '2024-01-03T00:00:00Z'},
+        ]
+        with mock.patch('App.ai_utils.get_model', return_value=FakeModel()):
+            unique = ai_filter_unique_defects(defects, distance_threshold=0.3)
+        self.assertEqual(sorted(d['summary'] for d in unique),
+                         ['Checkout button does not respond on mobile', 'Password reset email never arrives'])
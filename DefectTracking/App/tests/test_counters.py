@@ -0,0 +1,46 @@
+from unittest import mock
+from django.db import connection
+from ..models import Defect, DefectCounter, DefectDailyRollup
+from .base import DefectAPITestCase, defect_item
+
+class CounterConsistencyTests(DefectAPITestCase):
+    """Counters and daily rollups kept up to date by writes match a rebuild from scratch"""
+
+    def assertCountersMatchRebuild(self):
+        counters = set(DefectCounter.objects.filter(count__gt=0).values_list(*DefectCounter.KEY_FIELDS, 'count'))
+        DefectCounter.rebuild()
+        self.assertEqual(counters, set(DefectCounter.objects.values_list(*DefectCounter.KEY_FIELDS, 'count')))
+
+    def assertRollupsMatchRebuild(self):
+        fields = ('project_id', 'day', 'reported', 'approved', 'invalidated')
+        rollups = set(DefectDailyRollup.objects.values_list(*fields))
+        DefectDailyRollup.rebuild()
+        self.assertEqual(rollups, set(DefectDailyRollup.objects.values_list(*fields)))
+
+    def test_writes_keep_counters_and_rollups_consistent(self):
+        self.login(self.student)
+        response = self.client.post('/api/defects/', defect_item(self.project.id, 'Single created defect'), format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/defects/bulk/', [
+            defect_item(self.project.id, f'Bulk created defect {i}', severity='S2') for i in range(6)], format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [result['defect_id'] for result in response.data['results']]
+
+        self.login(self.mentor)
+        self.assertEqual(self.client.patch(f'/api/defects/{ids[0]}/approve/').status_code, 200)
+        response = self.client.post('/api/mentor/defects/bulk-action/',
+                                    {'defect_ids': ids[1:4], 'action': 'invalidate'}, format='json')
+        self.assertEqual(response.data['updated'], ids[1:4])
+        self.assertRollupsMatchRebuild()
+        # Rollups keep counting deleted defects as reported; counters drop them
+        Defect.objects.get(pk=ids[4]).delete()
+        self.assertCountersMatchRebuild()
+
+    def test_bulk_create_without_returned_ids(self):
+        # MySQL cannot return the ids of a multi-row INSERT
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            defects = self.make_defects(self.student, self.project, 4)
+        self.assertEqual([Defect.objects.get(pk=d.pk).summary for d in defects],
+                         [f'Broken checkout button {i}' for i in range(4)])
+        self.assertCountersMatchRebuild()
+        self.assertRollupsMatchRebuild()
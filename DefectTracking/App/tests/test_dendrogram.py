@@ -0,0 +1,61 @@
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..ai_utils import build_dendrogram
+from ..models import DefectEmbedding
+from .base import DefectAPITestCase
+
+class ClientProjectDefectsTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('client', role='client', projects=[self.project])
+        self.defects = [
+            self.create_defect(self.student, self.project, 'Checkout button does not respond', status='APPROVED'),
+            self.create_defect(self.student, self.project, 'Checkout button does not respond on mobile', status='APPROVED'),
+            self.create_defect(self.student, self.project, 'Password reset email never arrives', status='APPROVED'),
+            self.create_defect(self.student, self.project, 'Checkout button hidden', status='NEW'),
+        ]
+        self.url = f'/api/client/projects/{self.project.id}/defects/'
+        self.login(self.customer)
+
+    def summaries(self, response):
+        return [d['summary'] for d in response.data['defects']]
+
+    def test_cold_threshold_path_stays_in_budget(self):
+        # Drop the vectors stored on save so the request has to encode and persist them
+        DefectEmbedding.objects.all().delete()
+        response = self.client.get(self.url, {'threshold': 0.5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DefectEmbedding.objects.count(), 3)
+
+    def test_warm_threshold_path_reuses_the_cached_tree(self):
+        self.client.get(self.url, {'threshold': 0.5})
+        with mock.patch('App.ai_utils.build_dendrogram', wraps=build_dendrogram) as build, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'threshold': 0.1})
+        self.assertEqual(response.status_code, 200)
+        build.assert_not_called()
+        self.assertLessEqual(len(queries), 5)
+
+    def test_threshold_cuts_the_tree(self):
+        self.assertEqual(len(self.summaries(self.client.get(self.url, {'threshold': 0}))), 3)
+        self.assertEqual(self.summaries(self.client.get(self.url, {'threshold': 2})),
+                         ['Checkout button does not respond'])
+        self.assertEqual(sorted(self.summaries(self.client.get(self.url, {'threshold': 0.3}))),
+                         ['Checkout button does not respond', 'Password reset email never arrives'])
+
+    def test_new_approval_invalidates_the_cached_tree(self):
+        self.client.get(self.url, {'threshold': 0})
+        self.defects[3].status = 'APPROVED'
+        self.defects[3].save()
+        self.assertEqual(len(self.summaries(self.client.get(self.url, {'threshold': 0}))), 4)
+
+    def test_grouped_path_stays_in_budget(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Checkout button hidden', self.summaries(response))
+
+    def test_invalid_threshold(self):
+        self.assertEqual(self.client.get(self.url, {'threshold': 'near'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'threshold': 3}).status_code, 400)
@@ -0,0 +1,72 @@
+from ..ai_utils import rebuild_duplicate_groups, unique_defects_queryset
+from ..bulk import create_defects
+from ..models import Defect, DuplicateGroup
+from .base import DefectAPITestCase, defect_item
+
+class DuplicateGroupTests(DefectAPITestCase):
+    """New and edited defects are placed into persisted duplicate groups without reclustering"""
+
+    def create(self, summary, project=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            defect = self.create_defect(self.student, project or self.project, summary,
+                                        actual_result='', expected_result='')
+        defect.refresh_from_db()
+        return defect
+
+    def test_near_duplicates_share_a_group(self):
+        first = self.create('Checkout button does not respond')
+        second = self.create('Checkout button does not respond on mobile')
+        other = self.create('Password reset email never arrives')
+        self.assertIsNotNone(first.duplicate_group_id)
+        self.assertEqual(second.duplicate_group_id, first.duplicate_group_id)
+        self.assertNotEqual(other.duplicate_group_id, first.duplicate_group_id)
+        self.assertEqual(DuplicateGroup.objects.get(pk=first.duplicate_group_id).size, 2)
+
+    def test_groups_do_not_span_projects(self):
+        first = self.create('Checkout button does not respond')
+        elsewhere = self.create('Checkout button does not respond', project=self.other_project)
+        self.assertNotEqual(elsewhere.duplicate_group_id, first.duplicate_group_id)
+
+    def test_edited_text_moves_the_defect(self):
+        first = self.create('Checkout button does not respond')
+        second = self.create('Checkout button does not respond on mobile')
+        with self.captureOnCommitCallbacks(execute=True):
+            second.summary = 'Password reset email never arrives'
+            second.save()
+        second.refresh_from_db()
+        self.assertNotEqual(second.duplicate_group_id, first.duplicate_group_id)
+        self.assertEqual(DuplicateGroup.objects.get(pk=first.duplicate_group_id).size, 1)
+
+    def test_unique_defects_keep_the_oldest_of_each_group(self):
+        first = self.create('Checkout button does not respond')
+        self.create('Checkout button does not respond on mobile')
+        other = self.create('Password reset email never arrives')
+        unique = unique_defects_queryset(Defect.objects.filter(project=self.project))
+        self.assertEqual(set(unique.values_list('defect_id', flat=True)), {first.pk, other.pk})
+
+    def test_bulk_created_duplicates_are_grouped_together(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            defects = create_defects([
+                defect_item(self.project, summary, actual_result='', expected_result='') for summary in (
+                    'Checkout button does not respond',
+                    'Checkout button does not respond on mobile',
+                    'Password reset email never arrives')], self.student)
+        groups = list(Defect.objects.filter(pk__in=[d.pk for d in defects]).order_by('defect_id')
+                      .values_list('duplicate_group_id', flat=True))
+        self.assertEqual(groups[0], groups[1])
+        self.assertNotEqual(groups[0], groups[2])
+
+    def test_rebuild_matches_incremental_groups(self):
+        for summary in ('Checkout button does not respond', 'Checkout button does not respond on mobile',
+                        'Password reset email never arrives', 'Password reset email arrives late'):
+            self.create(summary)
+
+        def partition():
+            members = {}
+            for defect_id, group_id in Defect.objects.filter(project=self.project).values_list('defect_id', 'duplicate_group_id'):
+                members.setdefault(group_id, set()).add(defect_id)
+            return sorted(sorted(ids) for ids in members.values())
+
+        incremental = partition()
+        self.assertEqual(rebuild_duplicate_groups(self.project), 2)
+        self.assertEqual(partition(), incremental)
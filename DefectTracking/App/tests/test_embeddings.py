@@ -0,0 +1,53 @@
+from unittest import mock
+from ..ai_utils import MODEL_NAME, defect_text, load_defect_embeddings, text_hash
+from ..models import DefectEmbedding
+from .base import DefectAPITestCase
+
+class DefectEmbeddingTests(DefectAPITestCase):
+    """Embeddings are stored per defect and only re-encoded when the defect text changes"""
+
+    def test_embedding_is_stored_once_the_save_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            defect = self.create_defect(self.student, self.project, 'Payment form rejects valid cards')
+        self.assertFalse(DefectEmbedding.objects.exists())
+        self.assertEqual(self.model.encoded, [])
+        for callback in callbacks:
+            callback()
+        embedding = DefectEmbedding.objects.get(defect=defect)
+        self.assertEqual((embedding.model_name, embedding.text_hash), (MODEL_NAME, text_hash(defect_text(defect))))
+        self.assertEqual(embedding.dimensions, self.model.dimensions)
+
+    def test_only_text_changes_reencode(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            defect = self.create_defect(self.student, self.project, 'Payment form rejects valid cards')
+        self.assertEqual(len(self.model.encoded), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            defect.severity = 'S1'
+            defect.save()
+        self.assertEqual(len(self.model.encoded), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            defect.summary = 'Payment form rejects expired cards'
+            defect.save()
+        self.assertEqual(self.model.encoded[1:], [defect_text(defect)])
+        self.assertEqual(DefectEmbedding.objects.get(defect=defect).text_hash, text_hash(defect_text(defect)))
+
+    def test_loading_encodes_only_missing_vectors(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stored = self.create_defect(self.student, self.project, 'Payment form rejects valid cards')
+        missing = self.make_defects(self.student, self.project, 1)[0]
+        self.model.encoded.clear()
+        vectors = load_defect_embeddings([stored.pk, missing.pk])
+        self.assertEqual(set(vectors), {stored.pk, missing.pk})
+        self.assertEqual(self.model.encoded, [defect_text(missing)])
+        self.assertTrue(DefectEmbedding.objects.filter(defect=missing).exists())
+        self.model.encoded.clear()
+        load_defect_embeddings([stored.pk, missing.pk])
+        self.assertEqual(self.model.encoded, [])
+
+    def test_failed_encoding_does_not_fail_the_save(self):
+        with mock.patch.object(self.model, 'encode', side_effect=RuntimeError('model unavailable')):
+            with self.assertLogs('App.ai_utils', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                defect = self.create_defect(self.student, self.project, 'Payment form rejects valid cards')
+        defect.refresh_from_db()
+        self.assertFalse(DefectEmbedding.objects.filter(defect=defect).exists())
+        self.assertIsNone(defect.duplicate_group_id)
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import io
+import json
+from ..export import EXPORT_FIELDS, export_rows
+from ..models import Defect
+from .base import DefectAPITestCase
+
+class ProjectExportTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.approved = self.create_defect(self.student, self.project, 'Approved, with "quotes", and commas',
+                                           status='APPROVED')
+        self.open = self.create_defect(self.student, self.project, 'Still open')
+        self.create_defect(self.other_student, self.other_project, 'Another project')
+        self.url = f'/api/projects/{self.project.id}/defects/export/'
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_csv(self):
+        self.login(self.mentor)
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'project_{self.project.id}_defects.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body.decode('utf-8'))))
+        self.assertEqual(list(rows[0]), list(EXPORT_FIELDS))
+        self.assertEqual([row['summary'] for row in rows], [self.approved.summary, self.open.summary])
+        self.assertEqual(rows[0]['reported_by'], self.student.username)
+
+    def test_ndjson(self):
+        self.login(self.mentor)
+        response, body = self.export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual([row['defect_id'] for row in rows], [self.approved.pk, self.open.pk])
+
+    def test_gzip(self):
+        self.login(self.mentor)
+        response, body = self.export(format='ndjson', gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+        self.assertEqual(len(gzip.decompress(body).decode('utf-8').splitlines()), 2)
+
+    def test_mentor_status_filter(self):
+        self.login(self.mentor)
+        _, body = self.export(format='ndjson', status='open')
+        self.assertEqual([json.loads(line)['defect_id'] for line in body.decode('utf-8').splitlines()], [self.open.pk])
+
+    def test_client_sees_approved_only(self):
+        self.login(self.create_user('client', role='client', projects=[self.project]))
+        _, body = self.export(format='ndjson', status='open')
+        self.assertEqual([json.loads(line)['defect_id'] for line in body.decode('utf-8').splitlines()],
+                         [self.approved.pk])
+
+    def test_errors_are_json(self):
+        self.login(self.other_student)
+        response, body = self.export(format='csv')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('error', json.loads(body))
+        self.login(self.mentor)
+        response, body = self.export(format='xml')
+        self.assertEqual(response.status_code, 404)
+        self.client.credentials()
+        response, body = self.export(format='ndjson')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', json.loads(body))
+
+    def test_rows_are_read_in_batches(self):
+        ids = [d.pk for d in self.make_defects(self.student, self.project, 5)]
+        rows = list(export_rows(Defect.objects.filter(project=self.project), batch_size=2))
+        self.assertEqual([row['defect_id'] for row in rows], [self.approved.pk, self.open.pk, *ids])
@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from ..ai_utils import assign_duplicate_group, refresh_defect_embeddings
+from ..importer import import_defects, iter_records
+from ..models import Defect, DefectEmbedding
+from .base import DefectAPITestCase
+
+CSV = (
+    'summary,priority,actual_result,expected_result\n'
+    'Checkout button does not respond,P1,Nothing happens,Order is placed\n'
+    'Short,P2,x,y\n'
+    '"Search results, sorted wrongly",P3,Oldest first,Newest first\n'
+)
+
+def record(summary, **fields):
+    return dict({'summary': summary, 'priority': 'P2', 'actual_result': 'It crashes', 'expected_result': 'It works'},
+                **fields)
+
+def ndjson(*records):
+    return '\n'.join(record if isinstance(record, str) else json.dumps(record) for record in records).encode('utf-8')
+
+class ImporterTests(DefectAPITestCase):
+
+    def test_csv_rows_are_validated_and_created(self):
+        report = import_defects(iter_records(io.BytesIO(CSV.encode('utf-8')), 'csv'), self.student, project=self.project)
+        self.assertEqual((report.rows, report.created, report.rejected), (3, 2, 1))
+        self.assertEqual(report.errors[0]['row'], 2)
+        self.assertIn('summary', report.errors[0]['errors'])
+        self.assertEqual(sorted(Defect.objects.filter(created_by=self.student).values_list('summary', flat=True)),
+                         ['Checkout button does not respond', 'Search results, sorted wrongly'])
+
+    def test_ndjson_rows_with_their_own_project_and_bad_lines(self):
+        records = iter_records(io.BytesIO(ndjson(
+            record('Filter panel does not close', project=self.other_project.id),
+            '{not json',
+            record('Project that does not exist', project=999),
+            '',
+            ['not', 'an', 'object'],
+        )), 'ndjson')
+        report = import_defects(records, self.student, project=self.project, batch_size=2)
+        self.assertEqual((report.rows, report.created, report.rejected), (4, 1, 3))
+        self.assertEqual([error['row'] for error in report.errors], [2, 3, 4])
+        self.assertEqual(Defect.objects.get(summary='Filter panel does not close').project, self.other_project)
+
+    def test_skip_duplicates_within_the_file_and_against_existing_groups(self):
+        existing = self.create_defect(self.student, self.project, 'Password reset email never arrives')
+        assign_duplicate_group(existing, refresh_defect_embeddings([existing])[existing.pk])
+        records = iter_records(io.BytesIO(ndjson(
+            record('Checkout button does not respond'),
+            record('Checkout button does not respond', priority='P3'),
+            record('Password reset email never arrives'),
+            record('Dark mode colours are wrong'),
+        )), 'ndjson')
+        encoded_before = len(self.model.encoded)
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_defects(records, self.student, project=self.project, skip_duplicates=True,
+                                    distance_threshold=0.1)
+        self.assertEqual((report.created, report.duplicates), (2, 2))
+        # The vectors used for deduplication are stored, not encoded again
+        self.assertEqual(len(self.model.encoded) - encoded_before, 4)
+        imported = Defect.objects.filter(project=self.project).exclude(pk=existing.pk)
+        self.assertEqual(DefectEmbedding.objects.filter(defect__in=imported).count(), 2)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(CSV)
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command('import_defects', f.name, '--user', self.student.username, '--project', str(self.project.id),
+                     stdout=out)
+        self.assertIn('2 created, 0 duplicates skipped, 1 rejected of 3 rows', out.getvalue())
+
+    def test_endpoint_is_admin_only(self):
+        upload = SimpleUploadedFile('defects.csv', CSV.encode('utf-8'), content_type='text/csv')
+        self.login(self.student)
+        response = self.client.post('/api/defects/import/', {'file': upload, 'project': self.project.id})
+        self.assertEqual(response.status_code, 403)
+        admin = self.create_user('admin', role=None)
+        admin.is_staff = True
+        admin.save()
+        self.login(admin)
+        upload.seek(0)
+        response = self.client.post('/api/defects/import/', {'file': upload, 'project': self.project.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from .. import inference
+from ..ai_utils import MODEL_NAME, encode_texts
+from ..inference import InferenceServer, InferenceUnavailable, remote_encode
+from .base import FakeModel
+
+@unittest.skipUnless(inference.UNIX_SOCKETS, 'The inference server needs Unix sockets')
+class InferenceServerTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.socket_path = os.path.join(directory, 'inference.sock')
+        # A failed call elsewhere must not make these tests skip the server
+        inference._unavailable_until = 0.0
+        self.addCleanup(setattr, inference, '_unavailable_until', 0.0)
+        self.model = FakeModel()
+
+    def start_server(self, **options):
+        server = InferenceServer(self.socket_path, self.model, MODEL_NAME, **options)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_round_trip(self):
+        self.start_server()
+        texts = ['Login button does nothing', 'Cart total is wrong']
+        vectors = remote_encode(texts, self.socket_path, MODEL_NAME)
+        np.testing.assert_array_equal(vectors, FakeModel().encode(texts))
+
+    def test_concurrent_requests_share_model_calls(self):
+        self.start_server(max_wait=0.2)
+        calls = []
+        encode = self.model.encode
+
+        def counting_encode(texts, **kwargs):
+            calls.append(len(texts))
+            return encode(texts, **kwargs)
+
+        self.model.encode = counting_encode
+        results = {}
+
+        def request(i):
+            results[i] = remote_encode([f'Defect number {i}'], self.socket_path, MODEL_NAME)
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(calls), 8)
+        self.assertLess(len(calls), 8)
+        for i, vectors in results.items():
+            np.testing.assert_array_equal(vectors, FakeModel().encode([f'Defect number {i}']))
+
+    def test_other_model_is_refused(self):
+        self.start_server()
+        with self.assertRaises(InferenceUnavailable):
+            remote_encode(['text'], self.socket_path, 'some-other-model')
+
+    def test_missing_server(self):
+        with self.assertRaises(InferenceUnavailable):
+            remote_encode(['text'], self.socket_path, MODEL_NAME)
+
+    def test_workers_encode_in_process_without_a_server(self):
+        with override_settings(AI_INFERENCE_SOCKET=self.socket_path), \
+                mock.patch('App.ai_utils.get_model', return_value=self.model):
+            vectors = encode_texts(['Login button does nothing'])
+        self.assertEqual(self.model.encoded, ['Login button does nothing'])
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
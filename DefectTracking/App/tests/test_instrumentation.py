@@ -0,0 +1,106 @@
+import io
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from ..instrumentation import QueryBudgetExceeded, fingerprint_sql, query_budget, record_slow_queries
+from ..models import SlowQueryFingerprint
+from .base import DefectAPITestCase
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_literals_and_placeholders_collapse(self):
+        self.assertEqual(fingerprint_sql("SELECT * FROM t WHERE a = 'x''y' AND b = 42 AND c = %s"),
+                         'SELECT * FROM t WHERE a = ? AND b = ? AND c = ?')
+
+    def test_in_lists_of_any_length_group_together(self):
+        self.assertEqual(fingerprint_sql('SELECT id FROM t WHERE id IN (%s, %s, %s)'),
+                         fingerprint_sql('SELECT id FROM t WHERE id IN (1)'))
+
+    def test_multi_row_inserts_group_together(self):
+        self.assertEqual(fingerprint_sql('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'),
+                         'INSERT INTO t (a, b) VALUES (?, ?), ...')
+
+    def test_whitespace_is_normalised(self):
+        self.assertEqual(fingerprint_sql('SELECT  a\n  FROM t'), 'SELECT a FROM t')
+
+
+class QueryBudgetDecoratorTests(TestCase):
+
+    @query_budget(1)
+    def two_queries(self):
+        User.objects.count()
+        User.objects.exists()
+        return 'done'
+
+    def test_over_budget_logs_by_default(self):
+        with override_settings(QUERY_BUDGET_RAISE=False), self.assertLogs('App.instrumentation', 'WARNING') as logs:
+            self.assertEqual(self.two_queries(), 'done')
+        self.assertIn('ran 2 queries, budget is 1', logs.output[0])
+
+    def test_over_budget_raises_when_configured(self):
+        with override_settings(QUERY_BUDGET_RAISE=True), self.assertRaises(QueryBudgetExceeded):
+            self.two_queries()
+
+
+@override_settings(SQL_INSTRUMENTATION_ENABLED=True)
+class QueryInstrumentationMiddlewareTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_defects(self.student, self.project, 3)
+        self.login(self.student)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/api/defects/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+')
+
+    def test_disabled(self):
+        with override_settings(SQL_INSTRUMENTATION_ENABLED=False):
+            self.assertFalse(self.client.get('/api/api/defects/').has_header('Server-Timing'))
+
+    def test_slow_queries_are_aggregated_across_requests(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0):
+            self.client.get('/api/api/defects/')
+            recorded = {f.fingerprint_hash: f.calls for f in SlowQueryFingerprint.objects.all()}
+            self.client.get('/api/api/defects/')
+        self.assertTrue(recorded)
+        for fingerprint in SlowQueryFingerprint.objects.filter(fingerprint_hash__in=recorded):
+            self.assertGreater(fingerprint.calls, recorded[fingerprint.fingerprint_hash])
+            self.assertEqual(fingerprint.sample_path, '/api/api/defects/')
+
+    def test_fast_queries_are_not_recorded(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=60000):
+            self.client.get('/api/api/defects/')
+        self.assertFalse(SlowQueryFingerprint.objects.exists())
+
+
+class SlowQueriesCommandTests(TestCase):
+
+    def setUp(self):
+        record_slow_queries([
+            ('SELECT "auth_user"."id" FROM "auth_user" WHERE "auth_user"."id" = %s', [1], 0.5),
+            ('SELECT "auth_user"."id" FROM "auth_user" WHERE "auth_user"."id" = %s', [2], 0.1),
+            ('UPDATE "auth_user" SET "last_login" = NULL', None, 0.2),
+        ], '/api/defects/')
+
+    def report(self, *args):
+        out = io.StringIO()
+        call_command('slow_queries', *args, stdout=out)
+        return out.getvalue()
+
+    def test_report_ranks_by_total_time(self):
+        output = self.report()
+        self.assertLess(output.index('SELECT'), output.index('UPDATE'))
+        self.assertIn('calls=2  total=600.0ms', output)
+        by_calls = self.report('--order', 'calls')
+        self.assertLess(by_calls.index('SELECT'), by_calls.index('UPDATE'))
+
+    def test_explain_is_captured_for_selects_only(self):
+        self.report('--explain', '2')
+        select, update = SlowQueryFingerprint.objects.order_by('-total_ms')
+        self.assertTrue(select.explain)
+        self.assertEqual(update.explain, '')
+
+    def test_reset(self):
+        self.assertIn('Deleted 2 fingerprints', self.report('--reset'))
+        self.assertIn('No slow queries recorded', self.report())
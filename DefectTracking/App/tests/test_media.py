@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+from urllib.parse import urlsplit
+from django.test import override_settings
+from ..models import DefectScreenshot
+from ..storage import content_addressed_storage
+from .base import DefectAPITestCase, defect_item, png_upload
+
+class MediaAccessTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVE_MODE='django')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.login(self.student)
+        response = self.client.post('/api/defects/', dict(defect_item(self.project.id, 'Defect with a screenshot'),
+                                                          defect_screenshots=[png_upload()]), format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.screenshot = DefectScreenshot.objects.get(defect__summary='Defect with a screenshot')
+        self.name = self.screenshot.image.name
+        self.client.credentials()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+            response.close()
+        return response
+
+    def signed_url(self):
+        url = urlsplit(content_addressed_storage().url(self.name))
+        return f'{url.path}?{url.query}'
+
+    def test_signed_url_needs_no_credentials(self):
+        response = self.get(self.signed_url())
+        self.assertEqual(response.status_code, 200)
+        with content_addressed_storage().open(self.name) as f:
+            self.assertEqual(response.body, f.read())
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_unsigned_or_tampered_url_is_not_found(self):
+        url = self.signed_url()
+        self.assertEqual(self.get(url.split('?')[0]).status_code, 404)
+        self.assertEqual(self.get(url[:-1] + ('0' if url[-1] != '0' else '1')).status_code, 404)
+
+    def test_unsigned_url_follows_defect_access(self):
+        url = self.signed_url().split('?')[0]
+        self.login(self.other_student)
+        self.assertEqual(self.get(url).status_code, 404)
+        self.login(self.student)
+        self.assertEqual(self.get(url).status_code, 200)
+        self.login(self.mentor)
+        self.assertEqual(self.get(url).status_code, 200)
+
+    def test_range_requests(self):
+        url = self.signed_url()
+        size = content_addressed_storage().size(self.name)
+        response = self.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{size}')
+        self.assertEqual(len(response.body), 10)
+        response = self.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {size - 5}-{size - 1}/{size}')
+        response = self.get(url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_etag_revalidation(self):
+        url = self.signed_url()
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
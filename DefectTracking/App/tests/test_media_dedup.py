@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from ..models import Defect, DefectScreenshot, MediaBlob
+from ..storage import content_addressed_storage
+from .base import DefectAPITestCase, defect_item, png_upload
+
+class MediaDeduplicationTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def video_defect(self, summary, content=b'the same video bytes'):
+        return self.create_defect(self.student, self.project, summary,
+                                  defect_video=SimpleUploadedFile('clip.mp4', content, content_type='video/mp4'))
+
+    def refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_blob(self):
+        self.login(self.student)
+        for summary in ('First defect with a screenshot', 'Second defect with a screenshot'):
+            response = self.client.post('/api/defects/', dict(defect_item(self.project.id, summary),
+                                                              defect_screenshots=[png_upload()]), format='multipart')
+            self.assertEqual(response.status_code, 201)
+        names = set(DefectScreenshot.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.refcount(names.pop()), 2)
+
+    def test_blob_is_purged_with_its_last_reference(self):
+        first, second = self.video_defect('First defect with a video'), self.video_defect('Second defect with a video')
+        name = first.defect_video.name
+        self.assertEqual(second.defect_video.name, name)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(content_addressed_storage().exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(os.path.exists(content_addressed_storage().path(name)))
+
+    def test_replacing_a_shared_video_releases_it_once(self):
+        first, second = self.video_defect('First defect with a video'), self.video_defect('Second defect with a video')
+        name = first.defect_video.name
+        self.login(self.mentor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/defects/{first.pk}/', {
+                'defect_video': SimpleUploadedFile('new.mp4', b'a different video', content_type='video/mp4'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        first.refresh_from_db()
+        self.assertNotEqual(first.defect_video.name, name)
+        self.assertEqual(self.refcount(first.defect_video.name), 1)
+        # Still referenced by the second defect
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(content_addressed_storage().exists(name))
+        self.assertEqual(Defect.objects.get(pk=second.pk).defect_video.name, name)
@@ -0,0 +1,109 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from ..image_processing import InvalidImage, process_image, variant_key_name
+from ..media_jobs import MAX_ATTEMPTS, claim_jobs, complete_job, fail_job, requeue_stale, source_path, tmp_dir
+from ..models import DefectScreenshot, MediaBlob, MediaJob
+from .base import DefectAPITestCase, defect_item, png_upload
+
+ORIENTATION = 0x0112
+MAKE = 0x010F
+
+class ProcessImageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_exif_is_stripped_and_the_image_turned_upright(self):
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[MAKE] = 'Phone camera'
+        buffer = io.BytesIO()
+        Image.new('RGB', (60, 40), 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+        result = process_image(self.write('photo.jpg', buffer.getvalue()), self.directory, self.directory)
+        self.assertEqual(result['ext'], '.jpg')
+        with Image.open(result['path']) as image:
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertEqual(image.size, (40, 60))
+        for variant in ('thumbnail', 'preview'):
+            self.assertTrue(os.path.exists(os.path.join(self.directory, variant_key_name(result['sha256'], variant))))
+
+    def test_invalid_and_animated_images_are_rejected(self):
+        with self.assertRaises(InvalidImage):
+            process_image(self.write('fake.png', b'not an image'), self.directory, self.directory)
+        frames = [Image.new('RGB', (8, 8), colour) for colour in ('red', 'blue')]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:])
+        with self.assertRaises(InvalidImage):
+            process_image(self.write('animated.gif', buffer.getvalue()), self.directory, self.directory)
+
+
+class MediaJobTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.login(self.student)
+        response = self.client.post('/api/defects/', dict(defect_item(self.project.id, 'Defect with a screenshot'),
+                                                          defect_screenshots=[png_upload()]), format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.job = MediaJob.objects.get()
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        self.assertEqual([job.pk for job in claim_jobs(10)], [self.job.pk])
+        self.assertEqual(claim_jobs(10), [])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), ('RUNNING', 1))
+
+    def test_complete_swaps_the_screenshot_for_the_processed_file(self):
+        job = claim_jobs(1)[0]
+        result = process_image(source_path(job), tmp_dir(), settings.MEDIA_ROOT)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_job(job, result)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        screenshot = DefectScreenshot.objects.get()
+        self.assertEqual(screenshot.image.name, job.result_name)
+        self.assertEqual(MediaBlob.objects.get(name=job.result_name).refcount, 1)
+        self.assertFalse(MediaBlob.objects.filter(name=job.source_name).exists())
+        self.assertFalse(os.path.exists(result['path']))
+
+    def test_invalid_image_fails_the_job_and_drops_its_screenshots(self):
+        job = claim_jobs(1)[0]
+        self.assertTrue(fail_job(job, InvalidImage('Not a valid image')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertFalse(DefectScreenshot.objects.exists())
+
+    def test_transient_errors_are_retried_up_to_the_limit(self):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            job = claim_jobs(1)[0]
+            self.assertEqual(job.attempts, attempt)
+            self.assertEqual(fail_job(job, OSError('Disk full')), attempt == MAX_ATTEMPTS)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertTrue(DefectScreenshot.objects.exists())
+
+    def test_stale_running_jobs_are_requeued(self):
+        claim_jobs(1)
+        MediaJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(600), 1)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'PENDING')
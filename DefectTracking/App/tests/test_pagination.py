@@ -0,0 +1,72 @@
+from ..models import Defect
+from .base import DefectAPITestCase
+
+class CursorPaginationTests(DefectAPITestCase):
+
+    def fetch_all(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['defect_id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_every_defect_once_in_order(self):
+        defects = self.make_defects(self.student, self.project, 45)
+        # Ties on created_at are broken by defect_id
+        Defect.objects.filter(pk__in=[d.pk for d in defects[10:30]]).update(created_at=defects[10].created_at)
+        expected = list(Defect.objects.order_by('-created_at', '-defect_id').values_list('defect_id', flat=True))
+        self.login(self.student)
+        self.assertEqual(self.fetch_all('/api/api/defects/?page_size=10'), expected)
+
+    def test_rows_added_while_paging_do_not_shift_later_pages(self):
+        defects = self.make_defects(self.student, self.project, 15)
+        self.login(self.student)
+        first = self.client.get('/api/api/defects/', {'page_size': 10}).data
+        self.make_defects(self.student, self.project, 5, prefix='Inserted meanwhile')
+        rest = self.fetch_all(first['next'])
+        seen = [item['defect_id'] for item in first['results']] + rest
+        self.assertEqual(sorted(seen), sorted(d.pk for d in defects))
+
+    def test_invalid_cursor(self):
+        self.login(self.student)
+        self.assertEqual(self.client.get('/api/api/defects/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+class ClientPaginationTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('client', role='client', projects=[self.project, self.other_project])
+        self.ids = [self.create_defect(self.customer, project, f'Approved defect {i}', status='APPROVED').pk
+                    for i, project in enumerate([self.project, self.other_project] * 12)]
+        self.login(self.customer)
+
+    def pages(self, url, key):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.append(response.data[key])
+            url = response.data['next']
+        return seen
+
+    def test_unique_defects_are_paginated(self):
+        pages = self.pages('/api/client/unique-defects/?page_size=10', 'unique_defects')
+        self.assertEqual([len(page) for page in pages], [10, 10, 4])
+        self.assertEqual([d['defect_id'] for page in pages for d in page], self.ids[::-1])
+
+    def test_project_defects_are_paginated(self):
+        pages = self.pages(f'/api/client/projects/{self.project.id}/defects/?page_size=5', 'defects')
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual([d['defect_id'] for page in pages for d in page], self.ids[-2::-2])
+
+    def test_dashboard_pages_defects_across_projects(self):
+        pages = self.pages('/api/client/dashboard/?page_size=10', 'results')
+        self.assertEqual(len(pages), 3)
+        for page in pages:
+            self.assertEqual([p['approved_defects'] for p in page], [12, 12])
+            self.assertEqual(sum(len(p['defects']) for p in page), 10 if page is not pages[-1] else 4)
+        per_project = [d['defect_id'] for page in pages for d in page[0]['defects']]
+        self.assertEqual(per_project, self.ids[-2::-2])
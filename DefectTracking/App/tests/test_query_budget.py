@@ -0,0 +1,31 @@
+from ..models import DefectScreenshot
+from .base import DefectAPITestCase
+
+class QueryBudgetTests(DefectAPITestCase):
+    """Each request runs a fixed number of queries however many rows it returns"""
+
+    def test_defect_list(self):
+        defects = self.make_defects(self.student, self.project, 25)
+        DefectScreenshot.objects.bulk_create(
+            [DefectScreenshot(defect=defect, image='defect_screenshots/a.png') for defect in defects])
+        self.login(self.student)
+        response = self.client.get('/api/api/defects/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_mentor_student_roster(self):
+        for i in range(5):
+            student = self.create_user(f'roster_student_{i}', projects=[self.project])
+            self.make_defects(student, self.project, 3)
+        self.login(self.mentor)
+        response = self.client.get('/api/mentor/students/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(sum(len(item['defects']) for item in response.data['results']), 15)
+
+    def test_project_trends(self):
+        self.make_defects(self.student, self.project, 5)
+        self.login(self.mentor)
+        response = self.client.get(f'/api/projects/{self.project.id}/trends/', {'bucket': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(row['reported'] for row in response.data['series']), 5)
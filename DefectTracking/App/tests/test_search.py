@@ -0,0 +1,91 @@
+import io
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from ..models import Defect
+from ..search import FTS_TRIGGERS, _python_search, check_fulltext_index, missing_fulltext_objects, search_defects
+from .base import DefectAPITestCase
+
+# BM25 needs a term to be rarer than half the corpus for a positive IDF, so pad it with unrelated defects
+FILLER = ('Profile photo upload fails', 'Dark mode colours are wrong', 'Footer links open twice',
+          'Pagination skips page three', 'Language picker resets', 'Avatar is blurry on retina screens')
+
+class KeywordSearchTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for summary in FILLER:
+            self.create_defect(self.student, self.project, summary)
+        self.exact = self.create_defect(self.student, self.project, 'Payment timeout after timeout retry')
+        self.passing = self.create_defect(self.student, self.project, 'Order history is slow to load',
+                                          actual_result='The order history page loads for a long time and '
+                                                        'eventually shows a gateway timeout <error>')
+        self.hidden = self.create_defect(self.other_student, self.other_project, 'Search timeout on results page')
+
+    def search(self, **params):
+        return self.client.get(reverse('defect_search'), params)
+
+    def test_ranks_denser_matches_first(self):
+        self.login(self.student)
+        response = self.search(q='timeout')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['defect_id'] for r in results], [self.exact.pk, self.passing.pk])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+        self.assertGreater(results[1]['score'], 0)
+
+    def test_python_fallback_ranks_the_same_way(self):
+        ranked = _python_search(Defect.objects.filter(project=self.project), ['timeout'])
+        self.assertEqual([defect.pk for defect, _ in ranked], [self.exact.pk, self.passing.pk])
+        self.assertEqual(search_defects('timeout', Defect.objects.filter(project=self.project))[0][0], self.exact)
+
+    def test_highlights_are_escaped_and_marked(self):
+        self.login(self.student)
+        result = self.search(q='gateway').data['results'][0]
+        snippet = result['highlights']['actual_result']
+        self.assertIn('<mark>gateway</mark>', snippet)
+        self.assertIn('&lt;error&gt;', snippet)
+        self.assertNotIn('summary', result['highlights'])
+
+    def test_results_are_limited_to_visible_defects(self):
+        self.login(self.student)
+        ids = [r['defect_id'] for r in self.search(q='timeout').data['results']]
+        self.assertNotIn(self.hidden.pk, ids)
+
+    def test_pages(self):
+        self.login(self.student)
+        first = self.search(q='timeout', page_size=1).data
+        second = self.search(q='timeout', page_size=1, page=2).data
+        self.assertTrue(first['has_next'])
+        self.assertFalse(second['has_next'])
+        self.assertEqual(second['results'][0]['defect_id'], self.passing.pk)
+
+    def test_edits_are_reindexed(self):
+        self.exact.summary = 'Payment declined'
+        self.exact.save()
+        self.assertEqual([d.pk for d, _ in search_defects('timeout', Defect.objects.filter(project=self.project))],
+                         [self.passing.pk])
+
+
+class FulltextIndexCheckTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('Only SQLite keeps the index in triggers')
+
+    def test_dropped_triggers_are_reported_and_rebuilt(self):
+        self.assertEqual(check_fulltext_index(databases=['default']), [])
+        defect = self.create_defect(self.student, self.project, 'Checkout timeout')
+        with connection.cursor() as cursor:
+            # What a migration that remakes the defect table leaves behind
+            for trigger in FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {trigger}')
+        self.assertEqual(missing_fulltext_objects(), list(FTS_TRIGGERS))
+        self.assertEqual([e.id for e in check_fulltext_index(databases=['default'])], ['App.W001'])
+        defect.summary = 'Checkout declined'
+        defect.save()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(missing_fulltext_objects(), [])
+        self.assertEqual(search_defects('timeout'), [])
+        self.assertEqual(search_defects('declined')[0][0], defect)
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from django.test import override_settings
+from django.urls import reverse
+from .. import vector_index
+from ..vector_index import get_project_index
+from .base import DefectAPITestCase
+
+class SemanticSearchTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir, ignore_errors=True)
+        settings_override = override_settings(AI_INDEX_DIR=index_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        vector_index._loaded.clear()
+        self.addCleanup(vector_index._loaded.clear)
+        self.index_dir = index_dir
+        self.create_defect(self.student, self.project, 'Checkout button does not respond')
+        self.create_defect(self.student, self.project, 'Password reset email never arrives', status='APPROVED')
+        self.create_defect(self.other_student, self.other_project, 'Checkout button missing from search results')
+
+    def search(self, **params):
+        return self.client.get(reverse('similar-defects'), {'mode': 'semantic', **params})
+
+    def test_ranks_by_similarity_with_scores(self):
+        self.login(self.mentor)
+        response = self.search(q='checkout button does not respond')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['summary'], 'Checkout button does not respond')
+        scores = [item['score'] for item in response.data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertLessEqual(scores[0], 1.0)
+
+    def test_results_are_limited_to_visible_defects(self):
+        self.login(self.other_student)
+        response = self.search(q='checkout button')
+        self.assertEqual([item['summary'] for item in response.data], ['Checkout button missing from search results'])
+
+    def test_k_and_status_filters(self):
+        self.login(self.mentor)
+        self.assertEqual(len(self.search(q='checkout', k=1).data), 1)
+        response = self.search(q='checkout', status='approved')
+        self.assertEqual([item['summary'] for item in response.data], ['Password reset email never arrives'])
+
+    def test_invalid_parameters(self):
+        self.login(self.student)
+        self.assertEqual(self.search(q='checkout', k='many').status_code, 400)
+        self.assertEqual(self.search(q='').status_code, 400)
+        self.assertEqual(self.client.get(reverse('similar-defects'), {'q': 'checkout', 'mode': 'fuzzy'}).status_code, 400)
+
+    def test_index_is_memory_mapped_and_rebuilt_when_embeddings_change(self):
+        ids, matrix = get_project_index(self.project.id)
+        self.assertEqual(len(ids), 2)
+        if vector_index.MMAP_MODE:
+            self.assertIsInstance(matrix, np.memmap)
+        self.assertTrue(os.path.exists(os.path.join(self.index_dir, f'project_{self.project.id}.npy')))
+        with self.captureOnCommitCallbacks(execute=True):
+            defect = self.create_defect(self.student, self.project, 'Cart total shows the wrong currency')
+        ids, _ = get_project_index(self.project.id)
+        self.assertIn(defect.pk, ids.tolist())
+
+    def test_unchanged_index_is_not_rebuilt(self):
+        get_project_index(self.project.id)
+        vector_index._loaded.clear()
+        path = os.path.join(self.index_dir, f'project_{self.project.id}.npy')
+        before = os.stat(path).st_mtime_ns
+        get_project_index(self.project.id)
+        self.assertEqual(os.stat(path).st_mtime_ns, before)
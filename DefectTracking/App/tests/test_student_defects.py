@@ -0,0 +1,33 @@
+from ..models import Defect, Mentor
+from .base import DefectAPITestCase
+
+class StudentDefectsTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        customer = self.create_user('client', role='client', projects=[self.project])
+        self.included = [self.create_defect(self.student, self.project, 'Reported by a student').pk]
+        self.create_defect(customer, self.project, 'Reported by a client')
+        self.create_defect(self.other_student, self.other_project, 'Reported in another project')
+        self.create_defect(self.other_student, self.project, 'Reported by a student of another project')
+
+    def test_keeps_defects_from_students_of_the_projects(self):
+        with self.assertNumQueries(1):
+            ids = list(Defect.objects.reported_by_students([self.project.id]).values_list('defect_id', flat=True))
+        self.assertEqual(ids, self.included)
+
+    def test_accepts_a_subquery(self):
+        self.assertEqual([d.pk for d in Mentor.objects.get(user=self.mentor).get_student_defects()], self.included)
+
+    def test_mentor_view(self):
+        self.included.append(self.create_defect(self.student, self.project, 'Second student report').pk)
+        self.login(self.mentor)
+        response = self.client.get('/api/mentor/defects/', {'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        ids = [d['defect_id'] for d in response.data['results']]
+        ids += [d['defect_id'] for d in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(ids, self.included[::-1])
+
+    def test_students_are_refused(self):
+        self.login(self.student)
+        self.assertEqual(self.client.get('/api/mentor/defects/').status_code, 403)
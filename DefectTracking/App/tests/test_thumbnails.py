@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+from unittest import mock
+from urllib.parse import urlsplit
+from django.test import override_settings
+from django.urls import reverse
+from .. import serializers
+from ..models import DefectScreenshot
+from ..thumbnails import ensure_variant
+from .base import DefectAPITestCase, defect_item, png_upload
+
+class VariantURLTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVE_MODE='django')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.login(self.student)
+        response = self.client.post('/api/defects/', dict(defect_item(self.project.id, 'Defect with a screenshot'),
+                                                          defect_screenshots=[png_upload(size=(800, 600))]),
+                                    format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.screenshot = DefectScreenshot.objects.get(defect__summary='Defect with a screenshot')
+
+    def list_item(self):
+        return self.client.get('/api/api/defects/').data['results'][0]
+
+    def follow(self, url):
+        response = self.client.get(url)
+        if response.status_code == 302:
+            location = urlsplit(response['Location'])
+            response = self.client.get(f'{location.path}?{location.query}')
+            response.body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response
+
+    def test_variant_urls_load_without_credentials(self):
+        url = urlsplit(self.list_item()['thumbnail_url'])
+        self.client.credentials()
+        response = self.follow(f'{url.path}?{url.query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(self.client.get(url.path).status_code, 404)
+
+    def test_urls_point_at_the_endpoint_even_once_generated(self):
+        ensure_variant(self.screenshot.image.name, 'thumbnail')
+        with mock.patch('App.thumbnails.os.path.exists') as exists:
+            url = urlsplit(self.list_item()['thumbnail_url'])
+        exists.assert_not_called()
+        self.assertEqual(url.path, reverse('screenshot_variant', args=[self.screenshot.id, 'thumbnail']))
+        self.assertEqual(self.follow(f'{url.path}?{url.query}').status_code, 200)
+
+    def test_first_screenshot_urls_are_signed_once(self):
+        with mock.patch('App.serializers.signed_media_params', wraps=serializers.signed_media_params) as signed:
+            item = self.list_item()
+        self.assertEqual(signed.call_count, 2)
+        self.assertEqual(item['thumbnail_url'], item['screenshots'][0]['thumbnail_url'])
+        self.assertEqual(item['preview_url'], item['screenshots'][0]['preview_url'])
+
+    def test_unsigned_endpoint_follows_defect_access(self):
+        path = reverse('screenshot_variant', args=[self.screenshot.id, 'preview'])
+        self.assertEqual(self.follow(path).status_code, 200)
+        self.login(self.other_student)
+        self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual(self.client.get(reverse('screenshot_variant', args=[self.screenshot.id, 'huge'])).status_code,
+                         404)
@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.test import override_settings
+from django.utils import timezone
+from ..models import Defect, DefectHistory, MediaBlob, VideoUpload
+from ..uploads import UploadError, expire_uploads, finalize_upload, part_path, write_chunk
+from .base import DefectAPITestCase
+
+VIDEO = bytes(range(256)) * 40
+
+class VideoUploadTests(DefectAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.defect = self.create_defect(self.student, self.project, 'Defect with a video')
+        self.login(self.student)
+
+    def start(self, size=len(VIDEO)):
+        response = self.client.post(f'/api/defects/{self.defect.pk}/video-uploads/', {'filename': 'clip.mp4', 'size': size})
+        self.assertEqual(response.status_code, 201)
+        return response.data['upload_id']
+
+    def put(self, upload_id, offset, data):
+        return self.client.put(f'/api/video-uploads/{upload_id}/', data, content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {offset}-{offset + len(data) - 1}/{len(VIDEO)}')
+
+    def finalize(self, upload_id, data=VIDEO):
+        return self.client.post(f'/api/video-uploads/{upload_id}/finalize/', {'sha256': hashlib.sha256(data).hexdigest()})
+
+    def upload_all(self, upload_id):
+        for offset in range(0, len(VIDEO), 4096):
+            self.assertEqual(self.put(upload_id, offset, VIDEO[offset:offset + 4096]).status_code, 200)
+
+    def test_chunks_are_finalized_into_the_defect_video(self):
+        upload_id = self.start()
+        self.upload_all(upload_id)
+        response = self.finalize(upload_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'COMPLETE')
+        self.defect.refresh_from_db()
+        with self.defect.defect_video.open('rb') as f:
+            self.assertEqual(f.read(), VIDEO)
+        self.assertEqual(MediaBlob.objects.get(name=self.defect.defect_video.name).refcount, 1)
+        self.assertTrue(DefectHistory.objects.filter(defect=self.defect, comments='Video uploaded').exists())
+        self.assertFalse(os.path.exists(part_path(VideoUpload.objects.get())))
+
+    def test_wrong_offset_returns_the_offset_to_resume_from(self):
+        upload_id = self.start()
+        self.assertEqual(self.put(upload_id, 0, VIDEO[:4096]).status_code, 200)
+        response = self.put(upload_id, 8192, VIDEO[8192:12288])
+        self.assertEqual((response.status_code, response.data['offset']), (409, 4096))
+        response = self.finalize(upload_id)
+        self.assertEqual((response.status_code, response.data['offset']), (409, 4096))
+
+    def test_stale_writer_does_not_touch_the_part_file(self):
+        upload_id = self.start()
+        stale = VideoUpload.objects.get(pk=upload_id)
+        self.assertEqual(self.put(upload_id, 0, VIDEO[:4096]).status_code, 200)
+        # Another request read the row before the first chunk landed and still sees offset 0
+        with self.assertRaises(UploadError) as raised:
+            write_chunk(stale, 0, io.BytesIO(b'x' * 100), 100)
+        self.assertEqual((raised.exception.status, raised.exception.offset), (409, 4096))
+        with open(part_path(stale), 'rb') as f:
+            self.assertEqual(f.read(), VIDEO[:4096])
+
+    def test_second_finalize_is_rejected(self):
+        upload_id = self.start()
+        self.upload_all(upload_id)
+        stale = VideoUpload.objects.get(pk=upload_id)
+        self.assertEqual(self.finalize(upload_id).status_code, 200)
+        # A finalize racing the first one read the row while it was still uploading
+        with self.assertRaises(UploadError) as raised:
+            finalize_upload(stale, hashlib.sha256(VIDEO).hexdigest(), self.student)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        name = Defect.objects.get(pk=self.defect.pk).defect_video.name
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+        self.assertEqual(DefectHistory.objects.filter(defect=self.defect, comments='Video uploaded').count(), 1)
+
+    def test_checksum_mismatch_restarts_the_upload(self):
+        upload_id = self.start()
+        self.upload_all(upload_id)
+        response = self.finalize(upload_id, data=b'something else')
+        self.assertEqual((response.status_code, response.data['offset']), (422, 0))
+        upload = VideoUpload.objects.get(pk=upload_id)
+        self.assertEqual((upload.status, upload.received), ('UPLOADING', 0))
+        self.assertEqual(os.path.getsize(part_path(upload)), 0)
+        self.assertFalse(Defect.objects.get(pk=self.defect.pk).defect_video)
+        self.upload_all(upload_id)
+        self.assertEqual(self.finalize(upload_id).status_code, 200)
+
+    def test_other_users_cannot_see_the_upload(self):
+        upload_id = self.start()
+        self.login(self.other_student)
+        self.assertEqual(self.put(upload_id, 0, VIDEO[:4096]).status_code, 404)
+        self.assertEqual(self.client.post(f'/api/defects/{self.defect.pk}/video-uploads/',
+                                          {'filename': 'clip.mp4', 'size': 10}).status_code, 404)
+
+    def test_idle_uploads_expire(self):
+        idle, fresh = self.start(), self.start()
+        VideoUpload.objects.filter(pk=idle).update(updated_at=timezone.now() - timedelta(days=2))
+        path = part_path(VideoUpload.objects.get(pk=idle))
+        self.assertEqual(expire_uploads(24), 1)
+        self.assertEqual(list(VideoUpload.objects.values_list('pk', flat=True)), [VideoUpload.objects.get(pk=fresh).pk])
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,50 @@
+"""Downscaled WebP variants of defect screenshots.
+
+Variants live under ``variants/`` in MEDIA_ROOT and are named after the source
+content (the SHA-256 for content-addressed files), so a name never changes
+meaning and can be cached forever. They are created on first request through
+``screenshot_variant`` or ahead of time with ``generate_thumbnails``.
+"""
+import hashlib
+import os
+from django.conf import settings
+from .image_processing import VARIANTS, variant_key_name, write_variant
+from .storage import content_addressed_storage, is_blob_name
+
+def variant_name(source_name, variant):
+    if is_blob_name(source_name):
+        key = os.path.splitext(os.path.basename(source_name))[0]
+    else:
+        key = hashlib.sha256(source_name.encode('utf-8')).hexdigest()
+    return variant_key_name(key, variant)
+
+def variant_path(source_name, variant):
+    return os.path.join(settings.MEDIA_ROOT, variant_name(source_name, variant))
+
+def variant_exists(source_name, variant):
+    return os.path.exists(variant_path(source_name, variant))
+
+def ensure_variant(source_name, variant, source_path=None):
+    """Create the variant of a stored image if it is not on disk yet; returns its media name.
+
+    source_path reads the image from a file that is not in storage yet (see media_jobs).
+    """
+    name = variant_name(source_name, variant)
+    target = os.path.join(settings.MEDIA_ROOT, name)
+    if os.path.exists(target):
+        return name
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    source = open(source_path, 'rb') if source_path else content_addressed_storage().open(source_name, 'rb')
+    with source as f:
+        write_variant(f, target, VARIANTS[variant])
+    return name
+
+def ensure_variants(source_name, source_path=None):
+    return {variant: ensure_variant(source_name, variant, source_path) for variant in VARIANTS}
+
+def delete_variants(source_name):
+    for variant in VARIANTS:
+        try:
+            os.remove(variant_path(source_name, variant))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,61 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .access import get_scope_version, load_access_scope
+
+class ScopedRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the user's role and project scope as claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.stamp_scope(user.pk)
+        return token
+
+    def stamp_scope(self, user_id):
+        # Read the version before the scope so a concurrent change can only make the claims stale
+        version = get_scope_version(user_id)
+        for claim, value in load_access_scope(user_id).to_claims().items():
+            self[claim] = value
+        self['scope_version'] = version
+
+class ScopedTokenRefreshSerializer(TokenRefreshSerializer):
+    """Re-stamps the scope claims on refresh when the user's assignments have changed"""
+    token_class = ScopedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None and refresh.get('scope_version') != get_scope_version(user_id):
+            refresh.stamp_scope(user_id)
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+class ScopedJWTAuthentication(JWTAuthentication):
+    """Loads the user together with their scope version, so checking the token's scope claims costs no query"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        try:
+            user = self.user_model.objects.select_related('scope_version').get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,144 @@
+"""Chunked, resumable uploads of defect videos.
+
+A client starts an upload with the file's total size, PUTs the bytes in order with
+the offset of each chunk and finalizes with the SHA-256 of the whole file. Chunks
+are streamed into a part file under ``cas/uploads/``, on the same filesystem as the
+blobs, so finalizing is one checksum pass and a rename into content-addressed
+storage rather than another copy. After an interruption the upload's ``received``
+count is the offset to resume from; bytes of a chunk cut off midway are kept.
+"""
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Defect, DefectHistory, VideoUpload
+from .storage import CAS_PREFIX, content_addressed_storage, file_sha256
+
+UPLOAD_DIR = f'{CAS_PREFIX}/uploads'
+WRITE_CHUNK_SIZE = 64 * 1024
+
+class UploadError(Exception):
+    """A request that does not fit the upload's state; offset tells the client where to resume"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+def part_path(upload):
+    return content_addressed_storage().path(f'{UPLOAD_DIR}/{upload.pk}.part')
+
+def start_upload(defect, user, filename, size):
+    if size > settings.VIDEO_UPLOAD_MAX_BYTES:
+        raise UploadError(f'Videos may be at most {settings.VIDEO_UPLOAD_MAX_BYTES} bytes.')
+    upload = VideoUpload.objects.create(defect=defect, created_by=user, filename=filename, size=size)
+    path = part_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return upload
+
+def write_chunk(upload, offset, stream, length):
+    """Append length bytes read from stream at offset, which must be upload.received"""
+    if upload.status != 'UPLOADING':
+        raise UploadError('The upload is already complete.', status=409)
+    if offset != upload.received:
+        raise UploadError('The chunk must start at the current offset.', status=409, offset=upload.received)
+    if length > settings.VIDEO_UPLOAD_MAX_CHUNK_BYTES:
+        raise UploadError(f'Chunks may be at most {settings.VIDEO_UPLOAD_MAX_CHUNK_BYTES} bytes.', offset=offset)
+    if offset + length > upload.size:
+        raise UploadError('The chunk goes past the declared size.', offset=offset)
+    with transaction.atomic():
+        # Claim the offset before touching the file: the conditional UPDATE holds the row lock until
+        # commit, so a concurrent request for the same offset waits and then finds it taken
+        if not VideoUpload.objects.filter(pk=upload.pk, received=offset, status='UPLOADING').update(
+                updated_at=timezone.now()):
+            upload.refresh_from_db(fields=['received', 'status'])
+            raise UploadError('Another request wrote to this upload.', status=409, offset=upload.received)
+        remaining = length
+        with open(part_path(upload), 'r+b') as f:
+            f.seek(offset)
+            # Drop whatever a failed earlier attempt left past the offset
+            f.truncate()
+            try:
+                while remaining:
+                    data = stream.read(min(WRITE_CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    f.write(data)
+                    remaining -= len(data)
+            except OSError:
+                # The client went away; keep what arrived so it can resume from there
+                pass
+        received = offset + length - remaining
+        VideoUpload.objects.filter(pk=upload.pk).update(received=received, updated_at=timezone.now())
+    upload.received = received
+    if remaining:
+        raise UploadError('The chunk ended early.', offset=received)
+    return upload
+
+def finalize_upload(upload, sha256, user):
+    """Check the checksum and make the file the defect's video; returns the defect"""
+    if upload.status != 'UPLOADING':
+        raise UploadError('The upload is already complete.', status=409)
+    if upload.received != upload.size:
+        raise UploadError('The upload is not complete yet.', status=409, offset=upload.received)
+    path = part_path(upload)
+    ext = os.path.splitext(upload.filename)[1][:10]
+    with transaction.atomic():
+        # Flip the status first; a concurrent finalize waits on the row lock and then finds it complete
+        if not VideoUpload.objects.filter(pk=upload.pk, status='UPLOADING', received=upload.size).update(
+                status='COMPLETE', updated_at=timezone.now()):
+            upload.refresh_from_db(fields=['received', 'status'])
+            if upload.status != 'UPLOADING':
+                raise UploadError('The upload is already complete.', status=409)
+            raise UploadError('The upload is not complete yet.', status=409, offset=upload.received)
+        actual, size = file_sha256(path)
+        corrupted = actual != sha256.lower() or size != upload.size
+        if corrupted:
+            # Something was corrupted on the way; start over rather than keep bad bytes
+            open(path, 'wb').close()
+            VideoUpload.objects.filter(pk=upload.pk).update(status='UPLOADING', received=0, updated_at=timezone.now())
+        else:
+            defect = Defect.objects.select_for_update().get(pk=upload.defect_id)
+            had_video = bool(defect.defect_video)
+            defect.defect_video = content_addressed_storage().adopt(path, actual, size, ext, move=True)
+            defect.save(update_fields=['defect_video', 'updated_at'])
+            DefectHistory.objects.create(
+                defect=defect,
+                action='UPDATED',
+                performed_by=user,
+                changes={'defect_video': {'old': 'exists' if had_video else None, 'new': 'updated'}},
+                comments='Video uploaded')
+    if corrupted:
+        upload.received = 0
+        raise UploadError('Checksum mismatch; upload the file again.', status=422, offset=0)
+    if os.path.exists(path):
+        # The same video was already stored, so the part file was not moved
+        os.remove(path)
+    upload.status = 'COMPLETE'
+    return defect
+
+def abort_upload(upload):
+    path = part_path(upload)
+    upload.delete()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def expire_uploads(hours):
+    """Delete unfinished uploads idle for longer than hours, and part files left without a row"""
+    cutoff = timezone.now() - timedelta(hours=hours)
+    expired = 0
+    for upload in VideoUpload.objects.filter(status='UPLOADING', updated_at__lt=cutoff).iterator():
+        abort_upload(upload)
+        expired += 1
+    directory = content_addressed_storage().path(UPLOAD_DIR)
+    if os.path.isdir(directory):
+        live = {f'{pk}.part' for pk in VideoUpload.objects.filter(status='UPLOADING').values_list('pk', flat=True)}
+        for entry in os.scandir(directory):
+            if entry.name not in live and entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+                expired += 1
+    return expired
@@ -17,12 +17,21 @@ urlpatterns = [
     path('auth/register/', views.register_user, name='register'),
     # Projects
     path('projects/', views.ProjectListView.as_view(), name='project_list'),
+    path('projects/<int:project_id>/trends/', views.project_trends, name='project_trends'),
+    path('projects/<int:project_id>/defects/export/', views.project_defects_export, name='project_defects_export'),
     # Defects
     path('defects/', views.DefectListCreateView.as_view(), name='defect_list_create'),
     path('defects/<int:defect_id>/', views.DefectDetailView.as_view(), name='defect_detail'),
     path('defects/<int:defect_id>/approve/', views.approve_defect, name='approve_defect'),
     path('defects/<int:defect_id>/invalidate/', views.invalidate_defect, name='invalidate_defect'),
+    path('defects/bulk/', views.defect_bulk_create, name='defect_bulk_create'),
+    path('defects/import/', views.defect_import, name='defect_import'),
+    path('defects/<int:defect_id>/video-uploads/', views.defect_video_upload_start, name='defect_video_upload_start'),
+    path('video-uploads/<uuid:upload_id>/', views.video_upload_detail, name='video_upload_detail'),
+    path('video-uploads/<uuid:upload_id>/finalize/', views.video_upload_finalize, name='video_upload_finalize'),
+    path('screenshots/<int:screenshot_id>/<str:variant>/', views.screenshot_variant, name='screenshot_variant'),
     path('defects/stats/', views.defect_stats, name='defect_stats'),
+    path('defects/search/', views.defect_search_view, name='defect_search'),
     path('api/defects/similar/', similar_defects_view, name='similar-defects'),
     path('api/defects/', DefectListAPIView.as_view(), name='defect-list'),
     # Mentors
@@ -31,6 +40,7 @@ urlpatterns = [
     path('mentor/students/', views.mentor_students_view, name='mentor_students'),
     path('mentor/projects/', views.mentor_projects, name='mentor-projects'),
     path('mentor/projects/<int:project_id>/defects/', views.mentor_project_defects, name='mentor_project_defects'),
+    path('mentor/defects/bulk-action/', views.mentor_defects_bulk_action, name='mentor-defects-bulk-action'),
     path('mentor/defects/<int:defect_id>/', views.mentor_defect_detail, name='mentor-defect-detail'),
     path('mentor/defects/<int:defect_id>/approve/', views.mentor_defect_approve, name='mentor-defect-approve'),
     path('mentor/defects/<int:defect_id>/invalidate/', views.mentor_defect_invalidate, name='mentor-defect-invalidate'),
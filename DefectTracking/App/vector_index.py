@@ -0,0 +1,144 @@
+"""Per-project embedding matrices on disk for semantic defect search.
+
+Each project gets ``project_<id>.npy`` (normalised float32 vectors) and
+``project_<id>.ids.npy`` (matching defect ids). The files are opened with
+``mmap_mode='r'`` so every worker on a box shares the same page cache, and
+they are rebuilt when the project's stored embeddings change.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from .ai_utils import MODEL_NAME, encode_texts, load_defect_embeddings
+from .models import Defect, DefectEmbedding
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Windows cannot replace a file that is memory-mapped, so the matrices are read into memory there
+MMAP_MODE = 'r' if os.name != 'nt' else None
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def _paths(project_id):
+    base = os.path.join(settings.AI_INDEX_DIR, f'project_{project_id}')
+    return base + '.npy', base + '.ids.npy', base + '.json', base + '.lock'
+
+def _signature(project_id):
+    stats = DefectEmbedding.objects.filter(defect__project_id=project_id, model_name=MODEL_NAME).aggregate(
+        count=Count('defect_id'), last_update=Max('updated_at'))
+    last_update = stats['last_update'].isoformat() if stats['last_update'] else ''
+    return f"{MODEL_NAME}:{stats['count']}:{last_update}"
+
+def _read_signature(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f).get('signature')
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def _exclusive_lock(path):
+    """Hold an exclusive lock on path across processes (flock on POSIX, msvcrt on Windows)"""
+    with open(path, 'a+b') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+            return
+        lock.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _write_atomic(path, array):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+def build_project_index(project_id):
+    """Write the on-disk matrix for a project, encoding any defects without a fresh embedding"""
+    vectors_path, ids_path, meta_path, lock_path = _paths(project_id)
+    os.makedirs(settings.AI_INDEX_DIR, exist_ok=True)
+    with _exclusive_lock(lock_path):
+        defect_ids = list(Defect.objects.filter(project_id=project_id).order_by('defect_id')
+                          .values_list('defect_id', flat=True))
+        vectors = load_defect_embeddings(defect_ids)
+        signature = _signature(project_id)
+        if _read_signature(meta_path) == signature:
+            # Another worker rebuilt it while we waited for the lock
+            return signature
+        ids = np.array([i for i in defect_ids if i in vectors], dtype=np.int64)
+        if len(ids):
+            matrix = np.vstack([vectors[i] for i in ids]).astype(np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        _write_atomic(vectors_path, matrix)
+        _write_atomic(ids_path, ids)
+        tmp = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'signature': signature, 'count': int(len(ids))}, f)
+        os.replace(tmp, meta_path)
+    return signature
+
+def get_project_index(project_id):
+    """(defect ids, memory-mapped vector matrix) for a project, rebuilding it if stale"""
+    vectors_path, ids_path, meta_path, _ = _paths(project_id)
+    signature = _signature(project_id)
+    with _loaded_lock:
+        loaded = _loaded.get(project_id)
+    if loaded and loaded[0] == signature:
+        return loaded[1], loaded[2]
+    if _read_signature(meta_path) != signature:
+        signature = build_project_index(project_id)
+    ids = np.load(ids_path, mmap_mode=MMAP_MODE)
+    matrix = np.load(vectors_path, mmap_mode=MMAP_MODE)
+    with _loaded_lock:
+        _loaded[project_id] = (signature, ids, matrix)
+    return ids, matrix
+
+def semantic_search(query, project_ids, k=10, statuses=None, visible=None):
+    """Top-k (defect_id, score) pairs by cosine similarity to the query text.
+
+    visible, a Q over Defect (see AccessScope.visible_defects), limits the defects returned.
+    """
+    project_ids = list(project_ids)
+    query_vector = encode_texts([query])[0]
+    allowed = None
+    if statuses or visible is not None:
+        candidates = Defect.objects.filter(project_id__in=project_ids)
+        if statuses:
+            candidates = candidates.filter(status__in=statuses)
+        if visible is not None:
+            candidates = candidates.filter(visible)
+        allowed = np.fromiter(candidates.values_list('defect_id', flat=True), dtype=np.int64)
+    results = []
+    for project_id in project_ids:
+        ids, matrix = get_project_index(project_id)
+        if not len(ids) or matrix.shape[1] != query_vector.shape[0]:
+            continue
+        scores = np.asarray(matrix @ query_vector)
+        if allowed is not None:
+            scores = np.where(np.isin(ids, allowed), scores, -np.inf)
+        take = min(k, len(ids))
+        top = np.argpartition(-scores, take - 1)[:take]
+        results.extend((int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i]))
+    results.sort(key=lambda item: item[1], reverse=True)
+    return results[:k]
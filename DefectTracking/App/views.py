@@ -1,25 +1,42 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import ScopedRefreshToken
 from rest_framework.views import APIView
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db.models import Count, Q, OuterRef, Subquery, F
+from django.db.models import Exists, Q, OuterRef, Prefetch, F, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.utils import timezone
+from datetime import date, timedelta
+import json
 from django.db import transaction
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Project, UserProfile, Defect, Mentor, DefectHistory
-from .serializers import (ProjectSerializer, UserRegistrationSerializer, DefectSerializer,DefectCreateSerializer, DefectUpdateSerializer, MentorSerializer,
-    DefectStatsSerializer, UserProfileSerializer, MentorLoginSerializer,DefectActionSerializer, UserLoginSerializer, DefectListSerializer,DefectDetailSerializer)
+from .models import Project, UserProfile, Defect, DefectCounter, DefectDailyRollup, DefectScreenshot, Mentor, DefectHistory, VideoUpload
+from .serializers import (ProjectSerializer, UserRegistrationSerializer, DefectSerializer,DefectCreateSerializer, DefectBulkItemSerializer, DefectUpdateSerializer, MentorSerializer,
+    DefectStatsSerializer, UserProfileSerializer, MentorLoginSerializer,DefectActionSerializer, DefectBulkActionSerializer, UserLoginSerializer, DefectListSerializer,DefectDetailSerializer)
 from .permissions import IsMentor
+from .access import get_access_scope
+from .pagination import DefectCursorPagination
+from .instrumentation import query_budget
 from django.conf import settings
-from .ai_utils import ai_filter_unique_defects
+from .ai_utils import dendrogram_unique_ids, unique_defects_queryset
+from .vector_index import semantic_search
+from .search import highlights as search_highlights, search_defects
+from .bulk import apply_mentor_action, create_defects
+from .importer import IMPORT_FORMATS, import_defects, iter_records
+from .thumbnails import VARIANTS as THUMBNAIL_VARIANTS, ensure_variant, variant_name
+from .storage import check_media_signature, content_addressed_storage
+from .media_serving import MediaContentNegotiation, is_servable_name, media_defects, media_response
+from .uploads import UploadError, abort_upload, finalize_upload, start_upload, write_chunk
+from .export import CSVRenderer, NDJSONRenderer, csv_lines, encoded, export_rows, gzipped, ndjson_lines
 
-AI_FILTER_UNIQUE_DEFECTS_THRESHOLD = 0.3  # Centralized threshold for AI clustering
+AI_FILTER_UNIQUE_DEFECTS_THRESHOLD = settings.AI_FILTER_UNIQUE_DEFECTS_THRESHOLD  # Centralized threshold for AI clustering
 class ProjectListView(generics.ListAPIView):
     """Get list of all active projects"""
     queryset = Project.objects.filter(is_active=True)
@@ -111,7 +128,7 @@ def user_login(request):
         except UserProfile.DoesNotExist:
             role = None
         is_mentor = Mentor.objects.filter(user=user, is_active=True).exists()
-        refresh = RefreshToken.for_user(user)
+        refresh = ScopedRefreshToken.for_user(user)
         return Response({
             'access': str(refresh.access_token),
             'refresh': str(refresh),
@@ -158,7 +175,7 @@ def mentor_login(request):
         mentor = Mentor.objects.get(mentor_username=mentor_username, is_active=True)
         user = authenticate(username=mentor.user.username, password=password)
         if user and user.is_active:
-            refresh = RefreshToken.for_user(user)
+            refresh = ScopedRefreshToken.for_user(user)
             return Response({
                 'access': str(refresh.access_token),
                 'refresh': str(refresh),
@@ -185,20 +202,22 @@ def mentor_projects(request):
 @permission_classes([permissions.IsAuthenticated, IsMentor])
 def get_defect_detail(request, defect_id):
     mentor = Mentor.objects.get(user=request.user)
-    defect = get_object_or_404(Defect, defect_id=defect_id, project__mentors=mentor)
+    defect = get_object_or_404(Defect.objects.for_detail(), defect_id=defect_id, project__mentors=mentor)
     serializer = DefectDetailSerializer(defect, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, IsMentor])
+@query_budget(2)
 def mentor_project_defects(request, project_id):
     try:
-        mentor = Mentor.objects.get(user=request.user)
-        if not mentor.projects.filter(id=project_id).exists():
+        if project_id not in get_access_scope(request).mentor_project_ids:
             return Response({'error': 'Project not assigned to this mentor'}, status=403)
-        defects = Defect.objects.filter(project_id=project_id)
-        serializer = DefectListSerializer(defects, many=True, context={'request': request})
-        return Response(serializer.data)
+        defects = Defect.objects.for_list().filter(project_id=project_id)
+        paginator = DefectCursorPagination()
+        page = paginator.paginate_queryset(defects, request)
+        serializer = DefectListSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -206,8 +225,8 @@ def mentor_project_defects(request, project_id):
 @api_view(['GET', 'PUT', 'PATCH'])
 @permission_classes([permissions.IsAuthenticated, IsMentor])
 def mentor_defect_detail(request, defect_id):
-    mentor = Mentor.objects.get(user=request.user)
-    defect = get_object_or_404(Defect, defect_id=defect_id, project__mentors=mentor)
+    scope = get_access_scope(request)
+    defect = get_object_or_404(Defect.objects.for_detail(), defect_id=defect_id, project_id__in=scope.mentor_project_ids)
     
     if request.method == 'GET':
         serializer = DefectDetailSerializer(defect)
@@ -236,11 +255,10 @@ def mentor_defect_detail(request, defect_id):
 @permission_classes([permissions.IsAuthenticated, IsMentor])
 @transaction.atomic
 def mentor_defect_approve(request, defect_id):
-    try:
-        mentor = Mentor.objects.get(user=request.user)
-    except Mentor.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.is_mentor:
         return Response({'error': 'Only mentors can approve defects'}, status=403)
-    defect = get_object_or_404(Defect, defect_id=defect_id, project__mentors=mentor)
+    defect = get_object_or_404(Defect.objects.for_detail(), defect_id=defect_id, project_id__in=scope.mentor_project_ids)
     if defect.status == 'APPROVED':
         return Response({'error': 'Already approved'}, status=400)
     defect.status = 'APPROVED'
@@ -258,11 +276,10 @@ def mentor_defect_approve(request, defect_id):
 @permission_classes([permissions.IsAuthenticated, IsMentor])
 @transaction.atomic
 def mentor_defect_invalidate(request, defect_id):
-    try:
-        mentor = Mentor.objects.get(user=request.user)
-    except Mentor.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.is_mentor:
         return Response({'error': 'Only mentors can invalidate defects'}, status=403)
-    defect = get_object_or_404(Defect, defect_id=defect_id, project__mentors=mentor)
+    defect = get_object_or_404(Defect.objects.for_detail(), defect_id=defect_id, project_id__in=scope.mentor_project_ids)
     if defect.status == 'INVALID':
         return Response({'error': 'Already invalidated'}, status=400)
     defect.status = 'INVALID'
@@ -274,66 +291,134 @@ def mentor_defect_invalidate(request, defect_id):
         performed_by=request.user,
         comments=request.data.get('comments', 'Defect marked as invalid by mentor'))
     return Response({'success': True, 'defect': DefectDetailSerializer(defect).data})
+@swagger_auto_schema(
+    method='post',
+    operation_description="Approve or invalidate many defects in the mentor's projects at once",
+    request_body=DefectBulkActionSerializer,
+    responses={200: "Updated ids and skipped ids with a reason", 400: "Validation errors", 403: "Not a mentor"},
+    tags=['Mentors'])
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsMentor])
+def mentor_defects_bulk_action(request):
+    serializer = DefectBulkActionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    scope = get_access_scope(request)
+    updated, skipped = apply_mentor_action(
+        serializer.validated_data['defect_ids'],
+        serializer.validated_data['action'],
+        request.user,
+        scope.mentor_project_ids,
+        serializer.validated_data.get('comments'))
+    return Response({'action': serializer.validated_data['action'], 'updated': updated, 'skipped': skipped})
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@query_budget(2)
 def mentor_student_defects(request):
-    try:
-        mentor = Mentor.objects.get(user=request.user)
-    except Mentor.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.is_mentor:
         return Response({'error': "Not a mentor"}, status=403)
-    student_profiles = UserProfile.objects.filter(project__in=mentor.projects.all(), role='student').select_related('user')
-    student_users = [profile.user for profile in student_profiles]
-    defects = Defect.objects.filter(created_by__in=student_users)
-    serializer = DefectListSerializer(defects, many=True)
-    data = [{
-        "defect_id": d.defect_id,
-        "summary": d.summary,
-        "status": d.status,
-        "project": d.project.name,
-        "reported_by": d.created_by.username,  # <--- Here
-        "created_at": d.created_at,
-    } for d in defects]
-    return Response(serializer.data)
+    defects = Defect.objects.for_list().reported_by_students(sorted(scope.mentor_project_ids))
+    paginator = DefectCursorPagination()
+    page = paginator.paginate_queryset(defects, request)
+    serializer = DefectListSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+@swagger_auto_schema(
+    method='get',
+    operation_description="Students in the mentor's projects with per-status defect counts and their defects, paginated by student",
+    manual_parameters=[
+        openapi.Parameter('page', openapi.IN_QUERY, description="Page number (default 1)", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Students per page (default 50, max 200)", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('include_defects', openapi.IN_QUERY, description="Set to false to return only the counts", type=openapi.TYPE_BOOLEAN, required=False)],
+    tags=['Mentors'])
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsMentor])
+@query_budget(4)
 def mentor_students_view(request):
+    scope = get_access_scope(request)
     try:
-        user_profile = request.user.userprofile
-        if user_profile.role != "mentor":
-            return Response({"detail": "Permission denied, not a mentor"}, status=403)
-    except UserProfile.DoesNotExist:
-        return Response({"detail": "Mentor profile not found"}, status=404)
-    mentor = Mentor.objects.get(user=request.user)
-    students = mentor.students.select_related('user','project')
-    mentor_projects = request.user.mentor.projects.all()
-    student_profiles = UserProfile.objects.filter(project__in=mentor_projects.all(), role='student').select_related('user','project')
-    students = UserProfile.objects.filter(project__in=mentor_projects, role="student").select_related('user','project')
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', 50)), 1), 200)
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers.'}, status=400)
+    include_defects = request.query_params.get('include_defects', 'true').lower() not in ('0', 'false', 'no')
+    project_ids = scope.mentor_project_ids
+
+    in_mentor_projects = Exists(UserProfile.projects.through.objects.filter(
+        userprofile_id=OuterRef('pk'), project_id__in=project_ids))
+    prefetches = [Prefetch('projects', queryset=Project.objects.filter(id__in=project_ids).only('id', 'name'))]
+    if include_defects:
+        prefetches.append(Prefetch('user__created_defects', queryset=Defect.objects.filter(
+            project_id__in=project_ids).only('defect_id', 'summary', 'status', 'created_at', 'created_by_id')))
+    offset = (page - 1) * page_size
+    # One extra row tells us whether there is a next page without a COUNT
+    students = list(UserProfile.objects.filter(in_mentor_projects, role='student')
+                    .select_related('user').prefetch_related(*prefetches)
+                    .order_by('user_id')[offset:offset + page_size + 1])
+    has_next = len(students) > page_size
+    students = students[:page_size]
+
+    counts = {}
+    for row in (DefectCounter.objects.filter(created_by_id__in=[s.user_id for s in students],
+                                             project_id__in=project_ids, count__gt=0)
+                .values('created_by_id', 'status').annotate(total=Sum('count')).order_by()):
+        counts.setdefault(row['created_by_id'], {})[row['status']] = row['total']
     data = []
     for student in students:
-        defects = Defect.objects.filter(created_by=student.user)
-        data.append({
-            "student_id": student.user.id,
+        item = {
+            "student_id": student.user_id,
             "student_username": student.user.username,
-            "project": student.project.name if student.project else None,
-            "defects": [{   "defect_id": d.defect_id,
-                    "summary": d.summary,
-                    "status": d.status,
-                    "reported_by": d.created_by.username,
-                    "created_at": d.created_at,}
-                for d in defects]})
-        return Response(data)
+            "projects": [project.name for project in student.projects.all()],
+            "defect_counts": counts.get(student.user_id, {}),
+        }
+        if include_defects:
+            item["defects"] = [{"defect_id": d.defect_id,
+                                "summary": d.summary,
+                                "status": d.status,
+                                "reported_by": student.user.username,
+                                "created_at": d.created_at}
+                               for d in student.user.created_defects.all()]
+        data.append(item)
+    return Response({
+        'page': page,
+        'page_size': page_size,
+        'has_next': has_next,
+        'results': data,
+    })
+class MediaFileView(APIView):
+    """Files under MEDIA_URL, for a signed URL from an API response or a user who may view their defect"""
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+    content_negotiation_class = MediaContentNegotiation
+    swagger_schema = None
+
+    def get(self, request, name):
+        if not is_servable_name(name):
+            return Response({'error': 'File not found.'}, status=404)
+        params = request.query_params
+        if not check_media_signature(name, params.get('expires'), params.get('sig')):
+            if not request.user.is_authenticated:
+                return Response({'error': 'File not found.'}, status=404)
+            scope = get_access_scope(request)
+            if not any(scope.can_view_defect(*defect) for defect in media_defects(name)):
+                return Response({'error': 'File not found.'}, status=404)
+        return media_response(request, name) or Response({'error': 'File not found.'}, status=404)
 class DefectListAPIView(APIView):
     permission_classes = [IsAuthenticated]  # Optional: enforce login
+    pagination_class = DefectCursorPagination
 
+    @query_budget(2)
     def get(self, request, *args, **kwargs):
-        defects = Defect.objects.all()
-        serializer = DefectListSerializer(defects, many=True, context={'request': request})
-        return Response(serializer.data)
+        defects = Defect.objects.for_list()
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(defects, request, view=self)
+        serializer = DefectListSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 class DefectListCreateView(generics.ListCreateAPIView):
     """List defects and create new defects"""
     queryset = Defect.objects.all()
     serializer_class = DefectSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DefectCursorPagination
     @swagger_auto_schema(
         operation_description="Get list of defects based on user role",
         manual_parameters=[openapi.Parameter(
@@ -344,6 +429,7 @@ class DefectListCreateView(generics.ListCreateAPIView):
                 required=False)],
         responses={200: DefectSerializer(many=True), 401: "Authentication required"},
         tags=['Defects'])
+    @query_budget(4)
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
     @swagger_auto_schema(
@@ -362,20 +448,253 @@ class DefectListCreateView(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     def get_queryset(self):
         queryset = Defect.objects.all()
-        try:
-            mentor = Mentor.objects.get(user=self.request.user)
+        scope = get_access_scope(self.request)
+        if scope.is_mentor:
             project_id = self.request.query_params.get('project')
             if project_id:
-                queryset = queryset.filter(project_id=project_id, project__in=mentor.projects.all())
+                queryset = queryset.filter(project_id=project_id, project_id__in=scope.mentor_project_ids)
             else:
-                queryset = queryset.filter(project__in=mentor.projects.all())
-        except Mentor.DoesNotExist:
+                queryset = queryset.filter(project_id__in=scope.mentor_project_ids)
+        else:
             queryset = queryset.filter(created_by=self.request.user)
-        return queryset.select_related('project', 'created_by__userprofile', 'approved_by__userprofile')
+        return queryset.for_detail()
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return DefectCreateSerializer
         return DefectSerializer
+BULK_MAX_ITEMS = 500
+@swagger_auto_schema(
+    method='post',
+    operation_description=(
+        "Create many defects in one transaction. Send a JSON array of defect objects, or multipart form data "
+        "with the array as JSON in 'defects' and files in 'defect_screenshots[<index>]' / 'defect_video[<index>]'. "
+        "Valid items are created even if others fail; each result carries either defect_id or errors."),
+    responses={201: "All items created", 207: "Some items failed", 400: "No item could be created"},
+    tags=['Defects'])
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def defect_bulk_create(request):
+    if isinstance(request.data, list):
+        items = request.data
+    else:
+        try:
+            items = json.loads(request.data.get('defects', ''))
+        except ValueError:
+            return Response({'error': 'Send a JSON array, or multipart data with a JSON array in "defects".'}, status=400)
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'Expected a non-empty array of defects.'}, status=400)
+    if len(items) > BULK_MAX_ITEMS:
+        return Response({'error': f'At most {BULK_MAX_ITEMS} defects per request.'}, status=400)
+
+    project_ids = set()
+    for item in items:
+        try:
+            project_ids.add(int(item.get('project')))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    context = {'request': request, 'projects': Project.objects.in_bulk(project_ids)}
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({'index': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+            continue
+        item = dict(item)
+        screenshots = request.FILES.getlist(f'defect_screenshots[{index}]')
+        if screenshots:
+            item['defect_screenshots'] = screenshots
+        if f'defect_video[{index}]' in request.FILES:
+            item['defect_video'] = request.FILES[f'defect_video[{index}]']
+        serializer = DefectBulkItemSerializer(data=item, context=context)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+            results.append(None)
+        else:
+            results.append({'index': index, 'errors': serializer.errors})
+    if valid:
+        defects = create_defects([data for _, data in valid], request.user)
+        for (index, _), defect in zip(valid, defects):
+            results[index] = {'index': index, 'defect_id': defect.defect_id}
+    failed = len(items) - len(valid)
+    response_status = 201 if not failed else (207 if valid else 400)
+    return Response({'created': len(valid), 'failed': failed, 'results': results}, status=response_status)
+@swagger_auto_schema(
+    method='post',
+    operation_description="Import defects from an uploaded CSV or NDJSON file (admin only). The file is parsed as a stream and inserted in batches.",
+    manual_parameters=[
+        openapi.Parameter('file', openapi.IN_FORM, description="CSV with a header row, or NDJSON", type=openapi.TYPE_FILE, required=True),
+        openapi.Parameter('format', openapi.IN_FORM, description="'csv' or 'ndjson' (defaults to the file extension)", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('project', openapi.IN_FORM, description="Project id for rows without a project column", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('skip_duplicates', openapi.IN_FORM, description="Skip near-duplicate rows", type=openapi.TYPE_BOOLEAN, required=False),
+        openapi.Parameter('batch_size', openapi.IN_FORM, description="Rows per batch (default 500)", type=openapi.TYPE_INTEGER, required=False)],
+    responses={200: "Import report", 400: "Bad request", 403: "Admin only"},
+    tags=['Defects'])
+@api_view(['POST'])
+@permission_classes([permissions.IsAdminUser])
+def defect_import(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the file in the "file" field.'}, status=400)
+    file_format = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+    if file_format == 'jsonl':
+        file_format = 'ndjson'
+    if file_format not in IMPORT_FORMATS:
+        return Response({'error': 'format must be "csv" or "ndjson".'}, status=400)
+    project = None
+    if request.data.get('project'):
+        project = Project.objects.filter(id=request.data['project']).first()
+        if project is None:
+            return Response({'error': 'Project not found.'}, status=400)
+    try:
+        batch_size = min(max(int(request.data.get('batch_size', 500)), 1), 5000)
+    except ValueError:
+        return Response({'error': 'batch_size must be an integer.'}, status=400)
+    skip_duplicates = str(request.data.get('skip_duplicates', '')).lower() in ('1', 'true', 'yes')
+    report = import_defects(iter_records(upload, file_format), request.user, project=project,
+                            batch_size=batch_size, skip_duplicates=skip_duplicates)
+    return Response(report.as_dict())
+@swagger_auto_schema(
+    method='get',
+    operation_description="Redirect to a downscaled WebP variant ('thumbnail' or 'preview') of a screenshot, generating it on first request. "
+                          "Takes the signed URL from an API response, or a JWT of a user who can view the defect",
+    manual_parameters=[
+        openapi.Parameter('expires', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        openapi.Parameter('sig', openapi.IN_QUERY, type=openapi.TYPE_STRING)],
+    responses={302: "Redirect to the immutable variant URL", 404: "Screenshot or variant not found"},
+    tags=['Defects'])
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def screenshot_variant(request, screenshot_id, variant):
+    if variant not in THUMBNAIL_VARIANTS:
+        return Response({'error': f"Variant must be one of {', '.join(THUMBNAIL_VARIANTS)}."}, status=404)
+    screenshot = get_object_or_404(DefectScreenshot.objects.select_related('defect').only(
+        'image', 'defect__project_id', 'defect__created_by_id', 'defect__status'), id=screenshot_id)
+    if not screenshot.image:
+        return Response({'error': 'Screenshot not found.'}, status=404)
+    params = request.query_params
+    if not check_media_signature(variant_name(screenshot.image.name, variant), params.get('expires'), params.get('sig')):
+        # Same rule as MediaFileView: without a valid signature the caller must be able to see the defect
+        defect = screenshot.defect
+        if not request.user.is_authenticated or not get_access_scope(request).can_view_defect(
+                defect.project_id, defect.created_by_id, defect.status):
+            return Response({'error': 'Screenshot not found.'}, status=404)
+    try:
+        name = ensure_variant(screenshot.image.name, variant)
+    except OSError:
+        # Missing or unreadable source image
+        return Response({'error': 'Screenshot not found.'}, status=404)
+    return HttpResponseRedirect(content_addressed_storage().url(name))
+def _upload_state(upload):
+    return {
+        'upload_id': str(upload.pk),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'status': upload.status,
+        'max_chunk_size': settings.VIDEO_UPLOAD_MAX_CHUNK_BYTES,
+    }
+def _upload_error(exc):
+    data = {'error': str(exc)}
+    if exc.offset is not None:
+        data['offset'] = exc.offset
+    return Response(data, status=exc.status)
+@swagger_auto_schema(
+    method='post',
+    operation_description="Start a chunked, resumable video upload for a defect; then PUT the bytes to video-uploads/<upload_id>/ and finalize",
+    request_body=openapi.Schema(type=openapi.TYPE_OBJECT, required=['filename', 'size'], properties={
+        'filename': openapi.Schema(type=openapi.TYPE_STRING),
+        'size': openapi.Schema(type=openapi.TYPE_INTEGER, description="Total size in bytes")}),
+    responses={201: "Upload started", 400: "Invalid size", 404: "Defect not found"},
+    tags=['Defects'])
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def defect_video_upload_start(request, defect_id):
+    defect = get_object_or_404(Defect.objects.only('defect_id', 'project_id', 'created_by_id'), defect_id=defect_id)
+    if not get_access_scope(request).can_edit_defect(defect.project_id, defect.created_by_id):
+        return Response({'error': 'Defect not found.'}, status=404)
+    filename = str(request.data.get('filename', '')).strip()[:255]
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'size must be an integer.'}, status=400)
+    if not filename or size < 1:
+        return Response({'error': 'filename and a positive size are required.'}, status=400)
+    try:
+        upload = start_upload(defect, request.user, filename, size)
+    except UploadError as exc:
+        return _upload_error(exc)
+    return Response(_upload_state(upload), status=201)
+@swagger_auto_schema(
+    method='put',
+    operation_description=(
+        "Write the next chunk of a video upload as the raw request body. Give its position in a "
+        "'Content-Range: bytes <start>-<end>/<total>' header or the offset parameter; it must start at the "
+        "upload's current offset. On 409, resume from the returned offset."),
+    manual_parameters=[openapi.Parameter('offset', openapi.IN_QUERY, description="Byte offset of the chunk", type=openapi.TYPE_INTEGER, required=False)],
+    responses={200: "Chunk stored", 400: "Bad chunk", 409: "Offset does not match", 404: "Upload not found"},
+    tags=['Defects'])
+@swagger_auto_schema(method='get', operation_description="State of a video upload, including the offset to resume from", tags=['Defects'])
+@swagger_auto_schema(method='delete', operation_description="Abandon a video upload", tags=['Defects'])
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def video_upload_detail(request, upload_id):
+    upload = get_object_or_404(VideoUpload, pk=upload_id, created_by=request.user)
+    if request.method == 'GET':
+        return Response(_upload_state(upload))
+    if request.method == 'DELETE':
+        if upload.status != 'UPLOADING':
+            return Response({'error': 'The upload is already complete.'}, status=409)
+        abort_upload(upload)
+        return Response(status=204)
+    content_range = request.headers.get('Content-Range', '')
+    try:
+        if content_range:
+            unit, _, span = content_range.partition(' ')
+            offset = int(span.split('-', 1)[0])
+            if unit != 'bytes':
+                raise ValueError
+        else:
+            offset = int(request.query_params.get('offset', upload.received))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({'error': "Send 'Content-Range: bytes <start>-<end>/<total>' or an integer offset."}, status=400)
+    if length:
+        try:
+            # Read the body straight from the socket; DRF's parsers would buffer it first
+            write_chunk(upload, offset, request.stream, length)
+        except UploadError as exc:
+            return _upload_error(exc)
+    return Response(_upload_state(upload))
+@swagger_auto_schema(
+    method='post',
+    operation_description="Verify the uploaded video's SHA-256 and attach it to the defect",
+    request_body=openapi.Schema(type=openapi.TYPE_OBJECT, required=['sha256'], properties={
+        'sha256': openapi.Schema(type=openapi.TYPE_STRING, description="Hex SHA-256 of the whole file")}),
+    responses={200: "Video attached", 409: "Upload incomplete", 422: "Checksum mismatch; the upload restarts at offset 0", 404: "Upload not found"},
+    tags=['Defects'])
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def video_upload_finalize(request, upload_id):
+    upload = get_object_or_404(VideoUpload, pk=upload_id, created_by=request.user)
+    sha256 = str(request.data.get('sha256', '')).strip()
+    if len(sha256) != 64:
+        return Response({'error': 'sha256 must be a 64-character hex digest.'}, status=400)
+    try:
+        defect = finalize_upload(upload, sha256, request.user)
+    except UploadError as exc:
+        return _upload_error(exc)
+    return Response({**_upload_state(upload), 'defect_id': defect.defect_id,
+                     'defect_video': request.build_absolute_uri(defect.defect_video.url)})
+@swagger_auto_schema(
+    method='get',
+    operation_description="Find defects similar to a text query, by substring match or by embedding similarity",
+    manual_parameters=[
+        openapi.Parameter('q', openapi.IN_QUERY, description="Text to match", type=openapi.TYPE_STRING, required=True),
+        openapi.Parameter('mode', openapi.IN_QUERY, description="'keyword' (default) or 'semantic'", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('k', openapi.IN_QUERY, description="Number of semantic results (default 10, max 100)", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('project', openapi.IN_QUERY, description="Filter by project ID", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('status', openapi.IN_QUERY, description="Comma-separated statuses to include", type=openapi.TYPE_STRING, required=False)],
+    tags=['Defects'])
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def similar_defects_view(request):
@@ -383,13 +702,88 @@ def similar_defects_view(request):
     query = request.query_params.get('q', '').strip()
     if not query:
         return Response({'error': 'Query parameter "q" is required.'}, status=400)
-    defects = (
-        Defect.objects.filter(summary__icontains=query) |
-        Defect.objects.filter(actual_result__icontains=query) |
-        Defect.objects.filter(expected_result__icontains=query)
-    ).distinct()[:10]
-    serializer = DefectSerializer(defects, many=True)
+    mode = request.query_params.get('mode', 'keyword')
+    if mode == 'semantic':
+        return semantic_similar_defects(request, query)
+    if mode != 'keyword':
+        return Response({'error': 'mode must be "keyword" or "semantic".'}, status=400)
+    visible = get_access_scope(request).visible_defects()
+    ranked = search_defects(query, Defect.objects.for_detail().filter(visible), limit=10)
+    serializer = DefectSerializer([defect for defect, _ in ranked], many=True)
     return Response(serializer.data)
+def semantic_similar_defects(request, query):
+    """Top-k defects by embedding similarity, read from the per-project memory-mapped index"""
+    try:
+        k = min(int(request.query_params.get('k', 10)), 100)
+    except ValueError:
+        return Response({'error': 'k must be an integer.'}, status=400)
+    visible = get_access_scope(request).visible_defects()
+    # Only the projects the caller can see something in
+    project_ids = Defect.objects.filter(visible).order_by().values_list('project_id', flat=True).distinct()
+    project_id = request.query_params.get('project')
+    if project_id:
+        project_ids = project_ids.filter(project_id=project_id)
+    statuses = [s.strip().upper() for s in request.query_params.get('status', '').split(',') if s.strip()]
+    results = semantic_search(query, project_ids, k=max(k, 1), statuses=statuses, visible=visible)
+    defects = Defect.objects.for_detail().in_bulk([defect_id for defect_id, _ in results])
+    data = []
+    for defect_id, score in results:
+        if defect_id in defects:
+            item = DefectSerializer(defects[defect_id], context={'request': request}).data
+            item['score'] = round(score, 4)
+            data.append(item)
+    return Response(data)
+@swagger_auto_schema(
+    method='get',
+    operation_description="Ranked keyword search over defect summary, steps, actual and expected results",
+    manual_parameters=[
+        openapi.Parameter('q', openapi.IN_QUERY, description="Search terms", type=openapi.TYPE_STRING, required=True),
+        openapi.Parameter('project', openapi.IN_QUERY, description="Filter by project ID", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('status', openapi.IN_QUERY, description="Comma-separated statuses to include", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('page', openapi.IN_QUERY, description="Page number (default 1)", type=openapi.TYPE_INTEGER, required=False),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Results per page (default 20, max 100)", type=openapi.TYPE_INTEGER, required=False)],
+    tags=['Defects'])
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def defect_search_view(request):
+    """Full-text defect search with relevance scores and highlighted snippets"""
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Query parameter "q" is required.'}, status=400)
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers.'}, status=400)
+    queryset = Defect.objects.select_related('project', 'created_by').filter(get_access_scope(request).visible_defects())
+    project_id = request.query_params.get('project')
+    if project_id:
+        queryset = queryset.filter(project_id=project_id)
+    statuses = [s.strip().upper() for s in request.query_params.get('status', '').split(',') if s.strip()]
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    # One extra row tells us whether there is a next page without a COUNT
+    ranked = search_defects(query, queryset, limit=page_size + 1, offset=(page - 1) * page_size)
+    results = []
+    for defect, score in ranked[:page_size]:
+        results.append({
+            'defect_id': defect.defect_id,
+            'summary': defect.summary,
+            'project': defect.project.name,
+            'reported_by': defect.created_by.username,
+            'status': defect.status,
+            'priority': defect.priority,
+            'severity': defect.severity,
+            'created_at': defect.created_at,
+            'score': round(score, 4),
+            'highlights': search_highlights(defect, query),
+        })
+    return Response({
+        'page': page,
+        'page_size': page_size,
+        'has_next': len(ranked) > page_size,
+        'results': results,
+    })
 class DefectDetailView(generics.RetrieveUpdateAPIView):
     """Retrieve and update defect details"""
     serializer_class = DefectSerializer
@@ -400,6 +794,7 @@ class DefectDetailView(generics.RetrieveUpdateAPIView):
         responses={200: DefectSerializer, 404: "Defect not found", 403: "Permission denied"},
         tags=['Defects']
     )
+    @query_budget(4)
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -421,11 +816,10 @@ class DefectDetailView(generics.RetrieveUpdateAPIView):
     def patch(self, request, *args, **kwargs):
         return super().patch(request, *args, **kwargs)
     def get_queryset(self):
-        try:
-            mentor = Mentor.objects.get(user=self.request.user)
-            return Defect.objects.filter(project__in=mentor.projects.all())
-        except Mentor.DoesNotExist:
-            return Defect.objects.filter(created_by=self.request.user)
+        scope = get_access_scope(self.request)
+        if scope.is_mentor:
+            return Defect.objects.for_detail().filter(project_id__in=scope.mentor_project_ids)
+        return Defect.objects.for_detail().filter(created_by=self.request.user)
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return DefectUpdateSerializer
@@ -448,11 +842,10 @@ class DefectDetailView(generics.RetrieveUpdateAPIView):
 @permission_classes([IsAuthenticated])
 def approve_defect(request, defect_id):
     """Approve a defect"""
-    try:
-        mentor = Mentor.objects.get(user=request.user)
-    except Mentor.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.is_mentor:
         return Response({'error': 'Only mentors can approve defects'}, status=403)
-    defect = get_object_or_404(Defect, defect_id=defect_id, project__in=mentor.projects.all())
+    defect = get_object_or_404(Defect, defect_id=defect_id, project_id__in=scope.mentor_project_ids)
     if defect.status == 'APPROVED':
         return Response({'message': 'Defect already approved'})
     defect.status = 'APPROVED'
@@ -485,11 +878,10 @@ def approve_defect(request, defect_id):
 @permission_classes([IsAuthenticated])
 def invalidate_defect(request, defect_id):
     """Mark a defect as invalid"""
-    try:
-        mentor = Mentor.objects.get(user=request.user)
-    except Mentor.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.is_mentor:
         return Response({'error': 'Only mentors can invalidate defects'}, status=403)
-    defect = get_object_or_404(Defect, defect_id=defect_id, project__in=mentor.projects.all())
+    defect = get_object_or_404(Defect, defect_id=defect_id, project_id__in=scope.mentor_project_ids)
     if defect.status == 'INVALID':
         return Response({'message': 'Defect already marked as invalid'})
     defect.status = 'INVALID'
@@ -511,27 +903,131 @@ def invalidate_defect(request, defect_id):
 @permission_classes([IsAuthenticated])
 def defect_stats(request):
     """Get defect statistics"""
-    try:
-        mentor = Mentor.objects.get(user=request.user)
-        queryset = Defect.objects.filter(project__in=mentor.projects.all())
-    except Mentor.DoesNotExist:
-        queryset = Defect.objects.filter(created_by=request.user)
-
-    total_defects = queryset.count()
-    approved_defects = queryset.filter(status='APPROVED').count()
-    pending_defects = queryset.filter(status='PENDING').count()
-    invalid_defects = queryset.filter(status='INVALID').count()
+    scope = get_access_scope(request)
+    if scope.is_mentor:
+        counters = DefectCounter.objects.filter(project_id__in=scope.mentor_project_ids)
+    else:
+        counters = DefectCounter.objects.filter(created_by=request.user)
 
-    priority_stats = queryset.values('priority').annotate(count=Count('priority'))
-    defects_by_priority = {item['priority']: item['count'] for item in priority_stats}
+    rows = counters.filter(count__gt=0).values('status', 'priority').annotate(total=Sum('count')).order_by()
+    by_status = {}
+    defects_by_priority = {}
+    for row in rows:
+        by_status[row['status']] = by_status.get(row['status'], 0) + row['total']
+        defects_by_priority[row['priority']] = defects_by_priority.get(row['priority'], 0) + row['total']
     stats = {
-        'total_defects': total_defects,
-        'approved_defects': approved_defects,
-        'pending_defects': pending_defects,
-        'invalid_defects': invalid_defects,
+        'total_defects': sum(by_status.values()),
+        'approved_defects': by_status.get('APPROVED', 0),
+        'pending_defects': by_status.get('PENDING', 0),
+        'invalid_defects': by_status.get('INVALID', 0),
         'defects_by_priority': defects_by_priority
     }
     return Response(stats)
+TREND_BUCKETS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+TREND_MAX_DAYS = 3 * 366
+def _next_bucket(day, bucket):
+    if bucket == 'day':
+        return day + timedelta(days=1)
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+def _bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+@swagger_auto_schema(
+    method='get',
+    operation_description="Defects reported, approved and invalidated over time for a project, read from the daily rollups",
+    manual_parameters=[
+        openapi.Parameter('start', openapi.IN_QUERY, description="First day (YYYY-MM-DD, default 29 days before end)", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('end', openapi.IN_QUERY, description="Last day (YYYY-MM-DD, default today)", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('bucket', openapi.IN_QUERY, description="'day' (default), 'week' or 'month'", type=openapi.TYPE_STRING, required=False)],
+    tags=['Projects'])
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@query_budget(1)
+def project_trends(request, project_id):
+    scope = get_access_scope(request)
+    if not scope.can_access_project(project_id):
+        return Response({'error': 'You do not have access to this project.'}, status=403)
+    bucket = request.query_params.get('bucket', 'day')
+    if bucket not in TREND_BUCKETS:
+        return Response({'error': 'bucket must be "day", "week" or "month".'}, status=400)
+    try:
+        end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else timezone.localdate()
+        start = date.fromisoformat(request.query_params['start']) if 'start' in request.query_params else end - timedelta(days=29)
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD dates.'}, status=400)
+    if start > end:
+        return Response({'error': 'start must not be after end.'}, status=400)
+    if (end - start).days > TREND_MAX_DAYS:
+        return Response({'error': f'Date range is limited to {TREND_MAX_DAYS} days.'}, status=400)
+
+    rollups = DefectDailyRollup.objects.filter(project_id=project_id, day__gte=start, day__lte=end)
+    if TREND_BUCKETS[bucket]:
+        rollups = rollups.annotate(period=TREND_BUCKETS[bucket]('day'))
+    else:
+        rollups = rollups.annotate(period=F('day'))
+    rows = rollups.order_by().values('period').annotate(
+        reported=Sum('reported'), approved=Sum('approved'), invalidated=Sum('invalidated'))
+    totals = {row['period']: row for row in rows}
+    series = []
+    period = _bucket_start(start, bucket)
+    while period <= end:
+        row = totals.get(period, {})
+        series.append({
+            'period': period.isoformat(),
+            'reported': row.get('reported', 0),
+            'approved': row.get('approved', 0),
+            'invalidated': row.get('invalidated', 0),
+        })
+        period = _next_bucket(period, bucket)
+    return Response({
+        'project_id': project_id,
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': series,
+    })
+@swagger_auto_schema(
+    method='get',
+    operation_description="Stream every defect of a project as CSV or NDJSON. Clients get approved defects; mentors get all, optionally filtered by status.",
+    manual_parameters=[
+        openapi.Parameter('format', openapi.IN_QUERY, description="'csv' (default) or 'ndjson'", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('status', openapi.IN_QUERY, description="Comma-separated statuses (mentors only)", type=openapi.TYPE_STRING, required=False),
+        openapi.Parameter('gzip', openapi.IN_QUERY, description="Compress the stream (.gz download)", type=openapi.TYPE_BOOLEAN, required=False)],
+    tags=['Projects'])
+@api_view(['GET'])
+@renderer_classes([CSVRenderer, NDJSONRenderer, JSONRenderer])
+@permission_classes([IsAuthenticated])
+def project_defects_export(request, project_id):
+    scope = get_access_scope(request)
+    if not scope.can_access_project(project_id):
+        return Response({'error': 'You do not have access to this project.'}, status=403)
+    export_format = request.query_params.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return Response({'error': 'format must be "csv" or "ndjson".'}, status=400)
+    queryset = Defect.objects.filter(project_id=project_id)
+    if scope.is_mentor and project_id in scope.mentor_project_ids:
+        statuses = [s.strip().upper() for s in request.query_params.get('status', '').split(',') if s.strip()]
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+    else:
+        queryset = queryset.filter(status='APPROVED')
+
+    lines = csv_lines(export_rows(queryset)) if export_format == 'csv' else ndjson_lines(export_rows(queryset))
+    content_type = 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f'project_{project_id}_defects.{export_format}'
+    stream = encoded(lines)
+    if request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes'):
+        stream = gzipped(stream)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 class MentorProjectsView(generics.RetrieveAPIView):
     """Get mentor's assigned projects"""
     serializer_class = MentorSerializer
@@ -571,12 +1067,12 @@ def user_profile(request):
 def user_dashboard(request):
     """User Dashboard API"""
     defects = (
-        Defect.objects.filter(created_by=request.user)
+        DefectCounter.objects.filter(created_by=request.user, count__gt=0)
         .values('project__name')
         .annotate(
-            num_defects=Count('defect_id'),
-            num_approved=Count('defect_id', filter=Q(status='APPROVED')),
-            num_invalid=Count('defect_id', filter=Q(status='INVALID'))
+            num_defects=Sum('count'),
+            num_approved=Coalesce(Sum('count', filter=Q(status='APPROVED')), 0),
+            num_invalid=Coalesce(Sum('count', filter=Q(status='INVALID')), 0)
         )
         .order_by('project__name')
     )
@@ -612,7 +1108,7 @@ class ClientLoginView(APIView):
         if profile.role != 'client':
             return Response({'error': 'User is not a client.'}, status=status.HTTP_403_FORBIDDEN)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = ScopedRefreshToken.for_user(user)
         projects = list(profile.projects.values('id', 'name'))
 
         return Response({
@@ -627,77 +1123,93 @@ class ClientLoginView(APIView):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def client_projects(request):
-    try:
-        profile = request.user.userprofile
-    except UserProfile.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.has_profile:
         return Response({'error': 'User profile not found.'}, status=404)
 
-    if profile.role != 'client':
+    if not scope.is_client:
         return Response({'error': 'User is not a client.'}, status=403)
 
-    projects = profile.projects.filter(is_active=True).distinct()
+    projects = Project.objects.filter(id__in=scope.profile_project_ids, is_active=True)
     project_list = [{'id': p.id, 'name': p.name} for p in projects]
     return Response(project_list)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+# A cold ?threshold= call also stores missing embeddings: a savepoint, delete, insert and release
+@query_budget(9)
 def client_project_defects(request, project_id):
-    try:
-        profile = request.user.userprofile
-    except UserProfile.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.has_profile:
         return Response({'error': 'User profile not found.'}, status=404)
-    if profile.role != 'client':
+    if not scope.is_client:
         return Response({'error': 'User is not a client.'}, status=403)
-    project = get_object_or_404(profile.projects, id=project_id)
-    defects_qs = Defect.objects.filter(project=project, status='APPROVED')
-    serializer = DefectListSerializer(defects_qs, many=True, context={'request': request})
-    defect_dicts = serializer.data
-    # --------- USE AI CLUSTERING HERE ---------
-    unique_defects = ai_filter_unique_defects(defect_dicts, AI_FILTER_UNIQUE_DEFECTS_THRESHOLD)
+    project = get_object_or_404(Project, id=project_id, id__in=scope.profile_project_ids)
+    threshold = request.query_params.get('threshold')
+    defects_qs = Defect.objects.for_list().filter(project=project, status='APPROVED')
+    if threshold is None:
+        # Duplicate groups are maintained on save; keep the oldest approved defect of each
+        defects_qs = unique_defects_queryset(defects_qs)
+    else:
+        try:
+            threshold = float(threshold)
+        except ValueError:
+            return Response({'error': 'threshold must be a number.'}, status=400)
+        if not 0 <= threshold <= 2:
+            return Response({'error': 'threshold must be between 0 and 2.'}, status=400)
+        # Cut the project's cached merge tree at the requested cosine distance
+        unique_ids = dendrogram_unique_ids(defects_qs, f'project-{project.id}-approved', threshold)
+        defects_qs = defects_qs.filter(defect_id__in=unique_ids)
+    paginator = DefectCursorPagination()
+    page = paginator.paginate_queryset(defects_qs, request)
+    serializer = DefectListSerializer(page, many=True, context={'request': request})
     return Response({
         'project': project.name,
-        'defects': unique_defects
+        'next': paginator.get_next_link(),
+        'defects': serializer.data
     })
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def client_unique_defects_view(request):
-    try:
-        profile = request.user.userprofile
-    except UserProfile.DoesNotExist:
+    scope = get_access_scope(request)
+    if not scope.has_profile:
         return Response({'error': 'User profile not found.'}, status=404)
 
-    if profile.role != 'client':
+    if not scope.is_client:
         return Response({'error': 'User is not a client.'}, status=403)
 
-    # Fetch all defects for client projects
-    defects = list(Defect.objects.filter(project__in=profile.projects.all()).values(
+    # Fetch the oldest defect of each duplicate group in the client projects
+    unique_defects = unique_defects_queryset(Defect.objects.filter(project_id__in=scope.profile_project_ids)).values(
         'defect_id', 'summary', 'status', 'created_at', 'steps_to_reproduce', 'actual_result', 'expected_result','environment'
-    ))
-    defects_list = list(defects)
-
-    # Apply AI-based filtering to get unique defects
-    unique_defects = ai_filter_unique_defects(defects,AI_FILTER_UNIQUE_DEFECTS_THRESHOLD)
-
-    return Response({'unique_defects': unique_defects})
+    )
+    paginator = DefectCursorPagination()
+    page = paginator.paginate_queryset(unique_defects, request)
+    return Response({'next': paginator.get_next_link(), 'unique_defects': page})
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def client_dashboard(request):
-    try:
-        profile = request.user.userprofile
-    except Exception:
+    scope = get_access_scope(request)
+    if not scope.has_profile:
         return Response({'error': 'User profile not found.'}, status=404)
-    if profile.role != 'client':
+    if not scope.is_client:
         return Response({'error': 'User is not a client.'}, status=403)
-    projects = profile.projects.all()
+    projects = list(Project.objects.filter(id__in=scope.profile_project_ids))
     if not projects:
         return Response({'error': 'No project assigned to this client.'}, status=404)
-    result = []
-    for project in projects:
-        defects = list(Defect.objects.filter(
-            project=project,
+    # Only hit the defect table for projects the counters say have approved defects from this user
+    approved = dict(DefectCounter.objects.filter(
+        project_id__in=scope.profile_project_ids, created_by=request.user, status='APPROVED', count__gt=0
+    ).values('project_id').annotate(total=Sum('count')).order_by().values_list('project_id', 'total'))
+    defects_by_project = {}
+    # Defects are paged across all of the client's projects and grouped per project within a page
+    paginator = DefectCursorPagination()
+    if approved:
+        defects = paginator.paginate_queryset(unique_defects_queryset(Defect.objects.filter(
+            project_id__in=approved,
             status='APPROVED',
             created_by=request.user
-        ).values(
+        )).values(
             'defect_id',
+            'project_id',
             'summary',
             'status',
             'created_by__username',
@@ -705,19 +1217,24 @@ def client_dashboard(request):
             'created_at',
             'environment',
             'application_url',
-            'defect_screenshots',
             'defect_video'
-        ))
+        ), request)
+        storage = content_addressed_storage()
+        screenshots = {}
+        for defect_id, image in DefectScreenshot.objects.filter(
+                defect_id__in=[d['defect_id'] for d in defects]).values_list('defect_id', 'image'):
+            screenshots.setdefault(defect_id, []).append(request.build_absolute_uri(storage.url(image)))
         for d in defects:
             if d['defect_video']:
-                d['defect_video'] = request.build_absolute_uri(settings.MEDIA_URL + d['defect_video'])
-            if d['defect_screenshots']:
-                d['defect_screenshots'] = request.build_absolute_uri(settings.MEDIA_URL + d['defect_screenshots'])
-        # --------- USE AI CLUSTERING HERE ---------
-        unique_defects = ai_filter_unique_defects(list(defects),AI_FILTER_UNIQUE_DEFECTS_THRESHOLD)
+                d['defect_video'] = request.build_absolute_uri(storage.url(d['defect_video']))
+            d['defect_screenshots'] = screenshots.get(d['defect_id'], [])
+            defects_by_project.setdefault(d.pop('project_id'), []).append(d)
+    result = []
+    for project in projects:
         result.append({
             'project': project.name,
-            'defects': unique_defects
+            'approved_defects': approved.get(project.id, 0),
+            'defects': defects_by_project.get(project.id, [])
         })
-    return Response(result)
+    return Response({'next': paginator.get_next_link() if approved else None, 'results': result})
 
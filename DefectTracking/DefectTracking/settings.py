@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'App.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,7 +89,7 @@ DATABASES = {
 }
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'App.tokens.ScopedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -96,12 +97,37 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
+# Views decorated with App.instrumentation.query_budget log when they exceed their
+# declared query count; set this in tests to raise QueryBudgetExceeded instead
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
+# Per-request SQL instrumentation (Server-Timing header and the slow_queries report)
+SQL_INSTRUMENTATION_ENABLED = config('SQL_INSTRUMENTATION_ENABLED', default=True, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=100, cast=float)
+# Seconds a user's resolved role/project scope is cached; model signals drop it on change
+ACCESS_SCOPE_CACHE_TTL = config('ACCESS_SCOPE_CACHE_TTL', default=60, cast=int)
 # JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_REFRESH_SERIALIZER': 'App.tokens.ScopedTokenRefreshSerializer',
 }
+# AI / sentence-transformer inference
+# When AI_INFERENCE_SOCKET points at a running `manage.py run_inference_server`,
+# workers send encode requests there instead of loading the model themselves.
+AI_INFERENCE_SOCKET = config('AI_INFERENCE_SOCKET', default='')
+AI_INFERENCE_TIMEOUT = config('AI_INFERENCE_TIMEOUT', default=10.0, cast=float)
+AI_INFERENCE_BATCH_SIZE = config('AI_INFERENCE_BATCH_SIZE', default=64, cast=int)
+AI_INFERENCE_MAX_WAIT_MS = config('AI_INFERENCE_MAX_WAIT_MS', default=5, cast=int)
+# Cosine distance under which two defects are treated as duplicates
+AI_FILTER_UNIQUE_DEFECTS_THRESHOLD = config('AI_FILTER_UNIQUE_DEFECTS_THRESHOLD', default=0.3, cast=float)
+# 'agglomerative' (average linkage, O(n^2) memory) or 'blocked' (tiled union-find for large projects)
+AI_CLUSTERING_ENGINE = config('AI_CLUSTERING_ENGINE', default='agglomerative')
+AI_CLUSTERING_BLOCK_SIZE = config('AI_CLUSTERING_BLOCK_SIZE', default=1024, cast=int)
+# Seconds a project's merge tree stays cached; it is keyed on the defect set, so changes never serve stale trees
+AI_DENDROGRAM_CACHE_TIMEOUT = config('AI_DENDROGRAM_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+# Memory-mapped per-project embedding matrices used by semantic search
+AI_INDEX_DIR = config('AI_INDEX_DIR', default=os.path.join(BASE_DIR, 'ai_index'))
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -158,6 +184,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
+# Media is served by App.views.serve_media with the API's access rules, in every environment.
+# 'django' streams the file itself (Range requests, sendfile under gunicorn); 'nginx' hands it
+# to an internal location at MEDIA_ACCEL_REDIRECT_PREFIX via X-Accel-Redirect; 'sendfile'
+# sets X-Sendfile for Apache mod_xsendfile or lighttpd.
+MEDIA_SERVE_MODE = config('MEDIA_SERVE_MODE', default='django')
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+# Media URLs in API responses are signed and stay valid for one to two windows of this many seconds
+MEDIA_URL_TTL = config('MEDIA_URL_TTL', default=24 * 60 * 60, cast=int)
+# `manage.py process_media_jobs`: image processes, seconds between polls of an empty queue,
+# and how long a RUNNING job may go without finishing before it is handed out again
+MEDIA_JOB_WORKERS = config('MEDIA_JOB_WORKERS', default=2, cast=int)
+MEDIA_JOB_POLL_INTERVAL = config('MEDIA_JOB_POLL_INTERVAL', default=2.0, cast=float)
+MEDIA_JOB_STALE_AFTER = config('MEDIA_JOB_STALE_AFTER', default=600, cast=int)
+# Chunked defect video uploads: largest video and chunk accepted, and hours an
+# unfinished upload is kept for resuming (see `manage.py expire_video_uploads`)
+VIDEO_UPLOAD_MAX_BYTES = config('VIDEO_UPLOAD_MAX_BYTES', default=2 * 1024 ** 3, cast=int)
+VIDEO_UPLOAD_MAX_CHUNK_BYTES = config('VIDEO_UPLOAD_MAX_CHUNK_BYTES', default=16 * 1024 ** 2, cast=int)
+VIDEO_UPLOAD_EXPIRY_HOURS = config('VIDEO_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
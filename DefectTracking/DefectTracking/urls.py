@@ -2,13 +2,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from App.views import MediaFileView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('App.urls')),
+    # Media is access-checked in every environment; see App.media_serving
+    path(settings.MEDIA_URL.lstrip('/') + '<path:name>', MediaFileView.as_view(), name='media_file'),
 ]
 
-# Serve static and media files during development
+# Serve static files during development
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)